@@ -4,19 +4,66 @@ This is main module for strategy backtesting
 
 import os
 import numpy as np
-from datetime import timedelta
+from datetime import date, timedelta
 from decimal import Decimal, ROUND_HALF_UP
-from typing import List
+from queue import Queue
+from typing import Iterable, List, Optional, Tuple
 import pandas as pd
 import matplotlib.pyplot as plt
 
 import plutus_verify as pv
 
+from proto_market_maker.cache import load_cached
+from proto_market_maker.coalesce import coalesce_ticks, get_coalesced_name
 from proto_market_maker.config.config import BACKTESTING_CONFIG
-from proto_market_maker.metrics.metric import get_returns, Metric
-from proto_market_maker.utils import get_expired_dates, from_cash_to_tradeable_contracts, round_decimal
-
-FEE_PER_CONTRACT = Decimal(BACKTESTING_CONFIG["fee"]) * Decimal('100')
+from proto_market_maker.metrics.metric import get_returns, Metric, OnlineMetric
+from proto_market_maker.metrics.attribution import (
+    COMPONENTS,
+    attribute_backtest,
+    attribution_totals,
+    plot_attribution,
+    save_attribution,
+)
+from proto_market_maker.metrics.bootstrap import confidence_intervals, CONFIDENCE
+from proto_market_maker.metrics.intraday import (
+    intraday_equity,
+    intraday_maximum_drawdown,
+    save_equity,
+    time_under_water,
+)
+from proto_market_maker.monitor import monitor_from_env
+from proto_market_maker.policy import from_ticks, to_ticks
+from proto_market_maker.tickserver import attach_data
+from proto_market_maker.utils import (
+    get_expired_dates,
+    get_roll_dates,
+    from_cash_to_tradeable_contracts,
+    round_decimal,
+)
+
+MULTIPLIER = Decimal("100")
+MARGIN_RATE = Decimal("0.17")
+FEE_PER_CONTRACT = Decimal(BACKTESTING_CONFIG["fee"]) * MULTIPLIER
+INVENTORY_SKEW = float(BACKTESTING_CONFIG["skew"])
+REFRESH_SECONDS = int(BACKTESTING_CONFIG["time"])
+F2_CHUNK_ROWS = 500_000
+DECIMAL_COLUMNS = ["price", "best-bid", "best-ask", "spread", "close", "f2_price", "f2_close"]
+FILL_COLUMNS = [
+    "datetime",
+    "date",
+    "kind",
+    "side",
+    "price",
+    "contracts",
+    "inventory",
+    "inventory_price",
+    "ac_loss",
+    "fee_contracts",
+    "points",
+    "limit",
+    "check",
+    "tick",
+]
 
 
 class Backtesting:
@@ -28,6 +75,9 @@ class Backtesting:
         self,
         capital: Decimal,
         printable=True,
+        fee: Decimal = None,
+        multiplier: Decimal = MULTIPLIER,
+        margin_rate: Decimal = MARGIN_RATE,
     ):
         """
         Initiate required data
@@ -40,9 +90,21 @@ class Backtesting:
             capital (Decimal)
             path (str, optional). Defaults to "data/is/pe_dps.csv".
             index_path (str, optional). Defaults to "data/is/vnindex.csv".
+            fee (Decimal, optional): fee per side in index points. Defaults to config fee.
+            multiplier (Decimal, optional): contract value of one index point
+            margin_rate (Decimal, optional): initial margin as a share of contract value
         """
         self.printable = printable
+        self.multiplier = Decimal(multiplier)
+        self.margin_rate = Decimal(margin_rate)
+        self.fee_per_contract = (
+            Decimal(BACKTESTING_CONFIG["fee"] if fee is None else fee) * self.multiplier
+        )
+        self.skew = INVENTORY_SKEW
+        self.refresh = REFRESH_SECONDS
+        self.policy = None
         self.metric = None
+        self.live_metric = OnlineMetric(risk_free_return=Decimal('0.00023'))
 
         self.inventory = 0
         self.inventory_price = Decimal('0')
@@ -59,19 +121,116 @@ class Backtesting:
         self.ac_loss = Decimal("0.0")
         self.transactions = []
         self.order_logs = []
+        self.fills = []
+        self.blocked = {}
+        self.tick = -1
+        self.last_day_ticks = 0
+        self.last_day_pnl = Decimal("0.0")
+
+    def record_fill(self, kind, side, price, contracts, fee_contracts=0, points=0, limit=0, check=-1):
+        """
+        Append a fill-level record, taken after the event is applied
+
+        Args:
+            kind (str): open, close, roll, force, blocked or mark
+            side (int): +1 buy, -1 sell, 0 for marks
+            price (Decimal)
+            contracts (int)
+            fee_contracts (int, optional): contracts charged fee_per_contract
+            points (Decimal, optional): realized pnl in index points, before multiplier
+            limit (int, optional): contracts the capital check compared against
+            check (int, optional): number of records before the capital check
+
+        The record also keeps the position of the current tick in the run.
+        """
+        if kind != "blocked":
+            self.blocked = {}
+        self.fills.append((
+            self.cur_date,
+            self.cur_date.date(),
+            kind,
+            side,
+            price,
+            contracts,
+            self.inventory,
+            self.inventory_price,
+            self.ac_loss,
+            fee_contracts,
+            points,
+            limit,
+            check,
+            self.tick,
+        ))
+
+    def record_blocked(self, side, price, limit, check):
+        """
+        Record a quote the capital check blocked
+
+        While no other record comes in between, repeated blocks of a side were
+        checked on the same limit and ac_loss. Only one record is kept for
+        them, at the lowest price, which is the block a larger placeable
+        would lift first.
+
+        Args:
+            side (int): +1 buy, -1 sell
+            price (Decimal)
+            limit (int): contracts the capital check compared against
+            check (int): number of records before the capital check
+        """
+        index = self.blocked.get(side)
+        if index is None:
+            self.blocked[side] = len(self.fills)
+            self.record_fill("blocked", side, price, 0, limit=limit, check=check)
+        elif price < self.fills[index][4]:
+            fill = self.fills[index]
+            self.fills[index] = (
+                self.cur_date, self.cur_date.date(), *fill[2:4], price, *fill[5:-1], self.tick
+            )
+
+    def get_fills(self) -> pd.DataFrame:
+        """
+        Fill journal of the run
+
+        Prices and pnl are floats; kind mark is the daily mark-to-market at
+        the close, whose points are the unrealized pnl added by update_pnl.
+
+        Returns:
+            pd.DataFrame
+        """
+        fills = pd.DataFrame(self.fills, columns=FILL_COLUMNS)
+        for col in ["price", "inventory_price", "ac_loss", "points"]:
+            fills[col] = fills[col].astype(float)
+        return fills
+
+    def get_intraday_equity(self, data: pd.DataFrame, resolution="second") -> pd.DataFrame:
+        """
+        Intraday mark-to-market equity, rebuilt from the fill journal
+
+        Args:
+            data (pd.DataFrame): processed tick data of the run
+            resolution (str, optional): tick, second or minute. Defaults to "second".
+
+        Returns:
+            pd.DataFrame
+        """
+        return intraday_equity(self, data, resolution)
 
     def move_f1_to_f2(self, f1_price, f2_price):
         """
         TODO: move f1 to f2
         """
         if self.inventory > 0:
-            self.ac_loss += (self.inventory_price - f1_price) * 100
+            points = f1_price - self.inventory_price
+            self.ac_loss += (self.inventory_price - f1_price) * self.multiplier
             self.inventory_price = f2_price
-            self.ac_loss += FEE_PER_CONTRACT * abs(self.inventory)
+            self.ac_loss += self.fee_per_contract * abs(self.inventory)
+            self.record_fill("roll", -1, f1_price, self.inventory, self.inventory, points)
         elif self.inventory < 0:
-            self.ac_loss += (f1_price - self.inventory_price) * 100
+            points = self.inventory_price - f1_price
+            self.ac_loss += (f1_price - self.inventory_price) * self.multiplier
             self.inventory_price = f2_price
-            self.ac_loss += FEE_PER_CONTRACT * abs(self.inventory)
+            self.ac_loss += self.fee_per_contract * abs(self.inventory)
+            self.record_fill("roll", 1, f1_price, -self.inventory, -self.inventory, points)
 
     def update_pnl(self, close_price: Decimal):
         """
@@ -81,20 +240,19 @@ class Backtesting:
             close_price (Decimal)
         """
         cur_asset = self.daily_assets[-1]
-        new_asset = None
-        if self.inventory == 0:
-            new_asset = cur_asset - self.ac_loss
-        else:
+        pnl = -self.ac_loss
+        if self.inventory != 0:
             sign = 1 if self.inventory > 0 else -1
-            pnl = (
-                sign * abs(self.inventory) * (close_price - self.inventory_price) * 100
-                - self.ac_loss
-            )
-            new_asset = cur_asset + pnl
+            points = sign * abs(self.inventory) * (close_price - self.inventory_price)
+            pnl = points * self.multiplier - self.ac_loss
             self.inventory_price = close_price
+            self.record_fill("mark", 0, close_price, abs(self.inventory), points=points)
 
+        new_asset = cur_asset + pnl
+        self.last_day_pnl = pnl
         self.daily_returns.append(new_asset / self.daily_assets[-1] - 1)
         self.daily_assets.append(new_asset)
+        self.live_metric.update(self.daily_returns[-1])
 
     def handle_force_sell(self, price: Decimal):
         """
@@ -105,8 +263,15 @@ class Backtesting:
         """
         while self.get_maximum_placeable(price) < 0:
             sign = 1 if self.inventory < 0 else -1
+            limit = abs(self.inventory)
             self.inventory += sign
-            self.ac_loss += abs(price - self.inventory_price) * 100 + FEE_PER_CONTRACT
+            check = len(self.fills)
+            self.ac_loss += (
+                abs(price - self.inventory_price) * self.multiplier + self.fee_per_contract
+            )
+            self.record_fill(
+                "force", sign, price, 1, 1, -abs(price - self.inventory_price), limit, check
+            )
 
     def get_maximum_placeable(self, inst_price: Decimal):
         """
@@ -120,7 +285,10 @@ class Backtesting:
         """
         total_placeable = max(
             from_cash_to_tradeable_contracts(
-                self.daily_assets[-1] - self.ac_loss, inst_price
+                self.daily_assets[-1] - self.ac_loss,
+                inst_price,
+                self.multiplier,
+                self.margin_rate,
             ),
             0,
         )
@@ -138,16 +306,24 @@ class Backtesting:
         if self.bid_price is None or self.ask_price is None:
             return matched
 
+        # opening fills are checked against the placeable computed above
+        check = len(self.fills)
+        limit = abs(self.inventory) + 1
         if self.bid_price >= price and self.inventory >= 0 and placeable > 0:
             self.inventory_price = (
                 self.inventory_price * abs(self.inventory) + price
             ) / (abs(self.inventory) + 1)
             self.inventory += 1
             matched += 1
+            self.record_fill("open", 1, price, 1, limit=limit, check=check)
         elif self.bid_price >= price and self.inventory < 0:
-            self.ac_loss += (FEE_PER_CONTRACT - (self.inventory_price - price) * Decimal('100'))
+            points = self.inventory_price - price
+            self.ac_loss += (self.fee_per_contract - points * self.multiplier)
             self.inventory += 1
             matched -= 1
+            self.record_fill("close", 1, price, 1, 1, points)
+        elif self.bid_price >= price:
+            self.record_blocked(1, price, limit, check)
 
         if self.ask_price <= price and self.inventory <= 0 and placeable > 0:
             self.inventory_price = (
@@ -155,13 +331,45 @@ class Backtesting:
             ) / (abs(self.inventory) + 1)
             self.inventory -= 1
             matched += 1
+            self.record_fill("open", -1, price, 1, limit=limit, check=check)
         elif self.ask_price <= price and self.inventory > 0:
-            self.ac_loss += (FEE_PER_CONTRACT - (price - self.inventory_price) * Decimal('100'))
+            points = price - self.inventory_price
+            self.ac_loss += (self.fee_per_contract - points * self.multiplier)
             self.inventory -= 1
             matched -= 1
+            self.record_fill("close", -1, price, 1, 1, points)
+        elif self.ask_price <= price:
+            self.record_blocked(-1, price, limit, check)
 
         return matched
 
+    def quote(self, price: Decimal, step, elapsed=0.0):
+        """
+        Set bid ask around price
+
+        Without a policy set, quotes follow the inventory skew rule with step
+        and skew, which InventorySkewPolicy reproduces.
+
+        Args:
+            price (Decimal)
+            step (Decimal)
+            elapsed (float, optional): seconds since the last timed requote
+        """
+        if self.policy is None:
+            self.bid_price = (
+                price - step * Decimal(max(self.inventory, 0) * self.skew + 1)
+            ).quantize(Decimal("0.0"), rounding=ROUND_HALF_UP)
+            self.ask_price = (
+                price - step * Decimal(min(self.inventory, 0) * self.skew - 1)
+            ).quantize(Decimal("0.0"), rounding=ROUND_HALF_UP)
+            return
+
+        bid, ask = self.policy.quote(
+            np.array([to_ticks(price)]), np.array([self.inventory]), np.array([elapsed])
+        )
+        self.bid_price = from_ticks(bid[0])
+        self.ask_price = from_ticks(ask[0])
+
     def update_bid_ask(self, price: Decimal, step, timestamp):
         """
         Placing bid ask formula
@@ -172,27 +380,19 @@ class Backtesting:
         matched = self.handle_matched_order(price)
 
         if self.old_timestamp is None or timestamp > self.old_timestamp + timedelta(
-            seconds=int(BACKTESTING_CONFIG["time"])
+            seconds=self.refresh
         ):
             self.old_timestamp = timestamp
-            self.bid_price = (
-                price - step * Decimal(max(self.inventory, 0) * 0.02 + 1)
-            ).quantize(Decimal("0.0"), rounding=ROUND_HALF_UP)
-            self.ask_price = (
-                price - step * Decimal(min(self.inventory, 0) * 0.02 - 1)
-            ).quantize(Decimal("0.0"), rounding=ROUND_HALF_UP)
+            self.quote(price, step)
         elif matched != 0:
-            self.bid_price = (
-                price - step * Decimal(max(self.inventory, 0) * 0.02 + 1)
-            ).quantize(Decimal("0.0"), rounding=ROUND_HALF_UP)
-            self.ask_price = (
-                price - step * Decimal(min(self.inventory, 0) * 0.02 - 1)
-            ).quantize(Decimal("0.0"), rounding=ROUND_HALF_UP)
+            self.quote(price, step, (timestamp - self.old_timestamp).total_seconds())
 
     @staticmethod
-    def process_data(evaluation=False):
-        prefix_path = "data/os/" if evaluation else "data/is/"
-        f1_data = pd.read_csv(f"{prefix_path}VN30F1M_data.csv")
+    def read_f1_data(prefix_path: str) -> pd.DataFrame:
+        return Backtesting.decode_f1_data(pd.read_csv(f"{prefix_path}VN30F1M_data.csv"))
+
+    @staticmethod
+    def decode_f1_data(f1_data: pd.DataFrame) -> pd.DataFrame:
         f1_data["datetime"] = pd.to_datetime(
             f1_data["datetime"], format="%Y-%m-%d %H:%M:%S.%f"
         )
@@ -202,9 +402,38 @@ class Backtesting:
         rounding_columns = ["close", "price", "best-bid", "best-ask", "spread"]
         for col in rounding_columns:
             f1_data = round_decimal(f1_data, col)
+        return f1_data
+
+    @staticmethod
+    def read_f2_data(prefix_path: str, dates=None) -> pd.DataFrame:
+        """
+        Read F2 ticks, optionally only those of the given trading dates
 
-        f2_data = pd.read_csv(f"{prefix_path}VN30F2M_data.csv")
-        f2_data = f2_data[["date", "datetime", "tickersymbol", "price", "close"]].copy()
+        Args:
+            prefix_path (str)
+            dates (optional): trading dates to keep; read in chunks when given
+
+        Returns:
+            pd.DataFrame
+        """
+        columns = ["date", "datetime", "tickersymbol", "price", "close"]
+        path = f"{prefix_path}VN30F2M_data.csv"
+        if dates is None:
+            f2_data = pd.read_csv(path)
+        else:
+            wanted = {str(trading_date) for trading_date in dates}
+            chunks = [
+                chunk[chunk["date"].isin(wanted)]
+                for chunk in pd.read_csv(path, usecols=columns, chunksize=F2_CHUNK_ROWS)
+            ]
+            # a file without rows yields no chunk at all
+            f2_data = pd.concat(chunks) if chunks else pd.read_csv(path, usecols=columns, nrows=0)
+        return Backtesting.decode_f2_data(f2_data)
+
+    @staticmethod
+    def decode_f2_data(f2_data: pd.DataFrame) -> pd.DataFrame:
+        columns = ["date", "datetime", "tickersymbol", "price", "close"]
+        f2_data = f2_data[columns].copy()
         f2_data["datetime"] = pd.to_datetime(
             f2_data["datetime"], format="%Y-%m-%d %H:%M:%S.%f"
         )
@@ -222,21 +451,166 @@ class Backtesting:
         rounding_columns = ["f2_close", "f2_price"]
         for col in rounding_columns:
             f2_data = round_decimal(f2_data, col)
+        return f2_data
+
+    @staticmethod
+    def process_data(
+        evaluation=False, lazy_f2=None, coalesce=None, refreshes=None, attach=True, decimal=True
+    ):
+        """
+        Load F1 ticks with the F2 prices used on roll days
+
+        By default every F2 tick is outer-merged onto the F1 ticks. With
+        lazy_f2, only the F2 ticks of roll days (and the day before, whose last
+        price is carried into the roll day) are read, and they are aligned onto
+        the F1 ticks of roll days with an as-of join; other days keep empty F2
+        columns, which run never reads.
+
+        With coalesce, ticks no run can tell apart are dropped (see
+        coalesce_ticks) and the result is kept in the processed-data cache.
+        While pmm-tick-server holds the data, it is attached from shared
+        memory instead of read from the CSV files. Without decimal, prices
+        are float64, as the array engines read them; attached prices are then
+        not copied.
+
+        Args:
+            evaluation (bool, optional): out-of-sample data. Defaults to False.
+            lazy_f2 (bool, optional): load F2 for roll days only. Defaults to config lazy_f2.
+            coalesce (bool, optional): coalesce repeated ticks. Defaults to config coalesce.
+            refreshes (list, optional): requote intervals the coalesced data
+                serves. Defaults to config time.
+            attach (bool, optional): use the tick server when it runs. Defaults to True.
+            decimal (bool, optional): Decimal prices, as Backtesting needs.
+                Defaults to True.
+
+        Returns:
+            pd.DataFrame
+        """
+        prefix_path = "data/os/" if evaluation else "data/is/"
+        if lazy_f2 is None:
+            lazy_f2 = BACKTESTING_CONFIG["lazy_f2"]
+        if coalesce is None:
+            coalesce = BACKTESTING_CONFIG["coalesce"]
+
+        if coalesce:
+            refreshes = [int(refresh) for refresh in refreshes or [REFRESH_SECONDS]]
+            data = load_cached(
+                get_coalesced_name(refreshes, lazy_f2),
+                lambda: coalesce_ticks(
+                    Backtesting.process_data(evaluation, lazy_f2, coalesce=False, attach=attach),
+                    refreshes,
+                ),
+                evaluation,
+            )
+            return data if decimal else Backtesting.to_float_prices(data)
+
+        if attach:
+            attached = attach_data(evaluation, lazy_f2, decimal=decimal)
+            if attached is not None:
+                return attached
+
+        f1_data = Backtesting.read_f1_data(prefix_path)
+        if lazy_f2:
+            f1_data = Backtesting.align_roll_f2(f1_data, prefix_path)
+        else:
+            f2_data = Backtesting.read_f2_data(prefix_path)
+            f1_data = Backtesting.merge_f2_data(f1_data, f2_data)
+            f1_data = f1_data.ffill()
+        return f1_data if decimal else Backtesting.to_float_prices(f1_data)
+
+    @staticmethod
+    def to_float_prices(data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Processed data with float64 prices, as the tick server stores them
 
-        f1_data = pd.merge(
+        Args:
+            data (pd.DataFrame): output of process_data
+
+        Returns:
+            pd.DataFrame
+        """
+        return data.astype({col: float for col in DECIMAL_COLUMNS if col in data})
+
+    @staticmethod
+    def merge_f2_data(f1_data: pd.DataFrame, f2_data: pd.DataFrame) -> pd.DataFrame:
+        return pd.merge(
             f1_data,
             f2_data,
             on=["datetime", "date"],
             how="outer",
             sort=True,
         )
-        f1_data = f1_data.ffill()
+
+    @staticmethod
+    def align_roll_f2(f1_data: pd.DataFrame, prefix_path: str) -> pd.DataFrame:
+        """
+        Attach F2 prices to the F1 ticks of roll days
+
+        Args:
+            f1_data (pd.DataFrame)
+            prefix_path (str)
+
+        Returns:
+            pd.DataFrame
+        """
+        trading_dates = f1_data["date"].unique().tolist()
+        roll_dates = get_roll_dates(
+            trading_dates,
+            get_expired_dates(f1_data["datetime"].iloc[0], f1_data["datetime"].iloc[-1]),
+        )
+        previous_dates = [
+            trading_dates[trading_dates.index(roll_date) - 1]
+            for roll_date in roll_dates
+            if trading_dates.index(roll_date) > 0
+        ]
+        f2_data = Backtesting.read_f2_data(prefix_path, dates=roll_dates + previous_dates)
+        # an empty read parses to a coarser datetime unit than the F1 ticks
+        f2_data["datetime"] = f2_data["datetime"].astype(f1_data["datetime"].dtype)
+
+        on_roll = f1_data["date"].isin(roll_dates).to_numpy()
+        aligned = pd.merge_asof(
+            f1_data.loc[on_roll, ["datetime"]],
+            f2_data.drop(columns="date").sort_values("datetime"),
+            on="datetime",
+            direction="backward",
+        )
+        for col in ["f2-tickersymbol", "f2_price", "f2_close"]:
+            f1_data[col] = np.nan
+            f1_data[col] = f1_data[col].astype(object)
+            f1_data.loc[on_roll, col] = aligned[col].to_numpy()
+
         return f1_data
 
-    def run(self, data: pd.DataFrame, step: Decimal):
+    def set_parameters(self, skew=None, refresh=None, policy=None):
+        """
+        Override quoting parameters for the next run
+
+        Args:
+            skew (float, optional): inventory skew coefficient
+            refresh (int, optional): requote interval in seconds
+            policy (QuotePolicy, optional): single-instance quote policy
+                replacing the inventory skew rule
+        """
+        if skew is not None:
+            self.skew = float(skew)
+        if refresh is not None:
+            self.refresh = int(refresh)
+        if policy is not None:
+            self.policy = policy
+
+    def run(self, data: pd.DataFrame, step: Decimal, skew=None, refresh=None, day_callback=None):
         """
         Main backtesting function
+
+        Args:
+            data (pd.DataFrame): processed tick data
+            step (Decimal): base quote distance
+            skew (float, optional): inventory skew coefficient. Defaults to config skew.
+            refresh (int, optional): requote interval in seconds. Defaults to config time.
+            day_callback (Callable, optional): called with the backtest after every
+                trading day, e.g. to read live_metric; raising stops the run.
         """
+        self.set_parameters(skew, refresh)
 
         trading_dates = data["date"].unique().tolist()
 
@@ -244,15 +618,64 @@ class Backtesting:
         end_date = data["datetime"].iloc[-1]
         expiration_dates = get_expired_dates(start_date, end_date)
 
-        cur_index = 0
+        days = (day for _, day in data.groupby("date", sort=False))
+        self.run_days(
+            zip(days, trading_dates[1:] + [None]), step, expiration_dates, day_callback
+        )
+
+    def run_days(
+        self,
+        days: Iterable[Tuple[pd.DataFrame, Optional[date]]],
+        step: Decimal,
+        expiration_dates: Queue,
+        day_callback=None,
+    ):
+        """
+        Run consecutive trading days
+
+        Args:
+            days (Iterable[Tuple[pd.DataFrame, Optional[date]]]): each day's ticks
+                with the next trading date, None for the last day
+            step (Decimal): base quote distance
+            expiration_dates (Queue): output of get_expired_dates, consumed
+            day_callback (Callable, optional): called with the backtest after every day
+        """
+        for day, next_date in days:
+            self.run_day(day, step, next_date, expiration_dates)
+            if day_callback is not None:
+                day_callback(self)
+
+        self.metric = Metric(self.daily_returns, None)
+
+    def run_day(
+        self,
+        day: pd.DataFrame,
+        step: Decimal,
+        next_date: Optional[date],
+        expiration_dates: Queue,
+    ):
+        """
+        Run one trading day and realize its pnl
+
+        State carried to the next day is inventory, inventory_price, assets
+        and the remaining expiration dates.
+
+        Args:
+            day (pd.DataFrame): the day's ticks
+            step (Decimal): base quote distance
+            next_date (Optional[date]): next trading date, None for the last day
+            expiration_dates (Queue): output of get_expired_dates, consumed
+        """
         moving_to_f2 = False
-        for index, row in data.iterrows():
+        self.last_day_ticks = len(day)
+        for _, row in day.iterrows():
+            self.tick += 1
             self.cur_date = row["datetime"]
             self.ticker = row["tickersymbol"]
             if (
-                cur_index != len(trading_dates) - 1
+                next_date is not None
                 and not expiration_dates.empty()
-                and trading_dates[cur_index + 1] >= expiration_dates.queue[0]
+                and next_date >= expiration_dates.queue[0]
             ):
                 self.move_f1_to_f2(row["price"], row["f2_price"])
                 expiration_dates.get()
@@ -263,26 +686,23 @@ class Backtesting:
                 row["f2_price"] if moving_to_f2 else row["price"], step, row["datetime"]
             )
 
-            if index == len(data) - 1 or row["date"] != data.iloc[index + 1]["date"]:
-                cur_index += 1
-                self.update_pnl(row["f2_close"] if moving_to_f2 else row["close"])
-                if self.printable:
-                    print(
-                        f"Realized asset {row['date']}: {int(self.daily_assets[-1] * Decimal('1000'))} VND"
-                    )
-                if moving_to_f2:
-                    self.monthly_tracking.append([row["date"], self.daily_assets[-1]])
-
-                moving_to_f2 = False
-                self.ac_loss = Decimal("0.0")
-                self.bid_price = None
-                self.ask_price = None
-                self.old_timestamp = None
-
-                self.tracking_dates.append(row["date"])
-                self.daily_inventory.append(self.inventory)
+        self.update_pnl(row["f2_close"] if moving_to_f2 else row["close"])
+        if self.printable:
+            print(
+                f"Realized asset {row['date']}: {int(self.daily_assets[-1] * Decimal('1000'))} VND, "
+                f"live Sharpe {self.live_metric.sharpe_ratio() * np.sqrt(250):.4f}, "
+                f"MDD {self.live_metric.maximum_drawdown():.4f}"
+            )
+        if moving_to_f2:
+            self.monthly_tracking.append([row["date"], self.daily_assets[-1]])
 
-        self.metric = Metric(self.daily_returns, None)
+        self.ac_loss = Decimal("0.0")
+        self.bid_price = None
+        self.ask_price = None
+        self.old_timestamp = None
+
+        self.tracking_dates.append(row["date"])
+        self.daily_inventory.append(self.inventory)
 
     def plot_hpr(self, path="result/backtest/hpr.svg"):
         """
@@ -353,12 +773,20 @@ class Backtesting:
 
 
 def main():
+    data = Backtesting.process_data()
+    if "compression_ratio" in data.attrs:
+        print(f"Coalesced ticks: {data.attrs['compression_ratio']:.2f}x fewer rows")
+    monitor = monitor_from_env(total_days=data["date"].nunique())
     bt = Backtesting(
         capital=Decimal("5e5"),
+        printable=monitor is None,
     )
 
-    data = bt.process_data()
-    bt.run(data, Decimal("1.8"))
+    if monitor is None:
+        bt.run(data, Decimal("1.8"))
+    else:
+        with monitor:
+            bt.run(data, Decimal("1.8"), day_callback=monitor.day_callback)
 
     sharpe = bt.metric.sharpe_ratio(risk_free_return=Decimal('0.00023')) * Decimal(np.sqrt(250))
     sortino = bt.metric.sortino_ratio(risk_free_return=Decimal('0.00023')) * Decimal(np.sqrt(250))
@@ -368,6 +796,23 @@ def main():
     print(f"Sortino ratio: {sortino}")
     print(f"Maximum drawdown: {mdd}")
 
+    equity = bt.get_intraday_equity(data)
+    save_equity(equity, "result/backtest/intraday_equity.npz")
+    intraday_mdd = intraday_maximum_drawdown(equity, bt.daily_assets[0])
+    underwater = time_under_water(equity, bt.daily_assets[0])
+    print(f"Intraday maximum drawdown: {intraday_mdd}")
+    print(f"Time under water: {underwater['fraction']:.2%}, longest {underwater['longest_seconds']:.0f}s")
+
+    intervals = confidence_intervals(bt.daily_returns)
+    for name, (lower, upper) in intervals.items():
+        print(f"{name} {CONFIDENCE:.0%} CI: [{lower}, {upper}]")
+
+    attribution = attribute_backtest(bt, data)
+    save_attribution(attribution, "result/backtest/attribution.csv")
+    totals = attribution_totals(attribution).iloc[0]
+    for name in COMPONENTS:
+        print(f"{name.capitalize()} pnl: {int(totals[name] * 1000)} VND")
+
     monthly_df = pd.DataFrame(bt.monthly_tracking, columns=["date", "asset"])
     returns = get_returns(monthly_df)
 
@@ -378,6 +823,7 @@ def main():
     bt.plot_hpr()
     bt.plot_drawdown()
     bt.plot_inventory()
+    plot_attribution(attribution, "result/backtest/attribution.svg")
 
     with pv.step("in_sample_backtest") as r:
         r.metric("sharpe_ratio",     float(sharpe),                    unit="ratio")
@@ -386,9 +832,18 @@ def main():
         r.metric("hpr",              float(bt.metric.hpr()),           unit="ratio")
         r.metric("monthly_return",   float(returns['monthly_return']), unit="ratio")
         r.metric("annual_return",    float(returns['annual_return']),  unit="ratio")
+        r.metric("intraday_maximum_drawdown", intraday_mdd,           unit="ratio")
+        r.metric("time_under_water", underwater["fraction"],          unit="ratio")
         r.artifact("equity_curve",   "result/backtest/hpr.svg",       kind="chart")
         r.artifact("drawdown_chart", "result/backtest/drawdown.svg",  kind="chart")
         r.artifact("inventory",      "result/backtest/inventory.svg", kind="chart")
+        r.artifact("pnl_attribution", "result/backtest/attribution.svg", kind="chart")
+        r.artifact("pnl_attribution_table", "result/backtest/attribution.csv", kind="table")
+        for name in COMPONENTS:
+            r.metric(f"{name}_pnl", float(totals[name]), unit="kVND")
+        for name, (lower, upper) in intervals.items():
+            r.metric(f"{name}_ci_lower", lower, unit="ratio")
+            r.metric(f"{name}_ci_upper", upper, unit="ratio")
         r.metadata(seed=2025)
 
 
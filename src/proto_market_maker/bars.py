@@ -0,0 +1,192 @@
+"""
+Bar-mode backtesting module
+
+Quotes only move on a timed requote or after a fill, so the ticks inside one
+requote window are summarized by the window's open, high, low and last price
+of F1 and F2. Windows follow the engine's own requote cadence (see
+``get_requote_window_starts``), so every bar starts exactly where the tick
+engine would requote.
+
+Fill-ordering assumption: each bar is replayed through the unchanged tick
+engine as up to four prices stamped with the window start,
+
+    open -> low -> high -> last    when last >= open
+    open -> high -> low -> last    otherwise
+
+so a bar can fill the bid, requote at the fill price and then fill the ask
+(or the reverse) once. Fills execute at the bar extreme rather than at the
+first tick crossing the quote, which is optimistic; ``pmm-bar-drift``
+measures the resulting gap against tick mode.
+"""
+
+import os
+import time
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.config.config import BACKTESTING_CONFIG, BEST_CONFIG
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.cache import load_cached
+from proto_market_maker.metrics.metric import summarize
+from proto_market_maker.utils import get_requote_window_starts
+
+RESULT_PATH = "result/bars/drift.csv"
+BAR_COLUMNS = ["datetime", "date", "tickersymbol", "f2-tickersymbol", "close", "f2_close"]
+
+
+def build_bars(data: pd.DataFrame, refresh: int) -> pd.DataFrame:
+    """
+    Aggregate processed ticks into requote-window bars
+
+    Args:
+        data (pd.DataFrame): output of Backtesting.process_data
+        refresh (int): requote interval in seconds
+
+    Returns:
+        pd.DataFrame: one row per window, prices as floats
+    """
+    starts = get_requote_window_starts(data["datetime"], data["date"].to_numpy(), refresh)
+    prices = pd.DataFrame({
+        "window": np.cumsum(starts) - 1,
+        "price": data["price"].astype(float).to_numpy(),
+        "f2_price": data["f2_price"].astype(float).to_numpy(),
+    })
+    ohlc = prices.groupby("window").agg(
+        open=("price", "first"),
+        high=("price", "max"),
+        low=("price", "min"),
+        last=("price", "last"),
+        f2_open=("f2_price", "first"),
+        f2_high=("f2_price", "max"),
+        f2_low=("f2_price", "min"),
+        f2_last=("f2_price", "last"),
+    )
+
+    bars = data.loc[starts, BAR_COLUMNS].reset_index(drop=True)
+    bars["close"] = bars["close"].astype(float)
+    bars["f2_close"] = bars["f2_close"].astype(float)
+    bars["ticks"] = np.bincount(prices["window"])
+    return pd.concat([bars, ohlc.reset_index(drop=True)], axis=1)
+
+
+def load_bars(refresh: int, evaluation=False, coalesce=None) -> pd.DataFrame:
+    """
+    Load requote-window bars from the processed-data cache
+
+    Args:
+        refresh (int): requote interval in seconds
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+        coalesce (bool, optional): build from coalesced ticks. Defaults to
+            config coalesce.
+
+    Returns:
+        pd.DataFrame
+    """
+    lazy_f2 = BACKTESTING_CONFIG["lazy_f2"]
+    if coalesce is None:
+        coalesce = BACKTESTING_CONFIG["coalesce"]
+    return load_cached(
+        f"bars_{refresh}s{'_lazy_f2' if lazy_f2 else ''}{'_coalesced' if coalesce else ''}",
+        lambda: build_bars(
+            Backtesting.process_data(evaluation=evaluation, coalesce=coalesce, refreshes=[refresh]),
+            refresh,
+        ),
+        evaluation=evaluation,
+    )
+
+
+def _changed(values: np.ndarray) -> np.ndarray:
+    # missing F2 prices (lazy_f2 outside roll days) count as equal
+    return ~((values[1:] == values[:-1]) | (np.isnan(values[1:]) & np.isnan(values[:-1])))
+
+
+def _bar_path(open_, high, low, last) -> np.ndarray:
+    rising = last >= open_
+    first = np.where(rising, low, high)
+    second = np.where(rising, high, low)
+    return np.stack([open_, first, second, last], axis=1).ravel()
+
+
+def _to_decimal(values: np.ndarray) -> list:
+    return [Decimal(str(round(value, 10))) if value == value else value for value in values]
+
+
+def bars_to_ticks(bars: pd.DataFrame) -> pd.DataFrame:
+    """
+    Expand bars into the price paths the tick engine replays
+
+    Path points repeating the previous point of the same bar are dropped:
+    with the quotes off the matched price they cannot fill or requote.
+
+    Args:
+        bars (pd.DataFrame): output of build_bars
+
+    Returns:
+        pd.DataFrame: frame with the columns Backtesting.run reads
+    """
+    f1 = _bar_path(*(bars[col].to_numpy() for col in ["open", "high", "low", "last"]))
+    f2 = _bar_path(*(bars[col].to_numpy() for col in ["f2_open", "f2_high", "f2_low", "f2_last"]))
+    keep = np.ones(len(f1), dtype=bool)
+    keep[1:] = _changed(f1) | _changed(f2)
+    keep[::4] = True
+
+    ticks = bars.loc[bars.index.repeat(4)[keep], BAR_COLUMNS].reset_index(drop=True)
+    ticks["price"] = _to_decimal(f1[keep])
+    ticks["f2_price"] = _to_decimal(f2[keep])
+    ticks["close"] = _to_decimal(ticks["close"].to_numpy())
+    ticks["f2_close"] = _to_decimal(ticks["f2_close"].to_numpy())
+    return ticks
+
+
+def run_bars(bt: Backtesting, bars: pd.DataFrame, step: Decimal, **kwargs):
+    """
+    Run bt on bars; the bars must match bt's requote interval
+
+    Args:
+        bt (Backtesting)
+        bars (pd.DataFrame): output of build_bars
+        step (Decimal)
+        **kwargs: forwarded to Backtesting.run
+    """
+    bt.run(bars_to_ticks(bars), step, **kwargs)
+
+
+def main():
+    """
+    Measure bar-mode metric drift from tick mode
+    """
+    refresh = int(BACKTESTING_CONFIG["time"])
+    data = Backtesting.process_data()
+    bars = load_bars(refresh)
+    print(f"{len(data)} ticks -> {len(bars)} bars ({len(bars_to_ticks(bars))} bar-mode iterations)")
+
+    rows = []
+    for step in sorted({Decimal("1.8"), Decimal(str(BEST_CONFIG["step"]))}):
+        for mode in ["tick", "bar"]:
+            bt = Backtesting(capital=Decimal("5e5"), printable=False)
+            start = time.perf_counter()
+            if mode == "tick":
+                bt.run(data, step, refresh=refresh)
+            else:
+                run_bars(bt, bars, step, refresh=refresh)
+            rows.append({
+                "step": float(step),
+                "mode": mode,
+                "seconds": time.perf_counter() - start,
+                **summarize(bt.metric),
+            })
+
+    results = pd.DataFrame(rows).set_index(["step", "mode"])
+    drift = results.xs("bar", level="mode") - results.xs("tick", level="mode")
+    print(results.to_string())
+    print("Drift (bar - tick):")
+    print(drift.to_string())
+
+    os.makedirs(os.path.dirname(RESULT_PATH), exist_ok=True)
+    results.to_csv(RESULT_PATH)
+
+
+if __name__ == "__main__":
+    main()
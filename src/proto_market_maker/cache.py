@@ -0,0 +1,79 @@
+"""
+Processed data cache module
+
+Derived frames are pickled under ``data/<is|os>/cache/`` and rebuilt whenever
+one of the source CSV files is newer than the cached copy.
+"""
+
+import os
+from typing import Callable, List
+
+import pandas as pd
+
+CACHE_DIR = "cache"
+
+
+def get_prefix_path(evaluation=False) -> str:
+    return "data/os/" if evaluation else "data/is/"
+
+
+def get_source_paths(evaluation=False) -> List[str]:
+    """
+    CSV files every processed frame is derived from
+
+    Args:
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+
+    Returns:
+        List[str]
+    """
+    prefix_path = get_prefix_path(evaluation)
+    return [f"{prefix_path}VN30F1M_data.csv", f"{prefix_path}VN30F2M_data.csv"]
+
+
+def get_cache_path(name: str, evaluation=False) -> str:
+    return f"{get_prefix_path(evaluation)}{CACHE_DIR}/{name}.pkl"
+
+
+def is_fresh(path: str, sources: List[str]) -> bool:
+    """
+    Check that path exists and is not older than any source
+
+    Args:
+        path (str)
+        sources (List[str])
+
+    Returns:
+        bool
+    """
+    if not os.path.exists(path):
+        return False
+
+    modified = os.path.getmtime(path)
+    return all(
+        os.path.getmtime(source) <= modified for source in sources if os.path.exists(source)
+    )
+
+
+def load_cached(
+    name: str, build: Callable[[], pd.DataFrame], evaluation=False
+) -> pd.DataFrame:
+    """
+    Load frame name from the cache, building and storing it when stale
+
+    Args:
+        name (str): cache entry, including any parameter it depends on
+        build (Callable[[], pd.DataFrame])
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+
+    Returns:
+        pd.DataFrame
+    """
+    path = get_cache_path(name, evaluation)
+    if is_fresh(path, get_source_paths(evaluation)):
+        return pd.read_pickle(path)
+
+    frame = build()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frame.to_pickle(path)
+    return frame
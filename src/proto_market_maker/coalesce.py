@@ -0,0 +1,110 @@
+"""
+Lossless tick coalescing module
+
+A tick repeating the traded price of the tick before it, within the same day
+and requote window, cannot change a run once two such ticks have been
+processed. The first one may fill and requote around the price, the second
+may liquidate what the fill's ac_loss no longer covers. After that, the
+quotes lie strictly on either side of the price and the capital checks
+already hold there. Coalescing therefore keeps, in every run of equal prices,
+the first two ticks, plus every requote window start and the last tick of
+each day, and drops the rest.
+
+Daily results and fills are then bit-identical in every engine for the
+requote intervals the data was coalesced for, as long as quotes never sit at
+or through the price they are placed around (InventorySkewPolicy with step
+above half a tick and non-negative skew).
+"""
+
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.utils import (
+    get_expired_dates,
+    get_requote_window_starts,
+    get_roll_dates,
+)
+
+
+def get_keep_mask(
+    datetimes: pd.Series, dates, prices: np.ndarray, refreshes: Iterable[int]
+) -> np.ndarray:
+    """
+    Mark the ticks a coalesced stream keeps
+
+    Args:
+        datetimes (pd.Series): tick timestamps, sorted
+        dates: trading date of each tick
+        prices (np.ndarray): traded price of each tick, or one column per price
+            the engines may read; a change in any column starts a new run
+        refreshes (Iterable[int]): requote intervals in seconds
+
+    Returns:
+        np.ndarray: boolean mask of kept ticks
+    """
+    dates = np.asarray(dates)
+    prices = np.asarray(prices, dtype=float).reshape(len(dates), -1)
+    day_starts = np.r_[True, dates[1:] != dates[:-1]]
+    day_ends = np.r_[day_starts[1:], True]
+
+    same = (prices[1:] == prices[:-1]) | (np.isnan(prices[1:]) & np.isnan(prices[:-1]))
+    heads = day_starts | np.r_[True, ~same.all(axis=1)]
+    for refresh in refreshes:
+        heads |= get_requote_window_starts(datetimes, dates, refresh)
+
+    positions = np.arange(len(dates))
+    run_starts = np.maximum.accumulate(np.where(heads, positions, 0))
+    return (positions - run_starts < 2) | day_ends
+
+
+def coalesce_ticks(data: pd.DataFrame, refreshes: Iterable[int]) -> pd.DataFrame:
+    """
+    Drop the ticks no run with the given requote intervals can tell apart
+
+    Runs compare the price the engines trade: F2 on roll days, F1 otherwise.
+
+    Args:
+        data (pd.DataFrame): output of Backtesting.process_data
+        refreshes (Iterable[int]): requote intervals in seconds
+
+    Returns:
+        pd.DataFrame: kept rows, with attrs["compression_ratio"] the input
+            rows per kept row
+    """
+    trading_dates = data["date"].unique().tolist()
+    roll_dates = get_roll_dates(
+        trading_dates,
+        get_expired_dates(data["datetime"].iloc[0], data["datetime"].iloc[-1]),
+    )
+    rolling = data["date"].isin(roll_dates).to_numpy()
+    prices = np.where(rolling, data["f2_price"], data["price"]).astype(float)
+
+    keep = get_keep_mask(data["datetime"], data["date"], prices, refreshes)
+    coalesced = data[keep]
+    coalesced.attrs = {**data.attrs, "compression_ratio": len(data) / max(len(coalesced), 1)}
+    return coalesced
+
+
+def coalesce_day(day: pd.DataFrame, refreshes: Iterable[int]) -> pd.DataFrame:
+    """
+    Coalesce one day without knowing whether it rolls
+
+    Runs break on a change of either the F1 or the F2 price, so the result
+    holds whichever price the day trades.
+
+    Args:
+        day (pd.DataFrame): one trading day of processed data
+        refreshes (Iterable[int]): requote intervals in seconds
+
+    Returns:
+        pd.DataFrame
+    """
+    prices = day[["price", "f2_price"]].astype(float).to_numpy()
+    return day[get_keep_mask(day["datetime"], day["date"], prices, refreshes)]
+
+
+def get_coalesced_name(refreshes: Iterable[int], lazy_f2=False) -> str:
+    intervals = "_".join(str(refresh) for refresh in sorted(set(refreshes)))
+    return f"coalesced_{'lazy_' if lazy_f2 else ''}{intervals}"
@@ -33,3 +33,23 @@ with open("parameter/optimization_parameter.json", 'r', encoding="utf-8") as f:
 BEST_CONFIG = None
 with open("parameter/optimized_parameter.json", 'r', encoding="utf-8") as f:
     BEST_CONFIG = json.load(f)
+
+GRID_CONFIG = None
+with open("parameter/grid_parameter.json", 'r', encoding="utf-8") as f:
+    GRID_CONFIG = json.load(f)
+
+STRESS_CONFIG = None
+with open("parameter/stress_parameter.json", 'r', encoding="utf-8") as f:
+    STRESS_CONFIG = json.load(f)
+
+REPRICE_CONFIG = None
+with open("parameter/reprice_parameter.json", 'r', encoding="utf-8") as f:
+    REPRICE_CONFIG = json.load(f)
+
+CPCV_CONFIG = None
+with open("parameter/cpcv_parameter.json", 'r', encoding="utf-8") as f:
+    CPCV_CONFIG = json.load(f)
+
+MONITOR_PORT = os.getenv("PMM_MONITOR_PORT")
+MONITOR_STATUS_FILE = os.getenv("PMM_STATUS_FILE")
+TICK_SERVER_SOCKET = os.getenv("PMM_TICK_SOCKET") or "data/tickserver.sock"
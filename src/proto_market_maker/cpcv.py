@@ -0,0 +1,239 @@
+"""
+Combinatorial purged cross-validation module
+
+The trading calendar is split into n_groups contiguous groups. Every step is
+backtested once per group, starting flat with the full capital and following
+the roll schedule of the full calendar, so the daily returns of a group are
+simulated once and reused by every train/test combination.
+
+For each choice of n_test_groups test groups, training days within
+purge_days before and embargo_days after a test group are dropped. The step
+with the best training Sharpe ratio is then ranked among all steps on the
+test groups. The probability of backtest overfitting (PBO) is the share of
+combinations where that step ranks in the bottom half out of sample.
+"""
+
+import os
+import itertools
+from decimal import Decimal
+from multiprocessing import Pool
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.config.config import CPCV_CONFIG
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.utils import get_expired_dates, get_pending_expirations
+
+RESULT_PATH = "result/cpcv/cpcv.csv"
+RISK_FREE_RETURN = 0.00023
+PERIODS_PER_YEAR = 250
+
+_DAYS = None
+_GROUPS = None
+_CAPITAL = None
+_BOUNDS = None
+
+
+def split_groups(no_days: int, n_groups: int) -> List[np.ndarray]:
+    """
+    Split day indices into contiguous groups of near-equal size
+
+    Args:
+        no_days (int)
+        n_groups (int)
+
+    Returns:
+        List[np.ndarray]
+    """
+    return np.array_split(np.arange(no_days), n_groups)
+
+
+def get_train_mask(
+    groups: List[np.ndarray], test_groups: Tuple[int, ...], purge_days=0, embargo_days=0
+) -> np.ndarray:
+    """
+    Training days of a combination, purged and embargoed around the test groups
+
+    Args:
+        groups (List[np.ndarray]): output of split_groups
+        test_groups (Tuple[int, ...]): indices of the test groups
+        purge_days (int, optional): training days dropped before a test group
+        embargo_days (int, optional): training days dropped after a test group
+
+    Returns:
+        np.ndarray: boolean per day
+    """
+    no_days = groups[-1][-1] + 1
+    train = np.ones(no_days, dtype=bool)
+    for group in test_groups:
+        first, last = groups[group][0], groups[group][-1]
+        train[max(first - purge_days, 0):last + embargo_days + 1] = False
+    return train
+
+
+def sharpe_ratios(returns: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Annualized Sharpe ratio of every row over the masked days
+
+    Args:
+        returns (np.ndarray): steps x days daily returns
+        mask (np.ndarray): boolean per day
+
+    Returns:
+        np.ndarray: nan where returns do not vary
+    """
+    selected = returns[:, mask]
+    std = selected.std(axis=1, ddof=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = (selected.mean(axis=1) - RISK_FREE_RETURN) / std
+    return np.where(std > 0, sharpe * np.sqrt(PERIODS_PER_YEAR), np.nan)
+
+
+def _init_worker(evaluation: bool, capital: str, n_groups: int):
+    global _DAYS, _GROUPS, _CAPITAL, _BOUNDS
+    data = Backtesting.process_data(evaluation=evaluation)
+    _DAYS = [(trading_date, day) for trading_date, day in data.groupby("date", sort=False)]
+    _GROUPS = split_groups(len(_DAYS), n_groups)
+    _CAPITAL = Decimal(capital)
+    _BOUNDS = (data["datetime"].iloc[0], data["datetime"].iloc[-1])
+
+
+def run_group(job: Tuple[str, int]) -> Tuple[str, int, List[float]]:
+    """
+    Backtest one step on one group of the worker's data
+
+    Args:
+        job (Tuple[str, int]): step and group index
+
+    Returns:
+        Tuple[str, int, List[float]]: step, group index and daily returns
+    """
+    step, group = job
+    trading_dates = [trading_date for trading_date, _ in _DAYS]
+    next_dates = trading_dates[1:] + [None]
+    indices = _GROUPS[group]
+
+    bt = Backtesting(capital=_CAPITAL, printable=False)
+    bt.run_days(
+        ((_DAYS[index][1], next_dates[index]) for index in indices),
+        Decimal(step),
+        get_pending_expirations(trading_dates, indices[0], get_expired_dates(*_BOUNDS)),
+    )
+    return step, group, [float(value) for value in bt.daily_returns]
+
+
+def evaluate_combinations(
+    returns: np.ndarray,
+    steps: List[str],
+    groups: List[np.ndarray],
+    n_test_groups: int,
+    purge_days=0,
+    embargo_days=0,
+) -> pd.DataFrame:
+    """
+    Select on the training days and rank on the test days of every combination
+
+    Args:
+        returns (np.ndarray): steps x days daily returns
+        steps (List[str]): step of each row
+        groups (List[np.ndarray]): output of split_groups
+        n_test_groups (int)
+        purge_days (int, optional)
+        embargo_days (int, optional)
+
+    Returns:
+        pd.DataFrame: one row per combination
+    """
+    rows = []
+    for test_groups in itertools.combinations(range(len(groups)), n_test_groups):
+        train = get_train_mask(groups, test_groups, purge_days, embargo_days)
+        test = np.zeros(len(train), dtype=bool)
+        test[np.concatenate([groups[group] for group in test_groups])] = True
+
+        train_sharpe = sharpe_ratios(returns, train)
+        test_sharpe = sharpe_ratios(returns, test)
+        best = int(np.argmax(np.nan_to_num(train_sharpe, nan=-np.inf)))
+        rank = pd.Series(test_sharpe).rank(na_option="top").iloc[best]
+        omega = rank / (len(steps) + 1)
+        rows.append({
+            "test_groups": "-".join(str(group) for group in test_groups),
+            "train_days": int(train.sum()),
+            "test_days": int(test.sum()),
+            "step": steps[best],
+            "train_sharpe": train_sharpe[best],
+            "test_sharpe": test_sharpe[best],
+            "test_rank": rank,
+            "logit": np.log(omega / (1 - omega)),
+        })
+    return pd.DataFrame(rows)
+
+
+def get_pbo(combinations: pd.DataFrame) -> float:
+    """
+    Probability of backtest overfitting
+
+    Args:
+        combinations (pd.DataFrame): output of evaluate_combinations
+
+    Returns:
+        float
+    """
+    return float((combinations["logit"] <= 0).mean())
+
+
+def run_cpcv(config: Dict, evaluation=False, processes=None) -> pd.DataFrame:
+    """
+    Run every (step, group) backtest once, then evaluate all combinations
+
+    Args:
+        config (Dict): CPCV configuration
+        evaluation (bool, optional): use out-of-sample data. Defaults to False.
+        processes (int, optional): pool size. Defaults to config["processes"].
+
+    Returns:
+        pd.DataFrame: output of evaluate_combinations
+    """
+    steps = [str(step) for step in config["step"]]
+    n_groups = config["n_groups"]
+    jobs = list(itertools.product(steps, range(n_groups)))
+
+    results = {}
+    with Pool(
+        processes or config.get("processes"),
+        initializer=_init_worker,
+        initargs=(evaluation, config.get("capital", "5e5"), n_groups),
+    ) as pool:
+        for done, (step, group, returns) in enumerate(
+            pool.imap_unordered(run_group, jobs), start=1
+        ):
+            results[step, group] = returns
+            print(f"[{done}/{len(jobs)}] step={step} group={group}")
+
+    returns = np.array([
+        np.concatenate([results[step, group] for group in range(n_groups)]) for step in steps
+    ])
+    groups = split_groups(returns.shape[1], n_groups)
+    return evaluate_combinations(
+        returns,
+        steps,
+        groups,
+        config["n_test_groups"],
+        config.get("purge_days", 0),
+        config.get("embargo_days", 0),
+    )
+
+
+def main():
+    combinations = run_cpcv(CPCV_CONFIG)
+    print(combinations.to_string(index=False))
+    print(f"Probability of backtest overfitting: {get_pbo(combinations):.4f}")
+    print(f"Median test Sharpe of selected step: {combinations['test_sharpe'].median():.4f}")
+
+    os.makedirs(os.path.dirname(RESULT_PATH), exist_ok=True)
+    combinations.to_csv(RESULT_PATH, index=False)
+
+
+if __name__ == "__main__":
+    main()
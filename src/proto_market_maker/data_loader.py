@@ -7,6 +7,7 @@ from datetime import datetime
 import pandas as pd
 from proto_market_maker.database.data_service import DataService
 from proto_market_maker.config.config import BACKTESTING_CONFIG
+from proto_market_maker.orderbook import build_ladder, get_depth_path, save_ladder
 
 
 def init_folder(path: str):
@@ -61,6 +62,16 @@ def loading_bid_ask(from_date, to_date, contract_type, validation=False):
     )
 
 
+def loading_depth(from_date, to_date, contract_type, levels, validation=False):
+    data_service = DataService()
+
+    print(f"Loading {contract_type} depth data...")
+    depth = data_service.get_depth_data(from_date, to_date, contract_type, levels)
+    book = build_ladder(depth, levels)
+    save_ladder(book, get_depth_path(contract_type, validation))
+    print(f"Saved {len(book)} snapshots of {levels} levels")
+
+
 def main():
     required_directories = [
         "data",
@@ -90,6 +101,13 @@ def main():
     loading_bid_ask(os_from_date, os_to_date, "VN30F1M", validation=True)
     loading_bid_ask(os_from_date, os_to_date, "VN30F2M", validation=True)
 
+    levels = int(BACKTESTING_CONFIG["depth_levels"])
+    if levels > 0:
+        print("Loading order book depth")
+        for contract_type in ["VN30F1M", "VN30F2M"]:
+            loading_depth(is_from_date, is_to_date, contract_type, levels)
+            loading_depth(os_from_date, os_to_date, contract_type, levels, validation=True)
+
 
 if __name__ == "__main__":
     main()
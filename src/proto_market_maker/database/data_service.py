@@ -5,7 +5,12 @@ Data service
 import psycopg2
 import pandas as pd
 
-from proto_market_maker.database.query import MATCHED_QUERY, BID_ASK_QUERY, CLOSE_QUERY
+from proto_market_maker.database.query import (
+    MATCHED_QUERY,
+    BID_ASK_QUERY,
+    DEPTH_QUERY,
+    CLOSE_QUERY,
+)
 from proto_market_maker.config.config import db_params
 
 
@@ -83,6 +88,36 @@ class DataService:
         columns = ["datetime", "tickersymbol", "best-bid", "best-ask", "spread"]
         return pd.DataFrame(queries, columns=columns)
 
+    def get_depth_data(
+        self,
+        from_date: str,
+        to_date: str,
+        contract_type: str,
+        levels: int,
+    ) -> pd.DataFrame:
+        """
+        Get bid ask depth data frame, one row per snapshot and level
+
+        Args:
+            from_date (str)
+            to_date (str)
+            contract_type (str)
+            levels (int): deepest level loaded
+
+        Returns:
+            pd.DataFrame
+        """
+        cursor = self.connection.cursor()
+        cursor.execute(DEPTH_QUERY, (levels, contract_type, from_date, to_date))
+
+        queries = list(cursor)
+        cursor.close()
+
+        columns = [
+            "datetime", "tickersymbol", "depth", "bid_price", "bid_size", "ask_price", "ask_size"
+        ]
+        return pd.DataFrame(queries, columns=columns)
+
     def get_close_price(
         self,
         from_date: str,
@@ -23,6 +23,17 @@ BID_ASK_QUERY = """
   order by b.datetime
 """
 
+DEPTH_QUERY = """
+  select b.datetime, b.tickersymbol, b.depth, b.price, b.quantity, a.price, a.quantity
+  from quote.bidprice b join quote.askprice a
+  on b.datetime = a.datetime and b.tickersymbol = a.tickersymbol and b.depth = a.depth
+  join quote.futurecontractcode fc on date(b.datetime) = fc.datetime and fc.tickersymbol = b.tickersymbol
+  where b.depth <= %s and fc.futurecode = %s and b.datetime between %s and %s and
+        ((EXTRACT(HOUR FROM b.datetime) >= 9 AND EXTRACT(HOUR FROM b.datetime) < 14)
+        OR (EXTRACT(HOUR FROM b.datetime) = 14 AND EXTRACT(MINUTE FROM b.datetime) <= 30))
+  order by b.datetime, b.depth
+"""
+
 CLOSE_QUERY = """
   select c.datetime, c.tickersymbol, c.price
   from quote.close c
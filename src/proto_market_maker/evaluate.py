@@ -11,13 +11,25 @@ import plutus_verify as pv
 from proto_market_maker.config.config import BEST_CONFIG
 from proto_market_maker.backtest import Backtesting
 from proto_market_maker.metrics.metric import get_returns
+from proto_market_maker.metrics.bootstrap import confidence_intervals, CONFIDENCE
+from proto_market_maker.metrics.intraday import (
+    intraday_maximum_drawdown,
+    save_equity,
+    time_under_water,
+)
+from proto_market_maker.monitor import monitor_from_env
 
 
 def main():
     data = Backtesting.process_data(evaluation=True)
-    bt = Backtesting(capital=Decimal('5e5'))
+    monitor = monitor_from_env(total_days=data["date"].nunique())
+    bt = Backtesting(capital=Decimal('5e5'), printable=monitor is None)
 
-    bt.run(data, Decimal(BEST_CONFIG["step"]))
+    if monitor is None:
+        bt.run(data, Decimal(BEST_CONFIG["step"]))
+    else:
+        with monitor:
+            bt.run(data, Decimal(BEST_CONFIG["step"]), day_callback=monitor.day_callback)
     bt.plot_hpr(path="result/optimization/hpr.svg")
     bt.plot_drawdown(path="result/optimization/drawdown.svg")
     bt.plot_inventory(path="result/optimization/inventory.svg")
@@ -36,6 +48,17 @@ def main():
     print(f"Sortino ratio: {sortino}")
     print(f"Maximum drawdown: {mdd}")
 
+    equity = bt.get_intraday_equity(data)
+    save_equity(equity, "result/optimization/intraday_equity.npz")
+    intraday_mdd = intraday_maximum_drawdown(equity, bt.daily_assets[0])
+    underwater = time_under_water(equity, bt.daily_assets[0])
+    print(f"Intraday maximum drawdown: {intraday_mdd}")
+    print(f"Time under water: {underwater['fraction']:.2%}, longest {underwater['longest_seconds']:.0f}s")
+
+    intervals = confidence_intervals(bt.daily_returns)
+    for name, (lower, upper) in intervals.items():
+        print(f"{name} {CONFIDENCE:.0%} CI: [{lower}, {upper}]")
+
     with pv.step("out_of_sample_backtest") as r:
         r.metric("sharpe_ratio",     float(sharpe),                    unit="ratio")
         r.metric("sortino_ratio",    float(sortino),                   unit="ratio")
@@ -43,9 +66,14 @@ def main():
         r.metric("hpr",              float(bt.metric.hpr()),           unit="ratio")
         r.metric("monthly_return",   float(returns['monthly_return']), unit="ratio")
         r.metric("annual_return",    float(returns['annual_return']),  unit="ratio")
+        r.metric("intraday_maximum_drawdown", intraday_mdd,           unit="ratio")
+        r.metric("time_under_water", underwater["fraction"],          unit="ratio")
         r.artifact("equity_curve",   "result/optimization/hpr.svg",       kind="chart")
         r.artifact("drawdown_chart", "result/optimization/drawdown.svg",  kind="chart")
         r.artifact("inventory",      "result/optimization/inventory.svg", kind="chart")
+        for name, (lower, upper) in intervals.items():
+            r.metric(f"{name}_ci_lower", lower, unit="ratio")
+            r.metric(f"{name}_ci_upper", upper, unit="ratio")
         r.metadata(seed=2025)
 
 
@@ -0,0 +1,225 @@
+"""
+This module is used for daily pnl attribution
+
+Each day's pnl is split into components that add up to it exactly:
+
+    spread: edge of every fill against the price prevailing before it, the
+        last traded price earlier that day, times the multiplier
+    drift: what held inventory gained or lost as prices moved, the rest of
+        the closed and marked pnl once the spread is taken out
+    roll: pnl realized closing F1 at the roll in move_f1_to_f2
+    force: pnl charged by forced liquidations in handle_force_sell
+    fees: fees of closes, rolls and forced liquidations
+
+Fill journals of many runs over the same data are stacked with a run column
+and attributed at once: every record is reduced into a (run, day) cell with
+one bincount per component.
+"""
+
+import os
+from typing import List
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.utils import get_expired_dates, get_roll_dates
+
+COMPONENTS = ["spread", "drift", "roll", "force", "fees"]
+
+
+def get_traded_prices(data: pd.DataFrame):
+    """
+    Prices the engines trade: F2 on roll days, F1 otherwise
+
+    Args:
+        data (pd.DataFrame): processed tick data
+
+    Returns:
+        Tuple[list, np.ndarray, np.ndarray, np.ndarray]: trading dates, tick
+            timestamps in ns, day index and traded price of every tick
+    """
+    trading_dates = data["date"].unique().tolist()
+    rolling = data["date"].isin(
+        get_roll_dates(
+            trading_dates,
+            get_expired_dates(data["datetime"].iloc[0], data["datetime"].iloc[-1]),
+        )
+    ).to_numpy()
+    times = data["datetime"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    day_of = pd.Index(trading_dates).get_indexer(data["date"])
+    prices = np.where(rolling, data["f2_price"], data["price"]).astype(float)
+    return trading_dates, times, day_of, prices
+
+
+def get_reference_prices(times: np.ndarray, day_of: np.ndarray, prices: np.ndarray) -> np.ndarray:
+    """
+    Price prevailing before every tick
+
+    The price of the last tick strictly earlier the same day, the tick's own
+    price when there is none or it is missing.
+
+    Args:
+        times (np.ndarray): tick timestamps in ns, sorted
+        day_of (np.ndarray): day index of every tick
+        prices (np.ndarray): traded prices
+
+    Returns:
+        np.ndarray
+    """
+    previous = np.searchsorted(times, times, side="left") - 1
+    valid = previous >= 0
+    valid[valid] = day_of[previous[valid]] == day_of[valid]
+    references = np.where(valid, prices[previous.clip(0)], prices)
+    return np.where(np.isnan(references), prices, references)
+
+
+def stack_fills(journals: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Stack fill journals of several runs, numbering them in a run column
+
+    Args:
+        journals (List[pd.DataFrame]): outputs of Backtesting.get_fills
+
+    Returns:
+        pd.DataFrame
+    """
+    return pd.concat(
+        [journal.assign(run=run) for run, journal in enumerate(journals)], ignore_index=True
+    )
+
+
+def attribution_table(components: np.ndarray, trading_dates: list) -> pd.DataFrame:
+    """
+    Long table of attributed pnl
+
+    Args:
+        components (np.ndarray): (len(COMPONENTS), runs, days) pnl
+        trading_dates (list)
+
+    Returns:
+        pd.DataFrame: run, date, one column per component and pnl, their sum
+    """
+    _, runs, days = components.shape
+    table = pd.DataFrame({
+        "run": np.repeat(np.arange(runs), days),
+        "date": np.tile(np.array(trading_dates, dtype=object), runs),
+    })
+    for name, values in zip(COMPONENTS, components):
+        table[name] = values.ravel()
+    table["pnl"] = components.sum(axis=0).ravel()
+    return table
+
+
+def attribute_fills(
+    fills: pd.DataFrame, data: pd.DataFrame, fee_per_contract, multiplier, runs: int = None
+) -> pd.DataFrame:
+    """
+    Attribute the daily pnl of one or many runs over data
+
+    Args:
+        fills (pd.DataFrame): output of Backtesting.get_fills, or of
+            stack_fills for many runs
+        data (pd.DataFrame): processed tick data of the runs
+        fee_per_contract: fee of one contract, one value or one per run
+        multiplier: contract value of one index point
+        runs (int, optional): number of runs. Defaults to the highest run plus one.
+
+    Returns:
+        pd.DataFrame: output of attribution_table
+    """
+    trading_dates, times, day_of, prices = get_traded_prices(data)
+    references = get_reference_prices(times, day_of, prices)
+
+    run = fills["run"].to_numpy() if "run" in fills else np.zeros(len(fills), dtype=np.int64)
+    if runs is None:
+        runs = int(run.max(initial=-1)) + 1 or 1
+    fee = np.broadcast_to(np.asarray(fee_per_contract, dtype=float), (runs,))[run]
+    multiplier = float(multiplier)
+
+    kind = fills["kind"].to_numpy()
+    price = fills["price"].to_numpy(dtype=float)
+    points = fills["points"].to_numpy(dtype=float) * multiplier
+    traded = np.isin(kind, ["open", "close"])
+
+    fill_times = fills["datetime"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    ticks = (np.searchsorted(times, fill_times, side="right") - 1).clip(0)
+    spread = np.where(
+        traded, fills["side"].to_numpy() * (references[ticks] - price) * multiplier, 0.0
+    )
+
+    cells = run * len(trading_dates) + pd.Index(trading_dates).get_indexer(fills["date"])
+    weights = {
+        "spread": spread,
+        "drift": np.where(np.isin(kind, ["close", "mark"]), points, 0.0) - spread,
+        "roll": np.where(kind == "roll", points, 0.0),
+        "force": np.where(kind == "force", points, 0.0),
+        "fees": -fills["fee_contracts"].to_numpy(dtype=float) * fee,
+    }
+    components = np.stack([
+        np.bincount(cells, weights[name], minlength=runs * len(trading_dates))
+        for name in COMPONENTS
+    ]).reshape(len(COMPONENTS), runs, len(trading_dates))
+    return attribution_table(components, trading_dates)
+
+
+def attribute_backtest(bt, data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Attribute the daily pnl of a finished Backtesting run
+
+    Args:
+        bt (Backtesting): run finished on data
+        data (pd.DataFrame): processed tick data of the run
+
+    Returns:
+        pd.DataFrame: output of attribution_table
+    """
+    return attribute_fills(bt.get_fills(), data, bt.fee_per_contract, bt.multiplier)
+
+
+def attribution_totals(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pnl of every component over the whole period, one row per run
+    """
+    return table.groupby("run")[COMPONENTS + ["pnl"]].sum()
+
+
+def save_attribution(table: pd.DataFrame, path: str):
+    """
+    Save an attribution table as CSV, amounts rounded to the unit
+
+    Args:
+        table (pd.DataFrame): output of attribution_table
+        path (str)
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    table.round({name: 0 for name in COMPONENTS + ["pnl"]}).to_csv(path, index=False)
+
+
+def plot_attribution(table: pd.DataFrame, path: str, run=0):
+    """
+    Plot and save the cumulative pnl of every component of a run
+
+    Args:
+        table (pd.DataFrame): output of attribution_table
+        path (str)
+        run (int, optional). Defaults to 0.
+    """
+    days = table[table["run"] == run]
+
+    plt.figure(figsize=(10, 6))
+    for name in COMPONENTS + ["pnl"]:
+        plt.plot(
+            days["date"],
+            days[name].cumsum(),
+            label=name,
+            color="black" if name == "pnl" else None,
+        )
+
+    plt.title('Cumulative PnL Attribution')
+    plt.xlabel('Time Step')
+    plt.ylabel('PnL (thousand VND)')
+    plt.grid(True)
+    plt.legend()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    plt.savefig(path, dpi=300, bbox_inches='tight')
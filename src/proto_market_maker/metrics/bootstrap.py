@@ -0,0 +1,162 @@
+"""
+This module is used for bootstrapping metric confidence intervals
+"""
+
+from decimal import Decimal
+from typing import Dict, List, Tuple
+import numpy as np
+
+N_RESAMPLES = 10000
+BLOCK_LENGTH = 5
+CONFIDENCE = 0.95
+SEED = 2025
+
+
+def stationary_bootstrap_indices(
+    n: int, n_resamples: int, block_length: float, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Stationary bootstrap (Politis & Romano) indices
+
+    Every position starts a new block with probability 1 / block_length,
+    otherwise it continues the previous block circularly.
+
+    Args:
+        n (int): series length
+        n_resamples (int): number of resampled series
+        block_length (float): expected block length
+        rng (np.random.Generator)
+
+    Returns:
+        np.ndarray: (n_resamples, n) indices into the series
+    """
+    positions = np.arange(n)
+    new_block = rng.random((n_resamples, n)) < 1 / block_length
+    new_block[:, 0] = True
+    starts = rng.integers(0, n, size=(n_resamples, n))
+
+    block_begin = np.maximum.accumulate(np.where(new_block, positions, 0), axis=1)
+    block_start = np.take_along_axis(starts, block_begin, axis=1)
+    return (block_start + positions - block_begin) % n
+
+
+def block_bootstrap_indices(
+    n: int, n_resamples: int, block_length: int, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Circular moving block bootstrap indices
+
+    Args:
+        n (int): series length
+        n_resamples (int): number of resampled series
+        block_length (int): fixed block length
+        rng (np.random.Generator)
+
+    Returns:
+        np.ndarray: (n_resamples, n) indices into the series
+    """
+    block_length = int(block_length)
+    n_blocks = -(-n // block_length)
+    starts = rng.integers(0, n, size=(n_resamples, n_blocks))
+    indices = starts[:, :, None] + np.arange(block_length)
+    return indices.reshape(n_resamples, -1)[:, :n] % n
+
+
+def resample_returns(
+    period_returns: List[Decimal],
+    n_resamples=N_RESAMPLES,
+    block_length=BLOCK_LENGTH,
+    method="stationary",
+    seed=SEED,
+) -> np.ndarray:
+    """
+    Draw bootstrap resamples of a return series
+
+    Args:
+        period_returns (List[Decimal])
+        n_resamples (int, optional). Defaults to N_RESAMPLES.
+        block_length (optional). Defaults to BLOCK_LENGTH.
+        method (str, optional): "stationary" or "block". Defaults to "stationary".
+        seed (int, optional). Defaults to SEED.
+
+    Raises:
+        ValueError: None or empty period returns
+        ValueError: Unknown method
+
+    Returns:
+        np.ndarray: (n_resamples, len(period_returns)) resampled returns
+    """
+    if not period_returns:
+        raise ValueError('Period returns should not be None or empty')
+
+    returns = np.asarray(period_returns, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    if method == "stationary":
+        indices = stationary_bootstrap_indices(len(returns), n_resamples, block_length, rng)
+    elif method == "block":
+        indices = block_bootstrap_indices(len(returns), n_resamples, block_length, rng)
+    else:
+        raise ValueError(f"Unknown bootstrap method {method}")
+
+    return returns[indices]
+
+
+def bootstrap_metrics(
+    samples: np.ndarray, risk_free_return=0.00023, periods_per_year=250
+) -> Dict[str, np.ndarray]:
+    """
+    Compute metrics of every resampled series at once
+
+    Sharpe and Sortino are annualized the same way as the backtest report.
+
+    Args:
+        samples (np.ndarray): (n_resamples, n) returns
+        risk_free_return (float, optional): per period. Defaults to 0.00023.
+        periods_per_year (int, optional). Defaults to 250.
+
+    Returns:
+        Dict[str, np.ndarray]: one value per resample for each metric
+    """
+    annualize = np.sqrt(periods_per_year)
+    mean = samples.mean(axis=1)
+
+    sharpe = (mean - risk_free_return) / samples.std(axis=1, ddof=1) * annualize
+
+    downside = np.minimum(samples - risk_free_return, 0)
+    downside_risk = np.sqrt(np.mean(downside**2, axis=1))
+    sortino = (mean - risk_free_return) / downside_risk * annualize
+
+    performance = np.cumprod(1 + samples, axis=1)
+    peak = np.maximum(np.maximum.accumulate(performance, axis=1), 1)
+    mdd = np.minimum((performance / peak - 1).min(axis=1), 0)
+
+    return {
+        "sharpe_ratio": sharpe,
+        "sortino_ratio": sortino,
+        "maximum_drawdown": mdd,
+        "hpr": performance[:, -1] - 1,
+    }
+
+
+def confidence_intervals(
+    period_returns: List[Decimal], confidence=CONFIDENCE, **kwargs
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Bootstrap percentile confidence intervals
+
+    Args:
+        period_returns (List[Decimal])
+        confidence (float, optional). Defaults to CONFIDENCE.
+        **kwargs: forwarded to resample_returns
+
+    Returns:
+        Dict[str, Tuple[float, float]]: metric -> (lower, upper)
+    """
+    distributions = bootstrap_metrics(resample_returns(period_returns, **kwargs))
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for name, values in distributions.items():
+        lower, upper = np.nanpercentile(values, [tail, 100 - tail])
+        intervals[name] = (float(lower), float(upper))
+
+    return intervals
@@ -0,0 +1,166 @@
+"""
+This module is used for intraday mark-to-market equity and drawdown
+
+The equity after every tick is rebuilt from the fill journal and the tick
+prices: the state of the last fill at or before the tick (inventory, its
+price and the day's ac_loss) is looked up with a binary search over the tick
+positions the journal records, so ticks sharing a timestamp only see the
+fills of the ticks up to them, and open inventory is marked at the tick
+price. The last tick of every day carries the asset realized at the close,
+so daily assets lie on the curve.
+"""
+
+import os
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.utils import get_expired_dates, get_roll_dates
+
+RESOLUTIONS = {"tick": None, "second": 10**9, "minute": 60 * 10**9}
+STATE_KINDS = ["open", "close", "roll", "force"]
+
+
+def intraday_equity(bt, data: pd.DataFrame, resolution="second") -> pd.DataFrame:
+    """
+    Mark-to-market equity of a finished run
+
+    Args:
+        bt (Backtesting): run finished on data
+        data (pd.DataFrame): processed tick data of the run
+        resolution (str, optional): tick, second or minute. Defaults to "second".
+
+    Returns:
+        pd.DataFrame: datetime, equity at the end of each bin and its lowest
+            value within the bin
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution}, expected one of {list(RESOLUTIONS)}")
+
+    trading_dates = list(bt.tracking_dates)
+    times = data["datetime"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    day_of = pd.Index(trading_dates).get_indexer(data["date"])
+    rolling = data["date"].isin(
+        get_roll_dates(
+            trading_dates,
+            get_expired_dates(data["datetime"].iloc[0], data["datetime"].iloc[-1]),
+        )
+    ).to_numpy()
+    prices = np.where(rolling, data["f2_price"], data["price"]).astype(float)
+
+    # state at the start of each day: previous end inventory at its close mark
+    day_end = np.r_[day_of[1:] != day_of[:-1], True]
+    closes = np.where(rolling, data["f2_close"], data["close"])[day_end].astype(float)
+    start_inventory = np.r_[0, bt.daily_inventory[:-1]]
+    start_price = np.r_[0.0, closes[:-1]]
+
+    fills = bt.get_fills()
+    fills = fills[fills["kind"].isin(STATE_KINDS)]
+    fill_day = pd.Index(trading_dates).get_indexer(fills["date"])
+    last = np.searchsorted(fills["tick"].to_numpy(), np.arange(len(times)), side="right") - 1
+    own = last >= 0
+    own[own] = fill_day[last[own]] == day_of[own]
+    last = last.clip(0)
+
+    def state(column, start):
+        values = fills[column].to_numpy(dtype=float) if len(fills) else np.zeros(1)
+        return np.where(own, values[last], start)
+
+    inventory = state("inventory", start_inventory[day_of])
+    inventory_price = state("inventory_price", start_price[day_of])
+    ac_loss = state("ac_loss", 0.0)
+
+    assets = np.array(bt.daily_assets, dtype=float)
+    equity = (
+        assets[day_of] - ac_loss
+        + inventory * (prices - inventory_price) * float(bt.multiplier)
+    )
+    equity[day_end] = assets[day_of[day_end] + 1]
+
+    step = RESOLUTIONS[resolution]
+    bins = times if step is None else times // step * step
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    ends = np.r_[starts[1:], len(bins)] - 1
+    return pd.DataFrame({
+        "datetime": bins[starts].astype("datetime64[ns]"),
+        "equity": equity[ends],
+        "low": np.minimum.reduceat(equity, starts),
+    })
+
+
+def save_equity(equity: pd.DataFrame, path: str):
+    """
+    Save an equity series as a compressed npz archive
+
+    Args:
+        equity (pd.DataFrame): output of intraday_equity
+        path (str)
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(
+        path,
+        datetime=equity["datetime"].to_numpy().astype(np.int64),
+        equity=equity["equity"].to_numpy(),
+        low=equity["low"].to_numpy(),
+    )
+
+
+def load_equity(path: str) -> pd.DataFrame:
+    with np.load(path) as archive:
+        return pd.DataFrame({
+            "datetime": archive["datetime"].astype("datetime64[ns]"),
+            "equity": archive["equity"],
+            "low": archive["low"],
+        })
+
+
+def _get_peaks(equity: pd.DataFrame, capital: float) -> np.ndarray:
+    return np.maximum.accumulate(np.r_[capital, equity["equity"].to_numpy()])
+
+
+def intraday_maximum_drawdown(equity: pd.DataFrame, capital: float) -> float:
+    """
+    Largest fall of equity from its running peak, lows within a bin included
+
+    Args:
+        equity (pd.DataFrame): output of intraday_equity
+        capital (float): starting capital, the first peak
+
+    Returns:
+        float: non-positive ratio, like Metric.maximum_drawdown
+    """
+    peaks = _get_peaks(equity, float(capital))
+    return float(min((equity["low"].to_numpy() / peaks[:-1] - 1).min(), 0.0))
+
+
+def time_under_water(equity: pd.DataFrame, capital: float) -> Dict[str, float]:
+    """
+    Trading time spent below the running equity peak
+
+    Overnight gaps are not counted: a bin lasts until the next bin of the
+    same day, and the last bin of a day lasts zero time.
+
+    Args:
+        equity (pd.DataFrame): output of intraday_equity
+        capital (float): starting capital, the first peak
+
+    Returns:
+        Dict[str, float]: longest_seconds of one underwater stretch and the
+            fraction of trading time under water
+    """
+    values = equity["equity"].to_numpy()
+    under = values < _get_peaks(equity, float(capital))[1:]
+
+    times = equity["datetime"].to_numpy()
+    durations = np.diff(times).astype("timedelta64[ns]").astype(np.int64) / 1e9
+    same_day = times[1:].astype("datetime64[D]") == times[:-1].astype("datetime64[D]")
+    durations = np.r_[np.where(same_day, durations, 0.0), 0.0]
+
+    stretch = np.cumsum(~under)
+    longest = np.bincount(stretch[under], weights=durations[under]).max() if under.any() else 0.0
+    total = durations.sum()
+    return {
+        "longest_seconds": float(longest),
+        "fraction": float(durations[under].sum() / total) if total > 0 else 0.0,
+    }
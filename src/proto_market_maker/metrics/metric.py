@@ -204,3 +204,107 @@ class Metric:
         )
 
         return (mean_period_returns - mean_benchmark_returns) / excess_returns.std()
+
+
+class OnlineMetric:
+    """
+    Streaming sharpe, sortino, MDD and longest drawdown, updated in O(1) per return
+    """
+
+    def __init__(self, risk_free_return=0.00023):
+        """
+        Args:
+            risk_free_return (float, optional): per period, fixed because the
+                downside deviation accumulates against it. Defaults to 0.00023.
+        """
+        self.risk_free_return = float(risk_free_return)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.downside_sum = 0.0
+
+        self.cur_perf = 1.0
+        self.peak = 1.0
+        self.mdd = 0.0
+        self.cur_period = 0
+        self.max_period = 0
+
+    def update(self, period_return):
+        """
+        Add one period return
+
+        Args:
+            period_return: Decimal or float
+        """
+        period_return = float(period_return)
+        self.count += 1
+        delta = period_return - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (period_return - self.mean)
+        self.downside_sum += min(0.0, period_return - self.risk_free_return) ** 2
+
+        self.cur_perf *= 1 + period_return
+        if self.cur_perf > self.peak:
+            self.peak = self.cur_perf
+            self.cur_period = 0
+        else:
+            self.cur_period += 1
+            self.max_period = max(self.max_period, self.cur_period)
+        self.mdd = min(self.mdd, self.cur_perf / self.peak - 1)
+
+    def hpr(self) -> float:
+        return self.cur_perf - 1
+
+    def sharpe_ratio(self) -> float:
+        """
+        Sharpe ratio of the returns seen so far, nan before two returns
+        """
+        if self.count < 2 or self.m2 == 0:
+            return float("nan")
+
+        return (self.mean - self.risk_free_return) / np.sqrt(self.m2 / (self.count - 1))
+
+    def sortino_ratio(self) -> float:
+        """
+        Sortino ratio of the returns seen so far, nan without downside
+        """
+        if self.count == 0 or self.downside_sum == 0:
+            return float("nan")
+
+        return (self.mean - self.risk_free_return) / np.sqrt(self.downside_sum / self.count)
+
+    def maximum_drawdown(self) -> float:
+        return self.mdd
+
+    def current_drawdown(self) -> float:
+        return self.cur_perf / self.peak - 1
+
+    def longest_drawdown(self) -> int:
+        return self.max_period
+
+
+def summarize(
+    metric: Metric, risk_free_return=Decimal('0.00023'), periods_per_year=250
+) -> dict:
+    """
+    Summarize a run's metrics as plain floats
+
+    Sharpe and Sortino are annualized the same way as the backtest report.
+
+    Args:
+        metric (Metric)
+        risk_free_return (Decimal, optional). Defaults to Decimal('0.00023').
+        periods_per_year (int, optional). Defaults to 250.
+
+    Returns:
+        dict
+    """
+    annualize = Decimal(np.sqrt(periods_per_year))
+    mdd, _ = metric.maximum_drawdown()
+    return {
+        "sharpe_ratio": float(metric.sharpe_ratio(risk_free_return) * annualize),
+        "sortino_ratio": float(metric.sortino_ratio(risk_free_return) * annualize),
+        "maximum_drawdown": float(mdd),
+        "longest_drawdown": metric.longest_drawdown(),
+        "hpr": float(metric.hpr()),
+    }
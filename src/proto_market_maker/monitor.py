@@ -0,0 +1,271 @@
+"""
+Run progress monitoring module
+
+A ProgressMonitor counts simulated ticks and days and finished optimization
+trials. It can serve them as Prometheus text on a local HTTP port and write
+a JSON status file periodically, so schedulers can follow long runs without
+parsing logs. Enable it with PMM_MONITOR_PORT and/or PMM_STATUS_FILE.
+"""
+
+import os
+import json
+import time
+import resource
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from proto_market_maker.config.config import MONITOR_PORT, MONITOR_STATUS_FILE
+
+STATUS_INTERVAL = 5.0
+
+METRICS = [
+    ("ticks", "counter", "Ticks simulated"),
+    ("days", "counter", "Trading days simulated"),
+    ("ticks_per_second", "gauge", "Average simulation throughput"),
+    ("trials_completed", "counter", "Optimization trials completed"),
+    ("trials_pruned", "counter", "Optimization trials pruned"),
+    ("best_value", "gauge", "Best objective value so far"),
+    ("eta_seconds", "gauge", "Estimated seconds until the run finishes"),
+    ("rss_bytes", "gauge", "Resident memory of the process"),
+    ("peak_rss_bytes", "gauge", "Peak resident memory of the process"),
+    ("elapsed_seconds", "gauge", "Seconds since the run started"),
+]
+
+
+def get_rss_bytes() -> Optional[int]:
+    """
+    Current resident memory of this process
+
+    Returns:
+        Optional[int]: None where /proc is not available
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def get_peak_rss_bytes() -> int:
+    """
+    Peak resident memory of this process
+
+    Returns:
+        int
+    """
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1024 if sys.platform.startswith("linux") else 1
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class ProgressMonitor:
+    """
+    Progress counters with optional HTTP and status-file outputs
+    """
+
+    def __init__(
+        self,
+        total_days: Optional[int] = None,
+        total_trials: Optional[int] = None,
+        port: Optional[int] = None,
+        status_path: Optional[str] = None,
+        interval=STATUS_INTERVAL,
+    ):
+        """
+        Args:
+            total_days (int, optional): days to simulate, for the ETA of a backtest
+            total_trials (int, optional): trials to run, for the ETA of a study
+            port (int, optional): serve /metrics on 127.0.0.1:port; 0 picks a free port
+            status_path (str, optional): JSON status file rewritten every interval
+            interval (float, optional): seconds between status writes
+        """
+        self.total_days = total_days
+        self.total_trials = total_trials
+        self.port = port
+        self.status_path = status_path
+        self.interval = interval
+
+        self.ticks = 0
+        self.days = 0
+        self.trials_completed = 0
+        self.trials_pruned = 0
+        self.best_value = None
+        self.started = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server = None
+        self._threads = []
+
+    def day_callback(self, bt):
+        """
+        Backtesting day_callback counting the finished day
+
+        Args:
+            bt (Backtesting)
+        """
+        with self._lock:
+            self.ticks += bt.last_day_ticks
+            self.days += 1
+
+    def record_trial(self, pruned: bool, best_value=None):
+        """
+        Count a finished optimization trial
+
+        Args:
+            pruned (bool)
+            best_value (optional): study best value after the trial
+        """
+        with self._lock:
+            if pruned:
+                self.trials_pruned += 1
+            else:
+                self.trials_completed += 1
+            if best_value is not None:
+                self.best_value = float(best_value)
+
+    def _eta(self, elapsed: float) -> Optional[float]:
+        if self.total_trials:
+            done, total = self.trials_completed + self.trials_pruned, self.total_trials
+        elif self.total_days:
+            done, total = self.days, self.total_days
+        else:
+            return None
+
+        if done == 0:
+            return None
+        return elapsed * max(total - done, 0) / done
+
+    def snapshot(self) -> dict:
+        """
+        Current progress values
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                "ticks": self.ticks,
+                "days": self.days,
+                "ticks_per_second": self.ticks / elapsed if elapsed > 0 else 0.0,
+                "trials_completed": self.trials_completed,
+                "trials_pruned": self.trials_pruned,
+                "best_value": self.best_value,
+                "eta_seconds": self._eta(elapsed),
+                "rss_bytes": get_rss_bytes(),
+                "peak_rss_bytes": get_peak_rss_bytes(),
+                "elapsed_seconds": elapsed,
+            }
+
+    def prometheus(self) -> str:
+        """
+        Progress values in the Prometheus text exposition format
+
+        Returns:
+            str
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, kind, description in METRICS:
+            if snapshot[name] is None:
+                continue
+            metric = f"pmm_{name}_total" if kind == "counter" else f"pmm_{name}"
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {snapshot[name]}")
+        return "\n".join(lines) + "\n"
+
+    def write_status(self):
+        """
+        Atomically rewrite the JSON status file
+        """
+        tmp_path = f"{self.status_path}.tmp"
+        os.makedirs(os.path.dirname(self.status_path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, self.status_path)
+
+    def _write_status_periodically(self):
+        while not self._stopped.wait(self.interval):
+            self.write_status()
+
+    def start(self) -> "ProgressMonitor":
+        """
+        Start the HTTP endpoint and the status writer that are configured
+        """
+        monitor = self
+        if self.port is not None:
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path == "/status":
+                        body = json.dumps(monitor.snapshot()).encode()
+                        content_type = "application/json"
+                    else:
+                        body = monitor.prometheus().encode()
+                        content_type = "text/plain; version=0.0.4"
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._server = ThreadingHTTPServer(("127.0.0.1", int(self.port)), Handler)
+            self.port = self._server.server_address[1]
+            self._threads.append(
+                threading.Thread(target=self._server.serve_forever, daemon=True)
+            )
+
+        if self.status_path:
+            self._threads.append(
+                threading.Thread(target=self._write_status_periodically, daemon=True)
+            )
+
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop outputs, leaving a final status file
+        """
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        if self.status_path:
+            self.write_status()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def monitor_from_env(**totals) -> Optional[ProgressMonitor]:
+    """
+    Build a monitor when PMM_MONITOR_PORT or PMM_STATUS_FILE is set
+
+    Args:
+        **totals: total_days / total_trials for the ETA
+
+    Returns:
+        Optional[ProgressMonitor]: not started
+    """
+    if not MONITOR_PORT and not MONITOR_STATUS_FILE:
+        return None
+
+    return ProgressMonitor(
+        port=int(MONITOR_PORT) if MONITOR_PORT else None,
+        status_path=MONITOR_STATUS_FILE or None,
+        **totals,
+    )
@@ -7,8 +7,10 @@ from decimal import Decimal
 import logging
 import optuna
 from optuna.samplers import TPESampler
+from optuna.trial import TrialState
 from proto_market_maker.config.config import OPTIMIZATION_CONFIG
 from proto_market_maker.backtest import Backtesting
+from proto_market_maker.monitor import monitor_from_env
 
 
 class OptunaCallBack:
@@ -16,10 +18,14 @@ class OptunaCallBack:
     Optuna call back class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, monitor=None) -> None:
         """
         Init optuna callback
+
+        Args:
+            monitor (ProgressMonitor, optional): progress monitor counting trials
         """
+        self.monitor = monitor
         logging.basicConfig(
             filename="result/optimization/optimization.log.csv",
             format="%(message)s",
@@ -30,7 +36,7 @@ class OptunaCallBack:
         self.logger = logger
         self.logger.info("number,step")
 
-    def __call__(self, _: optuna.study.Study, trial: optuna.trial.FrozenTrial) -> None:
+    def __call__(self, study: optuna.study.Study, trial: optuna.trial.FrozenTrial) -> None:
         """
 
         Args:
@@ -45,9 +51,18 @@ class OptunaCallBack:
             trial.value,
         )
 
+        if self.monitor is not None:
+            try:
+                best_value = study.best_value
+            except ValueError:
+                best_value = None
+            self.monitor.record_trial(trial.state == TrialState.PRUNED, best_value)
+
 
 def main():
     data = Backtesting.process_data()
+    monitor = monitor_from_env(total_trials=OPTIMIZATION_CONFIG["no_trials"])
+    day_callback = None if monitor is None else monitor.day_callback
 
     def objective(trial):
         """
@@ -67,20 +82,26 @@ def main():
             step=0.1,
         )
 
-        bt.run(data, Decimal(step))
+        bt.run(data, Decimal(step), day_callback=day_callback)
 
         return bt.metric.sharpe_ratio(risk_free_return=Decimal('0.00023')) * Decimal(
             np.sqrt(250)
         )
 
-    optunaCallBack = OptunaCallBack()
+    optunaCallBack = OptunaCallBack(monitor)
     study = optuna.create_study(
         sampler=TPESampler(seed=OPTIMIZATION_CONFIG["random_seed"]),
         direction="maximize",
     )
-    study.optimize(
-        objective, n_trials=OPTIMIZATION_CONFIG["no_trials"], callbacks=[optunaCallBack]
-    )
+    if monitor is not None:
+        monitor.start()
+    try:
+        study.optimize(
+            objective, n_trials=OPTIMIZATION_CONFIG["no_trials"], callbacks=[optunaCallBack]
+        )
+    finally:
+        if monitor is not None:
+            monitor.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,314 @@
+"""
+Order book ladder module
+
+The bid and ask depth of quote.bidprice / quote.askprice is kept as an
+OrderBook: one row per snapshot and one column per level, with prices in
+integer ticks of TICK_SIZE and sizes in contracts, 0 marking an empty level.
+Every array is a plain .npy file of a ladder directory, so load_ladder maps
+them from disk without reading them.
+
+Fill models decide which quotes of the sweep engine trade on a tick. FillModel
+is the engine's rule, a quote fills when the traded price reaches it.
+QueueFillModel reads the ladder to track the contracts queued ahead of each
+quote: a quote the price trades through always fills, a quote the price only
+touches fills once nobody is left ahead of it. get_fill_model builds either
+by name, as "fill_model" in the grid file selects them.
+"""
+
+import os
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.cache import get_prefix_path
+from proto_market_maker.policy import TICK_SIZE
+
+LADDER_ARRAYS = ["times", "bid_price", "bid_size", "ask_price", "ask_size"]
+DEPTH_DIR = "depth"
+FILL_MODELS = ["price", "queue"]
+
+
+class OrderBook:
+    """
+    Fixed-width bid and ask ladders over time
+    """
+
+    def __init__(self, times, bid_price, bid_size, ask_price, ask_size):
+        """
+        Args:
+            times (np.ndarray): snapshot timestamps in ns, sorted
+            bid_price (np.ndarray): (snapshots, levels) ticks, best first
+            bid_size (np.ndarray): (snapshots, levels) contracts
+            ask_price (np.ndarray): (snapshots, levels) ticks, best first
+            ask_size (np.ndarray): (snapshots, levels) contracts
+        """
+        self.times = times
+        self.bid_price = bid_price
+        self.bid_size = bid_size
+        self.ask_price = ask_price
+        self.ask_size = ask_size
+
+    @property
+    def levels(self) -> int:
+        return self.bid_price.shape[1]
+
+    def __len__(self):
+        return len(self.times)
+
+    def get_rows(self, times: np.ndarray) -> np.ndarray:
+        """
+        Snapshot in force at each time: the last one at or before it
+
+        Args:
+            times (np.ndarray): timestamps in ns
+
+        Returns:
+            np.ndarray: snapshot rows, -1 before the first snapshot
+        """
+        return np.searchsorted(self.times, times, side="right") - 1
+
+
+def build_ladder(depth: pd.DataFrame, levels: int) -> OrderBook:
+    """
+    Pivot depth records into ladders
+
+    Args:
+        depth (pd.DataFrame): output of DataService.get_depth_data, one record
+            per snapshot and level
+        levels (int): levels kept, deeper ones are dropped
+
+    Returns:
+        OrderBook
+    """
+    depth = depth[(depth["depth"] >= 1) & (depth["depth"] <= levels)]
+    times = pd.to_datetime(depth["datetime"]).to_numpy().astype("datetime64[ns]").astype(np.int64)
+    snapshots, rows = np.unique(times, return_inverse=True)
+    columns = depth["depth"].to_numpy(dtype=np.int64) - 1
+
+    arrays = {}
+    for name in ["bid_price", "bid_size", "ask_price", "ask_size"]:
+        values = depth[name].to_numpy(dtype=float)
+        if name.endswith("price"):
+            values = values / float(TICK_SIZE)
+        values = np.nan_to_num(np.round(values)).astype(np.int32)
+        arrays[name] = np.zeros((len(snapshots), levels), dtype=np.int32)
+        arrays[name][rows, columns] = values
+    return OrderBook(snapshots, **arrays)
+
+
+def get_depth_path(contract_type: str, evaluation=False) -> str:
+    return f"{get_prefix_path(evaluation)}{DEPTH_DIR}/{contract_type}"
+
+
+def save_ladder(book: OrderBook, path: str):
+    """
+    Save every array of a ladder as an .npy file under path
+
+    Args:
+        book (OrderBook)
+        path (str): ladder directory
+    """
+    os.makedirs(path, exist_ok=True)
+    for name in LADDER_ARRAYS:
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(book, name)))
+
+
+def load_ladder(path: str, mmap=True) -> OrderBook:
+    """
+    Load a ladder saved by save_ladder
+
+    Args:
+        path (str): ladder directory
+        mmap (bool, optional): map the arrays read-only instead of reading
+            them. Defaults to True.
+
+    Returns:
+        OrderBook
+    """
+    return OrderBook(**{
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        for name in LADDER_ARRAYS
+    })
+
+
+class FillModel:
+    """
+    Quotes fill when the traded price reaches them
+    """
+
+    def __init__(self):
+        self.prices = None
+
+    def prepare(self, times: np.ndarray, rolling: np.ndarray, prices: np.ndarray):
+        """
+        Called once before a run
+
+        Args:
+            times (np.ndarray): tick timestamps in ns
+            rolling (np.ndarray): ticks trading F2
+            prices (np.ndarray): traded prices in ticks
+        """
+        self.prices = prices
+
+    def reset(self):
+        """
+        Called before the first quotes of every day
+        """
+
+    def on_quote(self, index: int, bid: np.ndarray, ask: np.ndarray):
+        """
+        Called after quotes are placed or replaced on tick index
+
+        Args:
+            index (int): tick position in the run
+            bid (np.ndarray): bid ticks of every instance
+            ask (np.ndarray): ask ticks of every instance
+        """
+
+    def match(self, index: int, bid: np.ndarray, ask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quotes hit by the trade of tick index
+
+        Args:
+            index (int): tick position in the run
+            bid (np.ndarray): bid ticks of every instance
+            ask (np.ndarray): ask ticks of every instance
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: bids hit and asks hit
+        """
+        tick = self.prices[index]
+        return bid >= tick, ask <= tick
+
+
+def _queued(prices: np.ndarray, sizes: np.ndarray, quotes: np.ndarray, side: int):
+    """
+    Contracts displayed at each quote's price
+
+    Args:
+        prices (np.ndarray): one snapshot's ladder of a side, in ticks
+        sizes (np.ndarray): the ladder's sizes
+        quotes (np.ndarray): quote ticks of every instance
+        side (int): +1 for bids, -1 for asks
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: whether the ladder shows the quote's
+            price (at a level, between levels or better than the best, always
+            when the ladder is empty), and the size displayed there
+    """
+    shown = prices != 0
+    if not shown.any():
+        return np.ones(len(quotes), dtype=bool), np.zeros(len(quotes))
+    deepest = (prices[shown] * side).min() * side
+    visible = quotes * side >= deepest * side
+    displayed = ((prices == quotes[:, None]) * sizes).sum(axis=1)
+    return visible, displayed.astype(float)
+
+
+class QueueFillModel(FillModel):
+    """
+    Queue-position-aware fills on the order book ladder
+
+    A quote joins the back of the queue at its price: the contracts displayed
+    there are ahead of it, nobody when the price shows no contracts, and an
+    unknown number (all of the queue) when the price lies beyond the displayed
+    levels. Contracts ahead only decrease, to the size the ladder displays at
+    the price, as trades and cancels drain it. A quote hit while keeping its
+    price joins the back of the queue again. Ticks without a snapshot and
+    sides without displayed levels fill on the price alone.
+    """
+
+    def __init__(self, f1: OrderBook, f2: OrderBook = None):
+        """
+        Args:
+            f1 (OrderBook): ladder of the F1 contract
+            f2 (OrderBook, optional): ladder of the F2 contract, read on roll
+                days. Defaults to None, filling on the price there.
+        """
+        super().__init__()
+        self.books = [f1] if f2 is None else [f1, f2]
+        self.rows = None
+        self.book_of = None
+        self.ahead = {}
+        self.quotes = {}
+
+    def prepare(self, times: np.ndarray, rolling: np.ndarray, prices: np.ndarray):
+        super().prepare(times, rolling, prices)
+        rows = [book.get_rows(times) for book in self.books]
+        if len(self.books) == 1:
+            self.book_of = np.zeros(len(times), dtype=np.int64)
+            self.rows = np.where(rolling, -1, rows[0])
+        else:
+            self.book_of = rolling.astype(np.int64)
+            self.rows = np.where(rolling, rows[1], rows[0])
+        self.reset()
+
+    def _ladder(self, index: int, side: int):
+        row = self.rows[index]
+        if row < 0:
+            return None
+        book = self.books[self.book_of[index]]
+        if side > 0:
+            return book.bid_price[row], book.bid_size[row]
+        return book.ask_price[row], book.ask_size[row]
+
+    def _queued(self, index: int, quotes: np.ndarray, side: int):
+        ladder = self._ladder(index, side)
+        if ladder is None:
+            return np.ones(len(quotes), dtype=bool), np.zeros(len(quotes))
+        return _queued(*ladder, quotes, side)
+
+    def reset(self):
+        self.ahead = {}
+        self.quotes = {}
+
+    def on_quote(self, index: int, bid: np.ndarray, ask: np.ndarray):
+        for side, quotes in ((1, bid), (-1, ask)):
+            visible, displayed = self._queued(index, quotes, side)
+            queue = np.where(visible, displayed, np.inf)
+            if side in self.quotes:
+                moved = quotes != self.quotes[side]
+                queue = np.where(moved, queue, self.ahead[side])
+            self.ahead[side] = queue
+            self.quotes[side] = quotes.copy()
+
+    def match(self, index: int, bid: np.ndarray, ask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        tick = self.prices[index]
+        hits = []
+        for side, quotes in ((1, bid), (-1, ask)):
+            visible, displayed = self._queued(index, quotes, side)
+            ahead = np.where(visible, np.minimum(self.ahead[side], displayed), self.ahead[side])
+            hit = (quotes * side > tick * side) | ((quotes == tick) & (ahead <= 0))
+            self.ahead[side] = np.where(hit, np.where(visible, displayed, np.inf), ahead)
+            hits.append(hit)
+        return hits[0], hits[1]
+
+
+def get_fill_model(name="price", evaluation=False) -> FillModel:
+    """
+    Fill model by name, reading the saved ladders for "queue"
+
+    Args:
+        name (str, optional): one of FILL_MODELS. Defaults to "price".
+        evaluation (bool, optional): out-of-sample ladders. Defaults to False.
+
+    Returns:
+        FillModel
+
+    Raises:
+        ValueError: unknown name
+        FileNotFoundError: "queue" without a saved VN30F1M ladder
+    """
+    if name == "price":
+        return FillModel()
+    if name != "queue":
+        raise ValueError(f"Unknown fill model {name}, expected one of {FILL_MODELS}")
+
+    f1_path = get_depth_path("VN30F1M", evaluation)
+    if not os.path.exists(f1_path):
+        raise FileNotFoundError(f"No ladder in {f1_path}, load it with depth_levels above 0")
+    f2_path = get_depth_path("VN30F2M", evaluation)
+    return QueueFillModel(
+        load_ladder(f1_path), load_ladder(f2_path) if os.path.exists(f2_path) else None
+    )
@@ -0,0 +1,300 @@
+"""
+Parallel-in-time backtesting module (experimental)
+
+ac_loss, the quotes and the requote clock reset at every day end, so a
+trading day depends on the past only through its starting inventory and its
+starting assets. Every day is therefore simulated independently, across a
+process pool, once for each starting inventory within the capital limit.
+Each outcome table entry holds the day's end inventory and pnl.
+
+Assets only matter through the capital checks (get_maximum_placeable and
+handle_force_sell). Days are tabulated at one or more capital buckets. Each
+entry keeps the checks that decided its fills: the opening fills, the blocked
+quotes, the forced liquidations, and the highest price held with every
+inventory. Chaining the tables day by day then takes the first bucket whose
+checks the actual assets decide the same way. When no bucket qualifies, or
+when the starting inventory was not tabulated, that day is re-simulated
+serially, so the chained run agrees exactly with Backtesting.run.
+"""
+
+import itertools
+from decimal import Decimal
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.metrics.metric import Metric, summarize
+from proto_market_maker.utils import (
+    from_cash_to_tradeable_contracts,
+    get_expired_dates,
+    get_pending_expirations,
+    get_roll_dates,
+)
+
+_DAYS = None
+_NEXT_DATES = None
+_BOUNDS = None
+_CLOSES = None
+_SETTINGS = None
+
+
+def _get_closes(days: list, roll_dates: list) -> List[Decimal]:
+    return [
+        day["f2_close" if trading_date in roll_dates else "close"].iloc[-1]
+        for trading_date, day in days
+    ]
+
+
+def _init_worker(evaluation: bool, settings: Dict):
+    global _DAYS, _NEXT_DATES, _BOUNDS, _CLOSES, _SETTINGS
+    data = Backtesting.process_data(evaluation=evaluation, refreshes=[settings["refresh"]])
+    _DAYS = [(trading_date, day) for trading_date, day in data.groupby("date", sort=False)]
+    trading_dates = [trading_date for trading_date, _ in _DAYS]
+    _NEXT_DATES = trading_dates[1:] + [None]
+    _BOUNDS = (data["datetime"].iloc[0], data["datetime"].iloc[-1])
+    _CLOSES = _get_closes(_DAYS, get_roll_dates(trading_dates, get_expired_dates(*_BOUNDS)))
+    _SETTINGS = settings
+
+
+def _new_backtest(capital: Decimal, settings: Dict) -> Backtesting:
+    bt = Backtesting(
+        capital=capital,
+        printable=False,
+        fee=settings["fee"],
+        multiplier=settings["multiplier"],
+        margin_rate=settings["margin_rate"],
+    )
+    bt.set_parameters(settings["skew"], settings["refresh"])
+    return bt
+
+
+def get_capital_checks(
+    fills: list, start_inventory: int, day: pd.DataFrame, rolled: bool
+) -> list:
+    """
+    Capital checks that decided one simulated day
+
+    A check (least, ac_loss, price, limit) requires the contracts placeable
+    with assets - ac_loss at price to be at least limit when least is True,
+    and below limit otherwise. Checks on the same ac_loss and limit are
+    reduced to their tightest price. Prices held between fills are taken
+    over every tick stamped within the segment, boundaries included.
+
+    Args:
+        fills (list): the day's fill records, as Backtesting.fills
+        start_inventory (int)
+        day (pd.DataFrame): the day's ticks
+        rolled (bool): whether the day trades F2 prices
+
+    Returns:
+        list
+    """
+    times = day["datetime"].to_numpy()
+    prices = day["f2_price" if rolled else "price"].to_numpy()
+    fills = [fill for fill in fills if fill[2] != "mark"]
+
+    def ac_loss_at(index):
+        return fills[index - 1][8] if index > 0 else Decimal("0.0")
+
+    tightest = {}
+
+    def add(least, ac_loss, price, limit):
+        key = (least, ac_loss, limit)
+        if key not in tightest:
+            tightest[key] = price
+        else:
+            tightest[key] = max(tightest[key], price) if least else min(tightest[key], price)
+
+    for fill in fills:
+        if fill[2] in ("open", "blocked", "force"):
+            add(fill[2] == "open", ac_loss_at(fill[12]), fill[4], fill[11])
+
+    bounds = [None] + [fill[0] for fill in fills] + [None]
+    inventories = [start_inventory] + [fill[6] for fill in fills]
+    for index, inventory in enumerate(inventories):
+        if inventory == 0:
+            continue
+        begin = 0 if bounds[index] is None else np.searchsorted(times, bounds[index], "left")
+        end = len(times) if bounds[index + 1] is None else np.searchsorted(
+            times, bounds[index + 1], "right"
+        )
+        add(True, ac_loss_at(index), max(prices[begin:end]), abs(inventory))
+
+    return [(least, ac_loss, price, limit) for (least, ac_loss, limit), price in tightest.items()]
+
+
+def tabulate_day(job: Tuple[int, List[int]]) -> Tuple[int, Dict]:
+    """
+    Simulate one day of the worker's data from every given starting inventory
+
+    Args:
+        job (Tuple[int, List[int]]): day index and starting inventories
+
+    Returns:
+        Tuple[int, Dict]: day index and inventory -> one (end inventory, pnl,
+            capital checks) per capital bucket
+    """
+    day_index, inventories = job
+    trading_date, day = _DAYS[day_index]
+    trading_dates = [trading_date for trading_date, _ in _DAYS]
+
+    table = {inventory: [] for inventory in inventories}
+    for inventory, capital in itertools.product(inventories, _SETTINGS["capitals"]):
+        bt = _new_backtest(capital, _SETTINGS)
+        bt.inventory = inventory
+        if inventory != 0:
+            bt.inventory_price = _CLOSES[day_index - 1]
+        expiration_dates = get_pending_expirations(
+            trading_dates, day_index, get_expired_dates(*_BOUNDS)
+        )
+        rolls = expiration_dates.qsize()
+        bt.run_day(day, _SETTINGS["step"], _NEXT_DATES[day_index], expiration_dates)
+        rolled = expiration_dates.qsize() < rolls
+
+        table[inventory].append((
+            bt.inventory,
+            bt.last_day_pnl,
+            get_capital_checks(bt.fills, inventory, day, rolled),
+        ))
+    return day_index, table
+
+
+def passes_checks(bt: Backtesting, assets: Decimal, checks: list) -> bool:
+    """
+    Whether assets decide every capital check as in the tabulated day
+
+    Args:
+        bt (Backtesting): supplies multiplier and margin_rate
+        assets (Decimal): actual assets at the start of the day
+        checks (list): output of get_capital_checks
+
+    Returns:
+        bool
+    """
+    for least, ac_loss, price, limit in checks:
+        placeable = max(
+            from_cash_to_tradeable_contracts(
+                assets - ac_loss, price, bt.multiplier, bt.margin_rate
+            ),
+            0,
+        )
+        if (placeable >= limit) != least:
+            return False
+    return True
+
+
+def run_parallel(
+    bt: Backtesting,
+    step: Decimal,
+    evaluation=False,
+    processes=None,
+    skew=None,
+    refresh=None,
+    max_inventory: Optional[int] = None,
+    capital_buckets: Optional[List[Decimal]] = None,
+) -> int:
+    """
+    Run bt over the processed data with days simulated in parallel
+
+    Daily assets, returns, inventory and monthly tracking equal those of
+    Backtesting.run; fills are only journaled for days re-simulated serially.
+
+    Args:
+        bt (Backtesting): fresh backtest
+        step (Decimal): base quote distance
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+        processes (int, optional): pool size. Defaults to the CPU count.
+        skew (float, optional): inventory skew coefficient
+        refresh (int, optional): requote interval in seconds
+        max_inventory (int, optional): largest starting inventory tabulated.
+            Defaults to the contracts the capital buys at the lowest price.
+        capital_buckets (List[Decimal], optional): capitals every day is
+            tabulated at. Defaults to the starting capital only.
+
+    Returns:
+        int: number of days re-simulated serially
+    """
+    bt.set_parameters(skew, refresh)
+    data = Backtesting.process_data(evaluation=evaluation, refreshes=[bt.refresh])
+    days = [(trading_date, day) for trading_date, day in data.groupby("date", sort=False)]
+    trading_dates = [trading_date for trading_date, _ in days]
+    bounds = (data["datetime"].iloc[0], data["datetime"].iloc[-1])
+    roll_dates = get_roll_dates(trading_dates, get_expired_dates(*bounds))
+    closes = _get_closes(days, roll_dates)
+
+    capital = bt.daily_assets[-1]
+    if max_inventory is None:
+        max_inventory = from_cash_to_tradeable_contracts(
+            capital,
+            min(data["price"].min(), data["f2_price"].min()),
+            bt.multiplier,
+            bt.margin_rate,
+        )
+    inventories = list(range(-max_inventory, max_inventory + 1))
+    settings = {
+        "capitals": [Decimal(bucket) for bucket in capital_buckets or [capital]],
+        "step": Decimal(step),
+        "fee": bt.fee_per_contract / bt.multiplier,
+        "multiplier": bt.multiplier,
+        "margin_rate": bt.margin_rate,
+        "skew": bt.skew,
+        "refresh": bt.refresh,
+    }
+
+    tables = [None] * len(days)
+    jobs = [(0, [0])] + [(day_index, inventories) for day_index in range(1, len(days))]
+    with Pool(processes, initializer=_init_worker, initargs=(evaluation, settings)) as pool:
+        for day_index, table in pool.imap_unordered(tabulate_day, jobs):
+            tables[day_index] = table
+
+    resimulated = 0
+    for day_index, (trading_date, day) in enumerate(days):
+        entry = next(
+            (
+                entry for entry in tables[day_index].get(bt.inventory, [])
+                if passes_checks(bt, bt.daily_assets[-1], entry[2])
+            ),
+            None,
+        )
+        if entry is None:
+            next_date = trading_dates[day_index + 1] if day_index + 1 < len(days) else None
+            bt.run_day(
+                day,
+                Decimal(step),
+                next_date,
+                get_pending_expirations(trading_dates, day_index, get_expired_dates(*bounds)),
+            )
+            resimulated += 1
+            continue
+
+        end_inventory, pnl, _ = entry
+        new_asset = bt.daily_assets[-1] + pnl
+        bt.daily_returns.append(new_asset / bt.daily_assets[-1] - 1)
+        bt.daily_assets.append(new_asset)
+        bt.live_metric.update(bt.daily_returns[-1])
+        bt.inventory = end_inventory
+        if end_inventory != 0:
+            bt.inventory_price = closes[day_index]
+        if trading_date in roll_dates:
+            bt.monthly_tracking.append([trading_date, new_asset])
+        bt.tracking_dates.append(trading_date)
+        bt.daily_inventory.append(end_inventory)
+
+    bt.metric = Metric(bt.daily_returns, None)
+    return resimulated
+
+
+def main():
+    bt = Backtesting(capital=Decimal("5e5"), printable=False)
+    resimulated = run_parallel(bt, Decimal("1.8"))
+    print(f"{resimulated}/{len(bt.tracking_dates)} days re-simulated serially")
+
+    for name, value in summarize(bt.metric).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
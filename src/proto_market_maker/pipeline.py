@@ -0,0 +1,377 @@
+"""
+Cached stage pipeline module
+
+Models the research pipeline (data loading, in-sample backtest, optimization
+and out-of-sample evaluation) as a DAG of stages. A stage depends on the
+stages producing its input files. Each stage is keyed by the SHA-256 of its
+input files and of the package source. A stage whose key is unchanged and
+whose outputs still hash as recorded is skipped. Stages whose dependencies
+are done run in parallel processes.
+
+The pv.step records a stage emits are captured when it runs and stored with
+its outputs. Every selected stage's records are emitted again once the
+pipeline finishes, so skipped stages report the same metrics and artifacts.
+"""
+
+import argparse
+import contextlib
+import functools
+import hashlib
+import importlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import plutus_verify as pv
+
+STATE_PATH = "result/pipeline/state.json"
+IS_DATA = ["data/is/VN30F1M_data.csv", "data/is/VN30F2M_data.csv"]
+OS_DATA = ["data/os/VN30F1M_data.csv", "data/os/VN30F2M_data.csv"]
+# config reads every parameter file when imported, so does each stage
+CONFIG_PARAMETERS = [
+    f"parameter/{name}_parameter.json"
+    for name in ["backtesting", "optimization", "optimized", "grid", "stress", "reprice", "cpcv"]
+]
+
+
+class Stage:
+    """
+    Pipeline stage: a console entry point with its input and output files
+    """
+
+    def __init__(self, name: str, entry: str, inputs: List[str], outputs: List[str]):
+        """
+        Args:
+            name (str)
+            entry (str): module:function run without arguments
+            inputs (List[str]): files the stage reads
+            outputs (List[str]): files the stage writes
+        """
+        self.name = name
+        self.entry = entry
+        self.inputs = inputs
+        self.outputs = outputs
+
+
+STAGES = [
+    Stage(
+        "load_data",
+        "proto_market_maker.data_loader:main",
+        CONFIG_PARAMETERS,
+        IS_DATA + OS_DATA,
+    ),
+    Stage(
+        "backtest",
+        "proto_market_maker.backtest:main",
+        IS_DATA + CONFIG_PARAMETERS,
+        [
+            "result/backtest/hpr.svg",
+            "result/backtest/drawdown.svg",
+            "result/backtest/inventory.svg",
+            "result/backtest/intraday_equity.npz",
+            "result/backtest/attribution.csv",
+            "result/backtest/attribution.svg",
+        ],
+    ),
+    Stage(
+        "optimize",
+        "proto_market_maker.optimize:main",
+        IS_DATA + CONFIG_PARAMETERS,
+        ["result/optimization/optimization.log.csv"],
+    ),
+    Stage(
+        "evaluate",
+        "proto_market_maker.evaluate:main",
+        OS_DATA + CONFIG_PARAMETERS,
+        [
+            "result/optimization/hpr.svg",
+            "result/optimization/drawdown.svg",
+            "result/optimization/inventory.svg",
+            "result/optimization/intraday_equity.npz",
+        ],
+    ),
+]
+
+
+def get_dependencies(stages: List[Stage]) -> Dict[str, List[str]]:
+    """
+    Stages each stage reads outputs of
+
+    Args:
+        stages (List[Stage])
+
+    Returns:
+        Dict[str, List[str]]: stage name -> upstream stage names
+    """
+    producers = {path: stage.name for stage in stages for path in stage.outputs}
+    return {
+        stage.name: sorted({producers[path] for path in stage.inputs if path in producers})
+        for stage in stages
+    }
+
+
+class FileHasher:
+    """
+    SHA-256 of files, reused while their size and modification time hold
+    """
+
+    def __init__(self, known: Optional[Dict] = None):
+        """
+        Args:
+            known (Dict, optional): path -> [size, mtime_ns, digest] from a previous run
+        """
+        self.known = dict(known or {})
+
+    def digest(self, path: str) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+
+        stat = os.stat(path)
+        known = self.known.get(path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(functools.partial(f.read, 1 << 20), b""):
+                sha.update(block)
+        self.known[path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+        return self.known[path][2]
+
+    def source_digest(self) -> str:
+        """
+        Digest of every module of the package
+        """
+        root = os.path.dirname(os.path.abspath(__file__))
+        paths = sorted(
+            os.path.join(folder, name)
+            for folder, _, names in os.walk(root)
+            for name in names
+            if name.endswith(".py")
+        )
+        sha = hashlib.sha256()
+        for path in paths:
+            sha.update(f"{os.path.relpath(path, root)}:{self.digest(path)}\n".encode())
+        return sha.hexdigest()
+
+
+def get_stage_key(stage: Stage, hasher: FileHasher, source: str) -> str:
+    """
+    Content key of a stage's inputs
+
+    Args:
+        stage (Stage)
+        hasher (FileHasher)
+        source (str): output of FileHasher.source_digest
+
+    Returns:
+        str
+
+    Raises:
+        FileNotFoundError: an input file is missing
+    """
+    inputs = {}
+    for path in stage.inputs:
+        inputs[path] = hasher.digest(path)
+        if inputs[path] is None:
+            raise FileNotFoundError(f"Stage {stage.name} input {path} does not exist")
+
+    payload = json.dumps(
+        {"entry": stage.entry, "source": source, "inputs": inputs}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def is_up_to_date(stage: Stage, key: str, recorded: Optional[Dict], hasher: FileHasher) -> bool:
+    if recorded is None or recorded["key"] != key:
+        return False
+    return all(
+        digest is not None and digest == recorded["outputs"].get(path)
+        for path, digest in ((path, hasher.digest(path)) for path in stage.outputs)
+    )
+
+
+class StepRecorder:
+    """
+    Stand-in for a pv.step result collecting what the stage reports
+    """
+
+    def __init__(self, name: str):
+        self.record = {"name": name, "metrics": [], "artifacts": [], "metadata": {}}
+
+    def metric(self, name, value, **kwargs):
+        self.record["metrics"].append([name, float(value), kwargs])
+
+    def artifact(self, name, path, **kwargs):
+        self.record["artifacts"].append([name, path, kwargs])
+
+    def metadata(self, **kwargs):
+        self.record["metadata"].update(kwargs)
+
+
+@contextlib.contextmanager
+def record_step(records: list, name: str):
+    recorder = StepRecorder(name)
+    yield recorder
+    records.append(recorder.record)
+
+
+def emit_records(records: list):
+    """
+    Emit captured pv.step records
+
+    Args:
+        records (list): StepRecorder records
+    """
+    for record in records:
+        with pv.step(record["name"]) as r:
+            for name, value, kwargs in record["metrics"]:
+                r.metric(name, value, **kwargs)
+            for name, path, kwargs in record["artifacts"]:
+                r.artifact(name, path, **kwargs)
+            if record["metadata"]:
+                r.metadata(**record["metadata"])
+
+
+def run_stage(entry: str) -> list:
+    """
+    Run a stage's entry point, capturing its pv.step records
+
+    Args:
+        entry (str): module:function
+
+    Returns:
+        list: StepRecorder records
+    """
+    records = []
+    step = pv.step
+    pv.step = functools.partial(record_step, records)
+    try:
+        module, function = entry.split(":")
+        getattr(importlib.import_module(module), function)()
+    finally:
+        pv.step = step
+    return records
+
+
+def load_state(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"files": {}, "stages": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: Dict, path: str):
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def run_pipeline(
+    stages: List[Stage] = None,
+    selected: Optional[List[str]] = None,
+    force=False,
+    jobs=None,
+    state_path=STATE_PATH,
+) -> Dict[str, str]:
+    """
+    Run the selected stages in dependency order, skipping up-to-date ones
+
+    Stages left out of selected are not run: their outputs are read as they
+    are on disk.
+
+    Args:
+        stages (List[Stage], optional): Defaults to STAGES.
+        selected (List[str], optional): stage names. Defaults to every stage.
+        force (bool, optional): run stages even when up to date. Defaults to False.
+        jobs (int, optional): stages run at once. Defaults to the CPU count.
+        state_path (str, optional): recorded keys and outputs. Defaults to STATE_PATH.
+
+    Returns:
+        Dict[str, str]: stage name -> "ran" or "skipped"
+
+    Raises:
+        RuntimeError: a stage failed; stages depending on it are not run
+    """
+    stages = STAGES if stages is None else stages
+    by_name = {stage.name: stage for stage in stages}
+    selected = [stage.name for stage in stages] if selected is None else list(selected)
+    unknown = set(selected) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}, expected some of {list(by_name)}")
+
+    dependencies = {
+        name: [upstream for upstream in upstreams if upstream in selected]
+        for name, upstreams in get_dependencies(stages).items()
+    }
+    state = load_state(state_path)
+    hasher = FileHasher(state["files"])
+    source = hasher.source_digest()
+
+    outcomes, failures, running = {}, {}, {}
+    pending = [name for name in by_name if name in selected]
+    with ProcessPoolExecutor(jobs, max_tasks_per_child=1) as executor:
+        while pending or running:
+            for name in list(pending):
+                upstreams = dependencies[name]
+                if any(upstream in failures for upstream in upstreams):
+                    failures[name] = "upstream failed"
+                    pending.remove(name)
+                elif all(upstream in outcomes for upstream in upstreams):
+                    pending.remove(name)
+                    stage = by_name[name]
+                    key = get_stage_key(stage, hasher, source)
+                    if not force and is_up_to_date(stage, key, state["stages"].get(name), hasher):
+                        outcomes[name] = "skipped"
+                        print(f"[{name}] up to date")
+                    else:
+                        print(f"[{name}] running")
+                        running[executor.submit(run_stage, stage.entry)] = (name, key)
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, key = running.pop(future)
+                try:
+                    records = future.result()
+                except Exception as error:  # pylint: disable=broad-except
+                    failures[name] = repr(error)
+                    print(f"[{name}] failed: {error!r}")
+                    continue
+
+                state["stages"][name] = {
+                    "key": key,
+                    "outputs": {path: hasher.digest(path) for path in by_name[name].outputs},
+                    "records": records,
+                }
+                state["files"] = hasher.known
+                save_state(state, state_path)
+                outcomes[name] = "ran"
+                print(f"[{name}] done")
+
+    for name in by_name:
+        if name in outcomes:
+            emit_records(state["stages"][name]["records"])
+    if failures:
+        raise RuntimeError(f"Stages failed: {failures}")
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the research pipeline stages")
+    parser.add_argument(
+        "stages", nargs="*", help=f"stages to run, of {[stage.name for stage in STAGES]}"
+    )
+    parser.add_argument("--force", action="store_true", help="rerun up-to-date stages")
+    parser.add_argument("--jobs", type=int, default=None, help="stages run at once")
+    args = parser.parse_args()
+
+    run_pipeline(selected=args.stages or None, force=args.force, jobs=args.jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Quote policy module
+
+A quote policy turns the state of many strategy instances into their bid and
+ask at once. Prices are integer ticks of TICK_SIZE, so quotes compare exactly
+with tick prices. State arrays have one entry per instance:
+
+    price: the tick price the quotes are placed around
+    inventory: signed contracts held
+    elapsed: seconds since the instance's last timed requote
+
+Backtesting quotes through a policy with a single instance when one is set,
+and the sweep engine with one instance per strategy. The portfolio engine
+has one instance per instrument and requotes them one at a time through
+quote_rows.
+"""
+
+from abc import ABC, abstractmethod
+from decimal import Decimal, ROUND_CEILING, localcontext
+from typing import Tuple
+
+import numpy as np
+
+TICK_SIZE = Decimal("0.1")
+
+
+def to_ticks(price: Decimal) -> int:
+    return int((Decimal(price) / TICK_SIZE).to_integral_value())
+
+
+def from_ticks(ticks: int) -> Decimal:
+    return Decimal(int(ticks)).scaleb(-1)
+
+
+class QuotePolicy(ABC):
+    """
+    Vectorized quote rule over a fixed number of strategy instances
+    """
+
+    size = 1
+
+    @abstractmethod
+    def quote(
+        self, price: np.ndarray, inventory: np.ndarray, elapsed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quote every instance
+
+        Args:
+            price (np.ndarray): tick prices
+            inventory (np.ndarray): signed contracts
+            elapsed (np.ndarray): seconds since the last timed requote
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: bid and ask ticks
+        """
+
+    def quote_rows(
+        self, rows, price: np.ndarray, inventory: np.ndarray, elapsed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Quote some of the instances
+
+        Quotes every instance and keeps rows; policies that can quote an
+        instance on its own override it.
+
+        Args:
+            rows: instance index or indices
+            price (np.ndarray): tick prices of every instance
+            inventory (np.ndarray): signed contracts of every instance
+            elapsed (np.ndarray): seconds since the last timed requote
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: bid and ask ticks of rows
+        """
+        bid, ask = self.quote(price, inventory, elapsed)
+        return bid[rows], ask[rows]
+
+
+class InventorySkewPolicy(QuotePolicy):
+    """
+    Reference policy: quotes step away from price, the side that would add to
+    inventory widened by skew per contract held
+
+    Quotes equal
+
+        (price - step * Decimal(max(inventory, 0) * skew + 1)).quantize(0.1, ROUND_HALF_UP)
+        (price - step * Decimal(min(inventory, 0) * skew - 1)).quantize(0.1, ROUND_HALF_UP)
+
+    exactly, since prices lie on the tick grid: offsets in ticks are looked up
+    from a per-instance table over inventory, rounded with ties towards the
+    price, and the table grows when an inventory falls outside it.
+    """
+
+    def __init__(self, step, skew, inventory_range=16):
+        """
+        Args:
+            step: base quote distance, one value or one per instance
+            skew: inventory skew coefficient, one value or one per instance
+            inventory_range (int, optional): inventory tabulated up front either
+                side of zero. Defaults to 16.
+        """
+        steps, skews = np.broadcast_arrays(
+            np.array(step, dtype=object, ndmin=1), np.array(skew, dtype=object, ndmin=1)
+        )
+        self.steps = [Decimal(str(value)) for value in steps]
+        self.skews = [float(value) for value in skews]
+        self.size = len(self.steps)
+        self.rows = np.arange(self.size)
+        self._tabulate(int(inventory_range))
+
+    @staticmethod
+    def _offset_ticks(step: Decimal, units: float) -> int:
+        # price - offset rounds half up, so the offset rounds half down
+        with localcontext() as context:
+            context.prec = 80
+            offset = step * Decimal(units) / TICK_SIZE
+            return int((offset - Decimal("0.5")).to_integral_value(rounding=ROUND_CEILING))
+
+    def _tabulate(self, inventory_range: int):
+        self.inventory_range = inventory_range
+        inventories = range(-inventory_range, inventory_range + 1)
+        self.bid_offsets = np.array([
+            [self._offset_ticks(step, max(inventory, 0) * skew + 1) for inventory in inventories]
+            for step, skew in zip(self.steps, self.skews)
+        ], dtype=np.int64)
+        self.ask_offsets = np.array([
+            [self._offset_ticks(step, min(inventory, 0) * skew - 1) for inventory in inventories]
+            for step, skew in zip(self.steps, self.skews)
+        ], dtype=np.int64)
+
+    def _offsets(self, rows, inventory) -> Tuple[np.ndarray, np.ndarray]:
+        largest = int(np.abs(inventory).max(initial=0))
+        if largest > self.inventory_range:
+            self._tabulate(2 * largest)
+        columns = inventory + self.inventory_range
+        return self.bid_offsets[rows, columns], self.ask_offsets[rows, columns]
+
+    def quote(
+        self, price: np.ndarray, inventory: np.ndarray, elapsed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        bid_offsets, ask_offsets = self._offsets(self.rows, np.asarray(inventory))
+        return price - bid_offsets, price - ask_offsets
+
+    def quote_rows(
+        self, rows, price: np.ndarray, inventory: np.ndarray, elapsed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        bid_offsets, ask_offsets = self._offsets(rows, np.asarray(inventory)[rows])
+        return price[rows] - bid_offsets, price[rows] - ask_offsets
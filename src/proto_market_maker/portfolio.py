@@ -0,0 +1,389 @@
+"""
+Multi-instrument portfolio backtest module
+
+Makes markets in several instruments at once from one pool of capital. Each
+instrument is a stream of sorted tick arrays read from its own CSV file, and
+the streams are k-way merged into one event order, either with a heap over
+the streams or by sorting the concatenated timestamps, instead of
+outer-merging them into one frame. Inventory, its price and the quotes of
+every instrument are arrays indexed by instrument.
+
+Every rule of Backtesting applies per instrument: forced liquidations,
+capital checks, price-crossing fills, timed and fill-driven requotes and the
+daily mark at the close. Capital is shared: an instrument may hold the
+contracts from_cash_to_tradeable_contracts allows on the cash left after the
+margin of every other instrument's inventory, at its last price. With a
+single instrument this is Backtesting's check. Contract series switch at
+expiration, so no inventory is carried past a roll date: it is closed at the
+roll date's close, paying the fee. Money is kept in float64 like the sweep
+engine.
+"""
+
+import heapq
+import itertools
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import plutus_verify as pv
+
+from proto_market_maker.backtest import MARGIN_RATE, MULTIPLIER, REFRESH_SECONDS
+from proto_market_maker.cache import get_prefix_path
+from proto_market_maker.config.config import BACKTESTING_CONFIG, BEST_CONFIG
+from proto_market_maker.metrics.metric import Metric, summarize
+from proto_market_maker.policy import InventorySkewPolicy, QuotePolicy
+from proto_market_maker.utils import (
+    from_cash_to_tradeable_contracts,
+    get_expired_dates,
+    get_roll_dates,
+)
+
+INSTRUMENTS = ["VN30F1M", "VN30F2M"]
+
+
+class InstrumentStream:
+    """
+    Ticks of one instrument as arrays
+    """
+
+    def __init__(self, name: str, times, days, prices, closes):
+        """
+        Args:
+            name (str)
+            times (np.ndarray): tick timestamps in ns, sorted
+            days (np.ndarray): trading date of every tick as datetime64[D]
+            prices (np.ndarray): traded prices in ticks of TICK_SIZE
+            closes (np.ndarray): closing price of every tick's day
+        """
+        self.name = name
+        self.times = times
+        self.days = days
+        self.prices = prices
+        self.closes = closes
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def from_frame(cls, name: str, frame: pd.DataFrame) -> "InstrumentStream":
+        """
+        Args:
+            name (str)
+            frame (pd.DataFrame): datetime, date, price and close columns, sorted
+
+        Returns:
+            InstrumentStream
+        """
+        return cls(
+            name,
+            pd.to_datetime(frame["datetime"]).to_numpy().astype("datetime64[ns]").astype(np.int64),
+            pd.to_datetime(frame["date"]).to_numpy().astype("datetime64[D]"),
+            np.round(frame["price"].to_numpy(dtype=float) * 10).astype(np.int64),
+            frame["close"].to_numpy(dtype=float),
+        )
+
+
+def read_stream(path: str, name: str) -> InstrumentStream:
+    """
+    Read an instrument's ticks from a data_loader CSV file
+
+    Args:
+        path (str)
+        name (str)
+
+    Returns:
+        InstrumentStream
+    """
+    frame = pd.read_csv(path, usecols=["datetime", "date", "price", "close"])
+    return InstrumentStream.from_frame(name, frame.dropna(subset=["price"]))
+
+
+def load_streams(names: List[str] = None, evaluation=False) -> List[InstrumentStream]:
+    """
+    Read the streams of several instruments
+
+    Args:
+        names (List[str], optional): instruments with a <name>_data.csv file.
+            Defaults to INSTRUMENTS.
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+
+    Returns:
+        List[InstrumentStream]
+    """
+    prefix_path = get_prefix_path(evaluation)
+    return [read_stream(f"{prefix_path}{name}_data.csv", name) for name in names or INSTRUMENTS]
+
+
+def merge_events(streams: List[InstrumentStream]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Event order of pre-sorted streams, by time, then instrument
+
+    Args:
+        streams (List[InstrumentStream])
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: instrument and position of every event
+    """
+    instruments = np.concatenate(
+        [np.full(len(stream), index, dtype=np.int64) for index, stream in enumerate(streams)]
+    )
+    positions = np.concatenate([np.arange(len(stream)) for stream in streams])
+    order = np.lexsort((instruments, np.concatenate([stream.times for stream in streams])))
+    return instruments[order], positions[order]
+
+
+def heap_merge_events(streams: List[InstrumentStream]) -> Iterator[Tuple[int, int]]:
+    """
+    Lazily merge streams with a heap, in the order of merge_events
+
+    Args:
+        streams (List[InstrumentStream])
+
+    Yields:
+        Tuple[int, int]: instrument and position of every event
+    """
+    merged = heapq.merge(*[
+        zip(iter(stream.times), itertools.repeat(index), itertools.count())
+        for index, stream in enumerate(streams)
+    ])
+    for _, instrument, position in merged:
+        yield instrument, position
+
+
+class PortfolioBacktesting:
+    """
+    Backtesting over several instruments sharing capital
+    """
+
+    def __init__(
+        self,
+        capital: Decimal,
+        fee: Decimal = None,
+        multiplier=MULTIPLIER,
+        margin_rate=MARGIN_RATE,
+    ):
+        """
+        Args:
+            capital (Decimal): starting capital of the portfolio
+            fee (Decimal, optional): fee per side in index points. Defaults to config fee.
+            multiplier (optional): contract value of one index point, one value
+                or one per instrument
+            margin_rate (optional): initial margin as a share of contract value,
+                one value or one per instrument
+        """
+        self.capital = float(capital)
+        self.fee = float(Decimal(BACKTESTING_CONFIG["fee"] if fee is None else fee))
+        self.multiplier = multiplier
+        self.margin_rate = margin_rate
+        self.multipliers = np.array(multiplier, dtype=float, ndmin=1)
+        self.margin_rates = np.array(margin_rate, dtype=float, ndmin=1)
+        self.margin_values = self.multipliers * self.margin_rates
+
+        self.daily_assets: List[float] = []
+        self.daily_returns: List[float] = []
+        self.daily_inventory: List[np.ndarray] = []
+        self.tracking_dates: List[date] = []
+        self.metric = None
+
+    def get_placeable(self, cash: float, instrument: int, price: float, inventory, marks) -> int:
+        """
+        Contracts an instrument may still open on the cash its peers leave
+
+        Args:
+            cash (float): assets less the day's ac_loss
+            instrument (int)
+            price (float): the instrument's price
+            inventory (np.ndarray): signed contracts of every instrument
+            marks (np.ndarray): last price of every instrument
+
+        Returns:
+            int
+        """
+        held = np.abs(inventory)
+        margins = held * marks * self.margin_values
+        others = margins.sum() - margins[instrument]
+        total = from_cash_to_tradeable_contracts(
+            cash - others,
+            price,
+            self.multipliers[instrument],
+            self.margin_rates[instrument],
+        )
+        return max(total, 0) - held[instrument]
+
+    def run(
+        self,
+        streams: List[InstrumentStream],
+        policy: QuotePolicy,
+        refresh=None,
+        events: Iterable[Tuple[int, int]] = None,
+    ):
+        """
+        Run every instrument of streams
+
+        Args:
+            streams (List[InstrumentStream])
+            policy (QuotePolicy): one instance per instrument; a requote quotes
+                its instrument with QuotePolicy.quote_rows
+            refresh (optional): requote interval in seconds, one value or one per
+                instrument. Defaults to config time.
+            events (Iterable[Tuple[int, int]], optional): instrument and position
+                of every event in time order. Defaults to merge_events.
+        """
+        size = len(streams)
+        if policy.size != size:
+            raise ValueError(f"Policy quotes {policy.size} instruments, expected {size}")
+
+        refresh = REFRESH_SECONDS if refresh is None else refresh
+        refresh_ns = np.broadcast_to(np.asarray(refresh, dtype=np.int64) * 10**9, (size,))
+        # one value per instrument from here on
+        self.multipliers = np.broadcast_to(np.asarray(self.multiplier, dtype=float), (size,))
+        self.margin_rates = np.broadcast_to(np.asarray(self.margin_rate, dtype=float), (size,))
+        self.margin_values = self.multipliers * self.margin_rates
+        fees = self.fee * self.multipliers
+        if events is None:
+            events = zip(*(values.tolist() for values in merge_events(streams)))
+
+        trading_days = np.unique(np.concatenate([stream.days for stream in streams]))
+        trading_dates = [day.item() for day in trading_days]
+        roll_days = set(
+            np.array(
+                get_roll_dates(trading_dates, get_expired_dates(trading_dates[0], trading_dates[-1])),
+                dtype="datetime64[D]",
+            ).tolist()
+        )
+
+        inventory = np.zeros(size, dtype=np.int64)
+        inventory_price = np.zeros(size)
+        marks = np.zeros(size)
+        closes = np.zeros(size)
+        bid = np.zeros(size, dtype=np.int64)
+        ask = np.zeros(size, dtype=np.int64)
+        quoted = np.zeros(size, dtype=bool)
+        old_timestamp = np.zeros(size, dtype=np.int64)
+        ticks = np.zeros(size, dtype=np.int64)
+        elapsed = np.zeros(size)
+
+        self.daily_assets = [self.capital]
+        assets, ac_loss, current_day = self.capital, 0.0, None
+        for instrument, position in events:
+            stream = streams[instrument]
+            day = stream.days[position]
+            if day != current_day:
+                if current_day is not None:
+                    assets = self.close_day(
+                        current_day, assets, ac_loss, inventory, inventory_price, closes,
+                        fees, current_day.item() in roll_days,
+                    )
+                current_day, ac_loss = day, 0.0
+                quoted[:] = False
+
+            timestamp = stream.times[position]
+            tick = stream.prices[position]
+            price = tick / 10
+            marks[instrument] = price
+            closes[instrument] = stream.closes[position]
+            multiplier = self.multipliers[instrument]
+
+            placeable = self.get_placeable(assets - ac_loss, instrument, price, inventory, marks)
+            while placeable < 0:
+                inventory[instrument] += 1 if inventory[instrument] < 0 else -1
+                ac_loss += abs(price - inventory_price[instrument]) * multiplier + fees[instrument]
+                placeable = self.get_placeable(
+                    assets - ac_loss, instrument, price, inventory, marks
+                )
+
+            matched = 0
+            if quoted[instrument]:
+                for side, hit in ((1, bid[instrument] >= tick), (-1, ask[instrument] <= tick)):
+                    if not hit:
+                        continue
+                    held = inventory[instrument]
+                    if held * side >= 0 and placeable > 0:
+                        inventory_price[instrument] = (
+                            inventory_price[instrument] * abs(held) + price
+                        ) / (abs(held) + 1)
+                        matched += 1
+                    elif held * side < 0:
+                        points = (inventory_price[instrument] - price) * side
+                        ac_loss += fees[instrument] - points * multiplier
+                        matched -= 1
+                    else:
+                        continue
+                    inventory[instrument] += side
+
+            if not quoted[instrument] or timestamp > old_timestamp[instrument] + refresh_ns[instrument]:
+                old_timestamp[instrument] = timestamp
+                elapsed[instrument] = 0.0
+            elif matched != 0:
+                elapsed[instrument] = (timestamp - old_timestamp[instrument]) / 1e9
+            else:
+                continue
+
+            ticks[instrument] = tick
+            bid[instrument], ask[instrument] = policy.quote_rows(
+                instrument, ticks, inventory, elapsed
+            )
+            quoted[instrument] = True
+
+        if current_day is not None:
+            self.close_day(
+                current_day, assets, ac_loss, inventory, inventory_price, closes,
+                fees, current_day.item() in roll_days,
+            )
+        self.metric = Metric([Decimal(value) for value in self.daily_returns], None)
+
+    def close_day(
+        self, day, assets, ac_loss, inventory, inventory_price, closes, fees, rolled
+    ) -> float:
+        """
+        Mark every instrument at its close and realize the day's pnl
+
+        inventory and inventory_price are updated in place; on roll dates the
+        inventory is closed at the close.
+
+        Returns:
+            float: assets after the day
+        """
+        held = inventory != 0
+        pnl = float(
+            (inventory * (closes - inventory_price) * self.multipliers)[held].sum()
+        ) - ac_loss
+        inventory_price[held] = closes[held]
+        if rolled:
+            pnl -= float((np.abs(inventory) * fees).sum())
+            inventory[:] = 0
+
+        new_assets = assets + pnl
+        self.daily_returns.append(new_assets / assets - 1)
+        self.daily_assets.append(new_assets)
+        self.daily_inventory.append(inventory.copy())
+        self.tracking_dates.append(day.item())
+        return new_assets
+
+
+def main():
+    streams = load_streams()
+    step = Decimal(str(BEST_CONFIG["step"]))
+    bt = PortfolioBacktesting(capital=Decimal("5e5"))
+    bt.run(streams, InventorySkewPolicy([step] * len(streams), BACKTESTING_CONFIG["skew"]))
+
+    metrics = summarize(bt.metric)
+    print(f"Instruments: {', '.join(stream.name for stream in streams)}")
+    print(f"Sharpe ratio: {metrics['sharpe_ratio']}")
+    print(f"Sortino ratio: {metrics['sortino_ratio']}")
+    print(f"Maximum drawdown: {metrics['maximum_drawdown']}")
+    print(f"HPR {metrics['hpr']}")
+
+    with pv.step("portfolio_backtest") as r:
+        r.metric("sharpe_ratio",     metrics["sharpe_ratio"],     unit="ratio")
+        r.metric("sortino_ratio",    metrics["sortino_ratio"],    unit="ratio")
+        r.metric("maximum_drawdown", metrics["maximum_drawdown"], unit="ratio")
+        r.metric("hpr",              metrics["hpr"],              unit="ratio")
+        r.metadata(instruments=[stream.name for stream in streams])
+
+
+if __name__ == "__main__":
+    main()
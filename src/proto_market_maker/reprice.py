@@ -0,0 +1,270 @@
+"""
+Fee and margin scenario re-pricing module
+
+A run's fill journal (Backtesting.get_fills) holds every fill with its pnl in
+index points and the contracts charged a fee, plus the daily close marks.
+Given the same fills, daily assets are linear in the fee and the multiplier,
+so a scenario is re-priced with a few cumulative sums instead of the tick loop.
+
+Fills stay the same only while every capital check decides as it did in the
+baseline: opening fills must stay placeable, blocked quotes must stay blocked,
+forced liquidations must still be forced, and no tick of the day may newly
+breach the margin (checked conservatively at the day's highest price and
+inventory). Days failing a check are re-simulated tick by tick with the
+scenario parameters, continuing until the inventory is back on the baseline
+path.
+"""
+
+import itertools
+import os
+from decimal import Decimal
+from queue import Queue
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.config.config import REPRICE_CONFIG
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.metrics.metric import Metric, summarize
+from proto_market_maker.utils import (
+    get_expired_dates,
+    get_pending_expirations,
+    get_roll_dates,
+)
+
+SCENARIO_AXES = ("fee", "multiplier", "margin_rate")
+RESULT_PATH = "result/reprice/reprice.csv"
+CHECK_KINDS = ["open", "blocked", "force"]
+
+
+def expand_scenarios(grid: Dict) -> List[Dict[str, str]]:
+    """
+    Expand scenario axes into scenarios
+
+    Args:
+        grid (Dict): axis name -> list of values
+
+    Returns:
+        List[Dict[str, str]]
+    """
+    axes = [[str(value) for value in grid[axis]] for axis in SCENARIO_AXES]
+    return [dict(zip(SCENARIO_AXES, values)) for values in itertools.product(*axes)]
+
+
+class FillRepricer:
+    """
+    Re-prices a finished run under other fee, multiplier and margin_rate values
+    """
+
+    def __init__(self, bt: Backtesting, data: pd.DataFrame, step: Decimal):
+        """
+        Args:
+            bt (Backtesting): baseline run, finished on data
+            data (pd.DataFrame): processed tick data of the run
+            step (Decimal): base quote distance of the run
+        """
+        self.bt = bt
+        self.data = data
+        self.step = step
+        self.capital = bt.daily_assets[0]
+        self.trading_dates = list(bt.tracking_dates)
+        self.end_inventory = np.array(bt.daily_inventory)
+        no_days = len(self.trading_dates)
+
+        fills = bt.get_fills()
+        self.day_of = pd.Index(self.trading_dates).get_indexer(fills["date"])
+        self.first = np.searchsorted(self.day_of, np.arange(no_days))
+        self.is_mark = (fills["kind"] == "mark").to_numpy()
+        self.kind = fills["kind"].to_numpy()
+        self.price = fills["price"].to_numpy()
+        self.fee_contracts = fills["fee_contracts"].to_numpy(dtype=float)
+        self.points = np.where(self.is_mark, 0.0, fills["points"].to_numpy())
+        self.limit = fills["limit"].to_numpy(dtype=float)
+        self.check = fills["check"].to_numpy()
+        self.is_check = fills["kind"].isin(CHECK_KINDS).to_numpy()
+        self.close_prices = {fill[1]: fill[7] for fill in bt.fills if fill[2] == "mark"}
+
+        # fee-independent pieces of each day's asset change
+        self.day_points = np.bincount(
+            self.day_of, weights=fills["points"].to_numpy(), minlength=no_days
+        )
+        self.day_fee_contracts = np.bincount(
+            self.day_of, weights=self.fee_contracts, minlength=no_days
+        )
+
+        self.start_inventory = np.abs(np.r_[0, self.end_inventory[:-1]]).astype(float)
+        self.max_inventory = self.start_inventory.copy()
+        np.maximum.at(self.max_inventory, self.day_of, np.abs(fills["inventory"].to_numpy()))
+        self.max_price = self._get_max_prices()
+
+    def _get_roll_dates(self) -> list:
+        return get_roll_dates(
+            self.trading_dates,
+            get_expired_dates(self.data["datetime"].iloc[0], self.data["datetime"].iloc[-1]),
+        )
+
+    def _get_max_prices(self) -> np.ndarray:
+        rolling = self.data["date"].isin(self._get_roll_dates()).to_numpy()
+        prices = np.where(rolling, self.data["f2_price"], self.data["price"]).astype(float)
+        return (
+            pd.Series(prices).groupby(self.data["date"].to_numpy(), sort=False).max()
+            .reindex(self.trading_dates).to_numpy()
+        )
+
+    def _get_expirations(self, day_index: int) -> Queue:
+        """
+        Expiration queue as run_day sees it on trading day day_index
+        """
+        return get_pending_expirations(
+            self.trading_dates,
+            day_index,
+            get_expired_dates(self.data["datetime"].iloc[0], self.data["datetime"].iloc[-1]),
+        )
+
+    def get_valid_days(self, assets: np.ndarray, fee, multiplier, margin_rate) -> np.ndarray:
+        """
+        Mark days whose baseline fills remain valid given day-start assets
+
+        Args:
+            assets (np.ndarray): assets at the start of every day
+            fee (float): fee per side in index points
+            multiplier (float)
+            margin_rate (float)
+
+        Returns:
+            np.ndarray: boolean per day
+        """
+        losses = np.where(
+            self.is_mark, 0.0, (fee * self.fee_contracts - self.points) * multiplier
+        )
+        cum_losses = np.r_[0.0, np.cumsum(losses)]
+        day_base = cum_losses[self.first[self.day_of]]
+
+        # exact replay of the checks that decided a fill
+        margin = self.limit * self.price * multiplier * margin_rate
+        slack = assets[self.day_of] - (cum_losses[self.check] - day_base) - margin
+        passed = np.where(self.kind == "open", slack >= 0, slack < 0)
+        failed = np.bincount(
+            self.day_of[self.is_check & ~passed], minlength=len(self.trading_dates)
+        )
+
+        # every other tick must stay clear of a forced liquidation
+        max_loss = np.zeros(len(self.trading_dates))
+        np.maximum.at(max_loss, self.day_of, cum_losses[1:] - day_base)
+        clear = assets - max_loss >= (
+            self.max_inventory * self.max_price * multiplier * margin_rate
+        )
+        return (failed == 0) & (clear | (self.max_inventory == 0))
+
+    def _resimulate(self, start: int, assets: np.ndarray, scenario: Dict) -> int:
+        """
+        Re-simulate from day start until the inventory rejoins the baseline
+
+        Returns:
+            int: first day not re-simulated
+        """
+        bt = Backtesting(
+            capital=Decimal(str(assets[start])),
+            printable=False,
+            fee=Decimal(str(scenario["fee"])),
+            multiplier=Decimal(str(scenario["multiplier"])),
+            margin_rate=Decimal(str(scenario["margin_rate"])),
+        )
+        bt.set_parameters(self.bt.skew, self.bt.refresh)
+        bt.inventory = int(self.end_inventory[start - 1]) if start > 0 else 0
+        if bt.inventory != 0:
+            bt.inventory_price = self.close_prices[self.trading_dates[start - 1]]
+
+        expiration_dates = self._get_expirations(start)
+        days = self.data.groupby("date", sort=False)
+        day_index = start
+        while True:
+            next_date = (
+                self.trading_dates[day_index + 1]
+                if day_index + 1 < len(self.trading_dates) else None
+            )
+            bt.run_day(
+                days.get_group(self.trading_dates[day_index]),
+                self.step,
+                next_date,
+                expiration_dates,
+            )
+            assets[day_index + 1] = float(bt.daily_assets[-1])
+            day_index += 1
+            if (
+                day_index == len(self.trading_dates)
+                or bt.inventory == self.end_inventory[day_index - 1]
+            ):
+                return day_index
+
+    def get_assets(self, scenario: Dict) -> Tuple[np.ndarray, List]:
+        """
+        Daily assets under scenario
+
+        Args:
+            scenario (Dict): fee, multiplier and margin_rate, as strings or numbers
+
+        Returns:
+            Tuple[np.ndarray, List]: assets including the capital, and the
+                re-simulated trading dates
+        """
+        fee = float(scenario["fee"])
+        multiplier = float(scenario["multiplier"])
+        margin_rate = float(scenario["margin_rate"])
+        changes = (self.day_points - fee * self.day_fee_contracts) * multiplier
+
+        assets = np.empty(len(self.trading_dates) + 1)
+        assets[0] = float(self.capital)
+        resimulated = []
+        day_index = 0
+        while day_index < len(self.trading_dates):
+            assets[day_index + 1:] = assets[day_index] + np.cumsum(changes[day_index:])
+            valid = self.get_valid_days(assets[:-1], fee, multiplier, margin_rate)
+            invalid = np.flatnonzero(~valid[day_index:])
+            if not invalid.size:
+                break
+
+            start = day_index + invalid[0]
+            day_index = self._resimulate(start, assets, scenario)
+            resimulated.extend(self.trading_dates[start:day_index])
+
+        return assets, resimulated
+
+    def reprice(self, scenarios: List[Dict]) -> pd.DataFrame:
+        """
+        Metrics of every scenario
+
+        Args:
+            scenarios (List[Dict]): fee, multiplier and margin_rate of each scenario
+
+        Returns:
+            pd.DataFrame
+        """
+        rows = []
+        for scenario in scenarios:
+            assets, resimulated = self.get_assets(scenario)
+            returns = [Decimal(value) for value in assets[1:] / assets[:-1] - 1]
+            rows.append({
+                **scenario,
+                "resimulated_days": len(resimulated),
+                **summarize(Metric(returns, None)),
+            })
+        return pd.DataFrame(rows)
+
+
+def main():
+    step = Decimal(REPRICE_CONFIG["step"])
+    data = Backtesting.process_data()
+    bt = Backtesting(capital=Decimal(REPRICE_CONFIG["capital"]), printable=False)
+    bt.run(data, step)
+
+    results = FillRepricer(bt, data, step).reprice(expand_scenarios(REPRICE_CONFIG))
+    print(results.to_string(index=False))
+
+    os.makedirs(os.path.dirname(RESULT_PATH), exist_ok=True)
+    results.to_csv(RESULT_PATH, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Parameter grid scheduler module
+
+Expands a (step, skew, time, fee) grid into backtest jobs, runs them across a
+process pool and appends every finished job to a JSON-lines file, so an
+interrupted sweep resumes from the jobs that are still missing. A job that
+raises is recorded with its error instead of stopping the pool, and runs again
+only when errors are retried. With "engine": "sweep", jobs sharing a fee run
+together in the vectorized sweep engine instead of one backtest each, filling
+as "fill_model" selects. Every record carries the job's pnl attribution
+totals, and the settings its results depend on: the engine, the fill model,
+the capital and the data window. A job resumes only from a record made under
+the same settings.
+"""
+
+import os
+import json
+import itertools
+from decimal import Decimal
+from multiprocessing import Pool
+from typing import Dict, List
+
+from proto_market_maker.config.config import BACKTESTING_CONFIG, GRID_CONFIG
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.metrics.attribution import (
+    COMPONENTS,
+    attribute_backtest,
+    attribution_totals,
+)
+from proto_market_maker.metrics.metric import summarize
+from proto_market_maker.orderbook import get_fill_model
+from proto_market_maker.policy import InventorySkewPolicy
+from proto_market_maker.sweep import SweepBacktesting
+
+GRID_AXES = ("step", "skew", "time", "fee")
+GRID_SETTINGS = ("engine", "fill_model", "capital", "window")
+RESULT_PATH = "result/grid/grid_results.jsonl"
+
+_DATA = None
+_CAPITAL = None
+_EVALUATION = False
+
+
+def expand_grid(grid: Dict) -> List[Dict[str, str]]:
+    """
+    Expand grid axes into jobs
+
+    Args:
+        grid (Dict): axis name -> list of values
+
+    Returns:
+        List[Dict[str, str]]: one job per combination, values kept as strings
+    """
+    axes = [[str(value) for value in grid[axis]] for axis in GRID_AXES]
+    return [dict(zip(GRID_AXES, values)) for values in itertools.product(*axes)]
+
+
+def get_grid_settings(grid: Dict, evaluation=False) -> Dict[str, str]:
+    """
+    Settings every job of a grid run shares
+
+    Args:
+        grid (Dict): grid configuration
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+
+    Returns:
+        Dict[str, str]: engine, fill model, capital and data window
+    """
+    sample = "os" if evaluation else "is"
+    return {
+        "engine": grid.get("engine", "backtest"),
+        "fill_model": grid.get("fill_model", "price"),
+        "capital": str(grid.get("capital", "5e5")),
+        "window": (
+            f"{BACKTESTING_CONFIG[f'{sample}_from_date_str']}"
+            f" - {BACKTESTING_CONFIG[f'{sample}_end_date_str']}"
+        ),
+    }
+
+
+def job_key(job: Dict) -> str:
+    """
+    Identify a job by its grid coordinates and the settings it ran under
+
+    Args:
+        job (Dict): job or result record
+
+    Returns:
+        str
+    """
+    return json.dumps({name: job.get(name) for name in GRID_AXES + GRID_SETTINGS}, sort_keys=True)
+
+
+def load_completed(path: str, retry_errors=False) -> set:
+    """
+    Load keys of jobs already persisted in path
+
+    A record cut off by an interrupted run is dropped from the file, so that
+    appended records start on a fresh line.
+
+    Args:
+        path (str)
+        retry_errors (bool, optional): leave out jobs recorded with an error,
+            so that they run again. Defaults to False.
+
+    Returns:
+        set
+    """
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, "r+", encoding="utf-8") as f:
+        content = f.read()
+        if content and not content.endswith("\n"):
+            content = content[: content.rfind("\n") + 1]
+            f.seek(0)
+            f.truncate()
+            f.write(content)
+
+    records = [json.loads(line) for line in content.splitlines() if line]
+    return {
+        job_key(record) for record in records if not (retry_errors and "error" in record)
+    }
+
+
+def get_error_record(job: Dict[str, str], error: Exception) -> Dict[str, str]:
+    """
+    Record of a job that raised
+
+    Args:
+        job (Dict[str, str])
+        error (Exception)
+
+    Returns:
+        Dict[str, str]: job coordinates and the error
+    """
+    return {**job, "error": f"{type(error).__name__}: {error}"}
+
+
+def get_attribution_record(totals, run=0) -> Dict[str, float]:
+    """
+    Pnl attribution of a run over the whole period
+
+    Args:
+        totals (pd.DataFrame): output of attribution_totals
+        run (int, optional). Defaults to 0.
+
+    Returns:
+        Dict[str, float]: <component>_pnl -> pnl
+    """
+    return {f"{name}_pnl": float(totals.loc[run, name]) for name in COMPONENTS}
+
+
+def _init_worker(evaluation: bool, capital: str, refreshes=None, decimal=True, coalesce=None):
+    global _DATA, _CAPITAL, _EVALUATION
+    _EVALUATION = evaluation
+    _DATA = Backtesting.process_data(
+        evaluation=evaluation, coalesce=coalesce, refreshes=refreshes, decimal=decimal
+    )
+    _CAPITAL = Decimal(capital)
+
+
+def run_job(job: Dict[str, str]) -> Dict:
+    """
+    Backtest one grid point on the worker's data
+
+    Args:
+        job (Dict[str, str])
+
+    Returns:
+        Dict: job coordinates, metrics and pnl attribution
+    """
+    bt = Backtesting(capital=_CAPITAL, printable=False, fee=Decimal(job["fee"]))
+    bt.run(_DATA, Decimal(job["step"]), skew=job["skew"], refresh=job["time"])
+
+    totals = attribution_totals(attribute_backtest(bt, _DATA))
+    return {**job, **summarize(bt.metric), **get_attribution_record(totals)}
+
+
+def _run_jobs(jobs: List[Dict[str, str]]) -> List[Dict]:
+    results = []
+    for job in jobs:
+        try:
+            results.append(run_job(job))
+        except Exception as error:  # pylint: disable=broad-except
+            results.append(get_error_record(job, error))
+    return results
+
+
+def group_jobs(jobs: List[Dict[str, str]], parts=1) -> List[List[Dict[str, str]]]:
+    """
+    Group jobs sharing a fee, the only axis a sweep run cannot vary
+
+    Args:
+        jobs (List[Dict[str, str]])
+        parts (int, optional): groups each fee is split into, e.g. one per
+            process. Defaults to 1.
+
+    Returns:
+        List[List[Dict[str, str]]]
+    """
+    fees = {}
+    for job in jobs:
+        fees.setdefault(job["fee"], []).append(job)
+    return [
+        group[part::parts] for group in fees.values() for part in range(parts) if group[part::parts]
+    ]
+
+
+def run_sweep_jobs(jobs: List[Dict[str, str]]) -> List[Dict]:
+    """
+    Run jobs sharing a fee at once in the sweep engine
+
+    Args:
+        jobs (List[Dict[str, str]]): output of group_jobs, sharing their fill
+            model
+
+    Returns:
+        List[Dict]: job coordinates, metrics and pnl attribution of every job,
+            or the error of every job when the run raises
+    """
+    try:
+        bt = SweepBacktesting(capital=_CAPITAL, fee=Decimal(jobs[0]["fee"]))
+        policy = InventorySkewPolicy([job["step"] for job in jobs], [job["skew"] for job in jobs])
+        fill_model = get_fill_model(jobs[0].get("fill_model", "price"), _EVALUATION)
+        bt.run(_DATA, policy, refresh=[int(job["time"]) for job in jobs], fill_model=fill_model)
+        totals = attribution_totals(bt.get_attribution())
+    except Exception as error:  # pylint: disable=broad-except
+        return [get_error_record(job, error) for job in jobs]
+
+    return [
+        {**job, **summarize(metric), **get_attribution_record(totals, run)}
+        for run, (job, metric) in enumerate(zip(jobs, bt.get_metrics()))
+    ]
+
+
+def run_grid(grid: Dict, path=RESULT_PATH, processes=None, evaluation=False, retry_errors=None):
+    """
+    Run every grid job missing from path
+
+    Args:
+        grid (Dict): grid configuration
+        path (str, optional): results file. Defaults to RESULT_PATH.
+        processes (int, optional): pool size. Defaults to grid["processes"].
+        evaluation (bool, optional): use out-of-sample data. Defaults to False.
+        retry_errors (bool, optional): run jobs recorded with an error again.
+            Defaults to grid["retry_errors"].
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if retry_errors is None:
+        retry_errors = grid.get("retry_errors", False)
+    settings = get_grid_settings(grid, evaluation)
+    fill_model = settings["fill_model"]
+    if fill_model != "price":
+        if settings["engine"] != "sweep":
+            raise ValueError(f'fill_model "{fill_model}" needs "engine": "sweep"')
+        # missing ladders fail the sweep, not every job
+        get_fill_model(fill_model, evaluation)
+    jobs = [{**job, **settings} for job in expand_grid(grid)]
+    completed = load_completed(path, retry_errors)
+    pending = [job for job in jobs if job_key(job) not in completed]
+    print(f"{len(jobs) - len(pending)}/{len(jobs)} jobs already completed")
+    if not pending:
+        return
+
+    processes = processes or grid.get("processes") or os.cpu_count()
+    if settings["engine"] == "sweep":
+        worker, tasks = run_sweep_jobs, group_jobs(pending, processes)
+    else:
+        worker, tasks = _run_jobs, [[job] for job in pending]
+
+    with Pool(
+        processes,
+        initializer=_init_worker,
+        initargs=(
+            evaluation,
+            settings["capital"],
+            grid["time"],
+            worker is _run_jobs,
+            # coalescing keeps fills only for the price-crossing rule
+            None if fill_model == "price" else False,
+        ),
+    ) as pool, open(path, "a", encoding="utf-8") as f:
+        done = 0
+        for results in pool.imap_unordered(worker, tasks):
+            for result in results:
+                done += 1
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+                if "error" in result:
+                    print(f"[{done}/{len(pending)}] {job_key(result)} error={result['error']}")
+                else:
+                    print(f"[{done}/{len(pending)}] {job_key(result)} sharpe={result['sharpe_ratio']:.4f}")
+
+
+def main():
+    run_grid(GRID_CONFIG)
+
+
+if __name__ == "__main__":
+    main()
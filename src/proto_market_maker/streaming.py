@@ -0,0 +1,214 @@
+"""
+Day-streaming backtest module
+
+Reads the F1 and F2 CSV files in chunks, then decodes, aligns and simulates
+one trading day at a time, so peak memory is bounded by the largest day
+rather than the whole period. Days are decoded and merged with the same
+Backtesting helpers as process_data, and forward-filling carries the previous
+day's last row, so results are identical to the batch run with the default
+F2 merge (lazy_f2 off).
+"""
+
+import csv
+from datetime import date
+from decimal import Decimal
+from typing import Iterator, Optional, Tuple
+
+import pandas as pd
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.cache import get_source_paths
+from proto_market_maker.coalesce import coalesce_day
+from proto_market_maker.config.config import BACKTESTING_CONFIG
+from proto_market_maker.metrics.metric import summarize
+from proto_market_maker.utils import get_expired_dates
+
+CHUNK_ROWS = 200_000
+F1_FLOAT_COLUMNS = ["price", "best-bid", "best-ask", "spread", "close"]
+F2_FLOAT_COLUMNS = ["price", "close"]
+F2_MERGED_COLUMNS = ["f2-tickersymbol", "f2_price", "f2_close"]
+
+
+def iter_csv_days(
+    path: str, float_columns: list, chunksize=CHUNK_ROWS
+) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Yield the raw rows of a date-sorted CSV file one trading day at a time
+
+    Args:
+        path (str)
+        float_columns (list): columns read as float, as the full-file read infers
+        chunksize (int, optional). Defaults to CHUNK_ROWS.
+
+    Yields:
+        Tuple[str, pd.DataFrame]: date string and the day's rows
+    """
+    pending = None
+    dtype = {col: float for col in float_columns}
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=dtype):
+        if pending is not None:
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+
+        dates = chunk["date"].to_numpy()
+        complete = dates != dates[-1]
+        for day_str, day in chunk[complete].groupby("date", sort=False):
+            yield day_str, day.reset_index(drop=True)
+        pending = chunk[~complete]
+
+    if pending is not None and len(pending):
+        yield pending["date"].iloc[0], pending.reset_index(drop=True)
+
+
+def _zip_days(f1_days: Iterator, f2_days: Iterator) -> Iterator:
+    f1 = next(f1_days, None)
+    f2 = next(f2_days, None)
+    while f1 is not None or f2 is not None:
+        if f2 is None or (f1 is not None and f1[0] < f2[0]):
+            yield f1[1], None
+            f1 = next(f1_days, None)
+        elif f1 is None or f2[0] < f1[0]:
+            yield None, f2[1]
+            f2 = next(f2_days, None)
+        else:
+            yield f1[1], f2[1]
+            f1 = next(f1_days, None)
+            f2 = next(f2_days, None)
+
+
+def iter_aligned_days(evaluation=False, chunksize=CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Yield each trading day of processed data, as process_data would build it
+
+    Args:
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+        chunksize (int, optional). Defaults to CHUNK_ROWS.
+
+    Yields:
+        pd.DataFrame
+    """
+    f1_path, f2_path = get_source_paths(evaluation)
+    columns = pd.read_csv(f1_path, nrows=0).columns.tolist() + F2_MERGED_COLUMNS
+
+    carry = None
+    for f1_day, f2_day in _zip_days(
+        iter_csv_days(f1_path, F1_FLOAT_COLUMNS, chunksize),
+        iter_csv_days(f2_path, F2_FLOAT_COLUMNS, chunksize),
+    ):
+        if f2_day is None:
+            day = Backtesting.decode_f1_data(f1_day).reindex(columns=columns)
+        elif f1_day is None:
+            day = Backtesting.decode_f2_data(f2_day).reindex(columns=columns)
+        else:
+            day = Backtesting.merge_f2_data(
+                Backtesting.decode_f1_data(f1_day), Backtesting.decode_f2_data(f2_day)
+            )
+
+        if carry is not None:
+            day = pd.concat([carry, day]).ffill().iloc[1:]
+        else:
+            day = day.ffill()
+        carry = day.iloc[[-1]]
+        yield day.reset_index(drop=True)
+
+
+def with_next_date(
+    days: Iterator[pd.DataFrame],
+) -> Iterator[Tuple[pd.DataFrame, Optional[date]]]:
+    """
+    Pair every day with the next trading date, looking one day ahead
+
+    Args:
+        days (Iterator[pd.DataFrame])
+
+    Yields:
+        Tuple[pd.DataFrame, Optional[date]]
+    """
+    day = next(days, None)
+    while day is not None:
+        next_day = next(days, None)
+        yield day, None if next_day is None else next_day["date"].iloc[0]
+        day = next_day
+
+
+def _read_datetime(path: str, last: bool) -> pd.Timestamp:
+    with open(path, "rb") as f:
+        header = f.readline().decode()
+        if last:
+            f.seek(0, 2)
+            f.seek(max(f.tell() - 4096, 0))
+        line = f.read(4096).decode().splitlines()[-1 if last else 0]
+
+    columns = next(csv.reader([header]))
+    value = next(csv.reader([line]))[columns.index("datetime")]
+    return pd.to_datetime(value, format="%Y-%m-%d %H:%M:%S.%f")
+
+
+def get_data_bounds(evaluation=False) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """
+    First and last tick timestamps of the processed data, without reading it
+
+    Args:
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+
+    Returns:
+        Tuple[pd.Timestamp, pd.Timestamp]
+    """
+    paths = get_source_paths(evaluation)
+    return (
+        min(_read_datetime(path, last=False) for path in paths),
+        max(_read_datetime(path, last=True) for path in paths),
+    )
+
+
+def run_streaming(
+    bt: Backtesting,
+    step: Decimal,
+    evaluation=False,
+    chunksize=CHUNK_ROWS,
+    skew=None,
+    refresh=None,
+    day_callback=None,
+    coalesce=None,
+):
+    """
+    Run bt day by day straight from the CSV files
+
+    With coalesce, each day is coalesced on its F1 and F2 prices before it is
+    simulated, since whether it rolls is only known while running.
+
+    Args:
+        bt (Backtesting)
+        step (Decimal): base quote distance
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+        chunksize (int, optional): CSV rows read at once. Defaults to CHUNK_ROWS.
+        skew (float, optional): inventory skew coefficient
+        refresh (int, optional): requote interval in seconds
+        day_callback (Callable, optional): called with the backtest after every day
+        coalesce (bool, optional): coalesce repeated ticks. Defaults to config coalesce.
+    """
+    bt.set_parameters(skew, refresh)
+    if coalesce is None:
+        coalesce = BACKTESTING_CONFIG["coalesce"]
+
+    start_date, end_date = get_data_bounds(evaluation)
+    days = iter_aligned_days(evaluation, chunksize)
+    if coalesce:
+        days = (coalesce_day(day, [bt.refresh]) for day in days)
+    bt.run_days(
+        with_next_date(days),
+        step,
+        get_expired_dates(start_date, end_date),
+        day_callback,
+    )
+
+
+def main():
+    bt = Backtesting(capital=Decimal("5e5"))
+    run_streaming(bt, Decimal("1.8"))
+
+    for name, value in summarize(bt.metric).items():
+        print(f"{name}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Monte Carlo stress testing module
+
+Backtests the optimized step on seeded perturbations of the processed tick
+data. Each worker keeps the processed data once and builds path ``i`` from
+``(random_seed, i)`` on demand, so paths are reproducible and never held in
+memory all at once.
+"""
+
+import functools
+import os
+from decimal import Decimal
+from multiprocessing import Pool
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.config.config import BEST_CONFIG, STRESS_CONFIG
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.metrics.metric import summarize
+
+RESULT_PATH = "result/stress/stress_metrics.csv"
+
+_BASE = None
+_STEP = None
+
+
+class TickPaths:
+    """
+    Integer tick representation of processed data used to build perturbed paths
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        """
+        Args:
+            data (pd.DataFrame): output of Backtesting.process_data
+        """
+        self.data = data
+        self.f1 = self._to_ticks(data["price"])
+        self.f2 = self._to_ticks(data["f2_price"])
+
+        dates = data["date"].to_numpy()
+        self.date_starts = np.r_[True, dates[1:] != dates[:-1]]
+        self.date_code = np.cumsum(self.date_starts) - 1
+        afternoon = data["datetime"].dt.hour.to_numpy() >= 12
+        session = self.date_code * 2 + afternoon
+        self.session_starts = np.r_[True, session[1:] != session[:-1]]
+        self.session = session
+        self.date_last = np.r_[self.date_starts[1:], True]
+
+    @staticmethod
+    def _to_ticks(column: pd.Series) -> np.ndarray:
+        return np.round(column.astype(float).to_numpy() * 10)
+
+    def _anchor(self, starts: np.ndarray) -> np.ndarray:
+        positions = np.arange(len(starts))
+        return np.maximum.accumulate(np.where(starts, positions, 0))
+
+    def shuffle(self, ticks: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """
+        Shuffle tick-to-tick changes within each trading session
+
+        Missing ticks stay missing and do not contribute a change, so a gap in
+        the prices does not spread past its own rows.
+
+        Args:
+            ticks (np.ndarray)
+            rng (np.random.Generator)
+
+        Returns:
+            np.ndarray
+        """
+        rows = np.flatnonzero(~np.isnan(ticks))
+        draws = rng.random(len(ticks))[rows]
+        valid, session = ticks[rows], self.session[rows]
+        starts = np.r_[True, session[1:] != session[:-1]]
+
+        diffs = np.diff(valid, prepend=valid[:1])
+        diffs[starts] = 0
+        keys = np.where(starts, -1.0, draws)
+        shuffled = np.cumsum(diffs[np.lexsort((keys, session))])
+
+        anchor = self._anchor(starts)
+        result = ticks.copy()
+        result[rows] = valid[anchor] + shuffled - shuffled[anchor]
+        return result
+
+    def scale_volatility(self, ticks: np.ndarray, factor: float) -> np.ndarray:
+        """
+        Scale intraday excursions from each session open
+
+        Args:
+            ticks (np.ndarray)
+            factor (float)
+
+        Returns:
+            np.ndarray
+        """
+        opens = ticks[self._anchor(self.session_starts)]
+        return opens + np.round(factor * (ticks - opens))
+
+    def inject_gaps(
+        self, ticks: np.ndarray, rng: np.random.Generator, probability: float, size: float
+    ) -> np.ndarray:
+        """
+        Shift whole days by random opening gaps that persist afterwards
+
+        Args:
+            ticks (np.ndarray)
+            rng (np.random.Generator)
+            probability (float): chance of a gap at each day open
+            size (float): gap standard deviation in index points
+
+        Returns:
+            np.ndarray
+        """
+        n_days = self.date_code[-1] + 1
+        gaps = np.where(
+            rng.random(n_days) < probability, np.round(rng.normal(0, size * 10, n_days)), 0
+        )
+        gaps[0] = 0
+        return ticks + np.cumsum(gaps)[self.date_code]
+
+    def path(self, seed: int, index: int, config: Dict) -> pd.DataFrame:
+        """
+        Build perturbed path index
+
+        F2 prices move with F1 so the roll basis is preserved, and daily closes
+        follow the shift of the day's last price.
+
+        Args:
+            seed (int)
+            index (int)
+            config (Dict): perturbation settings
+
+        Returns:
+            pd.DataFrame: processed data with perturbed prices
+        """
+        rng = np.random.default_rng([seed, index])
+        ticks = self.f1
+        if config.get("shuffle"):
+            ticks = self.shuffle(ticks, rng)
+        if config.get("volatility_scale"):
+            ticks = self.scale_volatility(ticks, rng.uniform(*config["volatility_scale"]))
+        if config.get("gap_probability"):
+            ticks = self.inject_gaps(ticks, rng, config["gap_probability"], config["gap_size"])
+
+        shift = ticks - self.f1
+        day_shift = shift[self.date_last][self.date_code]
+
+        path = self.data.copy()
+        path["price"] = _from_ticks(ticks, path["price"])
+        path["f2_price"] = _from_ticks(self.f2 + shift, path["f2_price"])
+        path["close"] = _from_ticks(self._to_ticks(path["close"]) + day_shift, path["close"])
+        path["f2_close"] = _from_ticks(
+            self._to_ticks(path["f2_close"]) + day_shift, path["f2_close"]
+        )
+        return path
+
+
+def _from_ticks(ticks: np.ndarray, original: pd.Series) -> list:
+    return [
+        Decimal(int(tick)).scaleb(-1) if tick == tick else value
+        for tick, value in zip(ticks, original)
+    ]
+
+
+def _init_worker(evaluation: bool, step: str):
+    global _BASE, _STEP
+    _BASE = TickPaths(Backtesting.process_data(evaluation=evaluation, coalesce=False))
+    _STEP = Decimal(step)
+
+
+def run_path(index: int, config: Dict) -> Dict:
+    """
+    Backtest perturbed path index on the worker's base data
+
+    Args:
+        index (int)
+        config (Dict): stress settings
+
+    Returns:
+        Dict: path index and metrics
+    """
+    data = _BASE.path(config["random_seed"], index, config)
+    bt = Backtesting(capital=Decimal("5e5"), printable=False)
+    bt.run(data, _STEP)
+    return {"path": index, **summarize(bt.metric)}
+
+
+def run_stress(
+    step, no_paths: int, processes: int, evaluation=False, config: Dict = None
+) -> pd.DataFrame:
+    """
+    Backtest step on no_paths perturbed paths
+
+    Args:
+        step: quote step
+        no_paths (int)
+        processes (int)
+        evaluation (bool, optional): perturb out-of-sample data. Defaults to False.
+        config (Dict, optional): stress settings. Defaults to STRESS_CONFIG.
+
+    Returns:
+        pd.DataFrame: one row of metrics per path
+    """
+    worker = functools.partial(run_path, config=STRESS_CONFIG if config is None else config)
+    with Pool(processes, initializer=_init_worker, initargs=(evaluation, str(step))) as pool:
+        results = []
+        for result in pool.imap_unordered(worker, range(no_paths)):
+            results.append(result)
+            print(f"[{len(results)}/{no_paths}] path {result['path']} sharpe={result['sharpe_ratio']:.4f}")
+
+    return pd.DataFrame(results).sort_values("path").reset_index(drop=True)
+
+
+def main():
+    metrics = run_stress(
+        BEST_CONFIG["step"], STRESS_CONFIG["no_paths"], STRESS_CONFIG["processes"]
+    )
+    os.makedirs(os.path.dirname(RESULT_PATH), exist_ok=True)
+    metrics.to_csv(RESULT_PATH, index=False)
+
+    print(metrics.drop(columns="path").describe(percentiles=[0.05, 0.25, 0.5, 0.75, 0.95]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Vectorized sweep engine module
+
+Runs many strategy instances over the same ticks at once: the tick loop is
+shared and every rule of Backtesting (rolls, forced liquidations, capital
+checks, matching, requotes and the daily pnl) is applied to arrays with one
+entry per instance. Quotes come from a QuotePolicy of matching size.
+
+Quotes and fills are decided on integer ticks exactly as in Backtesting.
+Money is kept in float64 instead of Decimal, so assets agree with Backtesting
+to rounding error, and a capital check lying on a contract boundary may fall
+the other way. Each day's pnl is attributed per instance as in
+metrics.attribution, without keeping a fill journal. A fill model from
+orderbook decides which quotes a tick fills, by default the price crossing
+rule of Backtesting.
+"""
+
+from decimal import Decimal
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.backtest import MARGIN_RATE, MULTIPLIER, REFRESH_SECONDS
+from proto_market_maker.config.config import BACKTESTING_CONFIG
+from proto_market_maker.metrics.attribution import (
+    COMPONENTS,
+    attribution_table,
+    get_reference_prices,
+)
+from proto_market_maker.metrics.metric import Metric
+from proto_market_maker.orderbook import FillModel
+from proto_market_maker.policy import QuotePolicy
+from proto_market_maker.utils import get_expired_dates, get_roll_dates
+
+
+class SweepBacktesting:
+    """
+    Backtesting over arrays of strategy instances
+    """
+
+    def __init__(
+        self,
+        capital: Decimal,
+        fee: Decimal = None,
+        multiplier: Decimal = MULTIPLIER,
+        margin_rate: Decimal = MARGIN_RATE,
+    ):
+        """
+        Args:
+            capital (Decimal): starting capital of every instance
+            fee (Decimal, optional): fee per side in index points. Defaults to config fee.
+            multiplier (Decimal, optional): contract value of one index point
+            margin_rate (Decimal, optional): initial margin as a share of contract value
+        """
+        self.capital = float(capital)
+        self.multiplier = float(multiplier)
+        self.margin_rate = float(margin_rate)
+        self.fee_per_contract = float(
+            Decimal(BACKTESTING_CONFIG["fee"] if fee is None else fee) * Decimal(multiplier)
+        )
+
+        self.daily_assets: List[np.ndarray] = []
+        self.daily_returns: List[np.ndarray] = []
+        self.daily_inventory: List[np.ndarray] = []
+        self.daily_attribution: List[np.ndarray] = []
+        self.tracking_dates = []
+        self.monthly_tracking = []
+
+    def get_placeable(self, cash: np.ndarray, price: float, inventory: np.ndarray) -> np.ndarray:
+        """
+        Contracts each instance may still open, as Backtesting.get_maximum_placeable
+        """
+        total = np.trunc(cash / (price * self.multiplier * self.margin_rate))
+        return np.maximum(total, 0).astype(np.int64) - np.abs(inventory)
+
+    def run(self, data: pd.DataFrame, policy: QuotePolicy, refresh=None, fill_model=None):
+        """
+        Run every instance of policy over data
+
+        Args:
+            data (pd.DataFrame): processed tick data
+            policy (QuotePolicy): one instance per strategy
+            refresh (optional): requote interval in seconds, one value or one per
+                instance. Defaults to config time.
+            fill_model (FillModel, optional): Defaults to filling on the price.
+        """
+        size = policy.size
+        refresh = REFRESH_SECONDS if refresh is None else refresh
+        refresh_ns = np.broadcast_to(np.asarray(refresh, dtype=np.int64) * 10**9, (size,))
+
+        trading_dates = data["date"].unique().tolist()
+        roll_dates = get_roll_dates(
+            trading_dates,
+            get_expired_dates(data["datetime"].iloc[0], data["datetime"].iloc[-1]),
+        )
+        rolling = data["date"].isin(roll_dates).to_numpy()
+        f1 = data["price"].to_numpy(dtype=float)
+        f2 = data["f2_price"].to_numpy(dtype=float)
+        prices = np.round(np.where(rolling, f2, f1) * 10).astype(np.int64)
+        closes = np.where(rolling, data["f2_close"], data["close"]).astype(float)
+        times = data["datetime"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+
+        dates = data["date"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+        ends = np.r_[starts[1:], len(dates)]
+        day_of = np.cumsum(np.r_[True, dates[1:] != dates[:-1]]) - 1
+        references = get_reference_prices(times, day_of, prices / 10)
+        fill_model = FillModel() if fill_model is None else fill_model
+        fill_model.prepare(times, rolling, prices)
+
+        self.daily_assets = [np.full(size, self.capital)]
+        inventory = np.zeros(size, dtype=np.int64)
+        inventory_price = np.zeros(size)
+        for begin, end in zip(starts, ends):
+            trading_date = dates[begin]
+            rolled = trading_date in roll_dates
+            ac_loss = np.zeros(size)
+            attribution = dict.fromkeys(COMPONENTS, 0.0)
+            if rolled:
+                inventory_price, ac_loss = self.move_f1_to_f2(
+                    inventory, inventory_price, f1[begin], f2[begin]
+                )
+                attribution["fees"] = -self.fee_per_contract * np.abs(inventory)
+                attribution["roll"] = -attribution["fees"] - ac_loss
+
+            inventory, inventory_price, ac_loss = self.run_day(
+                policy,
+                times[begin:end],
+                prices[begin:end],
+                refresh_ns,
+                inventory,
+                inventory_price,
+                ac_loss,
+                references[begin:end],
+                attribution,
+                fill_model,
+                begin,
+            )
+
+            close = closes[end - 1]
+            held = inventory != 0
+            pnl = np.where(held, inventory * (close - inventory_price) * self.multiplier, 0.0)
+            attribution["drift"] = attribution["drift"] + pnl - attribution["spread"]
+            pnl -= ac_loss
+            inventory_price = np.where(held, close, inventory_price)
+            self.daily_attribution.append(
+                np.stack([np.broadcast_to(attribution[name], (size,)) for name in COMPONENTS])
+            )
+
+            new_assets = self.daily_assets[-1] + pnl
+            self.daily_returns.append(new_assets / self.daily_assets[-1] - 1)
+            self.daily_assets.append(new_assets)
+            if rolled:
+                self.monthly_tracking.append([trading_date, new_assets])
+            self.tracking_dates.append(trading_date)
+            self.daily_inventory.append(inventory)
+
+    def move_f1_to_f2(self, inventory, inventory_price, f1_price, f2_price):
+        held = inventory != 0
+        points = np.where(inventory > 0, f1_price - inventory_price, inventory_price - f1_price)
+        ac_loss = (
+            np.where(held, -points * self.multiplier, 0.0)
+            + self.fee_per_contract * np.abs(inventory)
+        )
+        return np.where(held, f2_price, inventory_price), ac_loss
+
+    def run_day(
+        self,
+        policy,
+        times,
+        prices,
+        refresh_ns,
+        inventory,
+        inventory_price,
+        ac_loss,
+        references=None,
+        attribution=None,
+        fill_model=None,
+        first=0,
+    ):
+        """
+        Run one day's ticks for every instance
+
+        Args:
+            references (np.ndarray, optional): output of get_reference_prices
+                for the day's ticks, needed with attribution
+            attribution (Dict, optional): component name -> pnl so far, added
+                to in place; drift receives closed pnl, before the spread is
+                taken out
+            fill_model (FillModel, optional): prepared for the run. Defaults
+                to filling on the price, prepared on the day's ticks.
+            first (int, optional): position of the day's first tick in the
+                run fill_model was prepared on
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: inventory, inventory_price
+                and ac_loss at the day end
+        """
+        assets = self.daily_assets[-1]
+        multiplier = self.multiplier
+        fee = self.fee_per_contract
+        old_timestamp = np.full(policy.size, times[0])
+        bid = ask = None
+        if attribution is None:
+            attribution = dict.fromkeys(COMPONENTS, 0.0)
+            references = np.zeros(len(times))
+        if fill_model is None:
+            fill_model, first = FillModel(), 0
+            fill_model.prepare(times, np.zeros(len(times), dtype=bool), prices)
+        fill_model.reset()
+
+        for index, timestamp, tick, reference in zip(
+            range(first, first + len(times)), times, prices, references
+        ):
+            price = tick / 10
+            placeable = self.get_placeable(assets - ac_loss, price, inventory)
+            forced = placeable < 0
+            while forced.any():
+                inventory = inventory + np.where(inventory < 0, 1, -1) * forced
+                ac_loss = ac_loss + forced * (
+                    np.abs(price - inventory_price) * multiplier + fee
+                )
+                attribution["force"] = attribution["force"] - forced * (
+                    np.abs(price - inventory_price) * multiplier
+                )
+                attribution["fees"] = attribution["fees"] - forced * fee
+                placeable = self.get_placeable(assets - ac_loss, price, inventory)
+                forced = placeable < 0
+
+            if bid is None:
+                requote = np.ones(policy.size, dtype=bool)
+            else:
+                matched = np.zeros(policy.size, dtype=np.int64)
+                bid_hit, ask_hit = fill_model.match(index, bid, ask)
+                for side, hit in ((1, bid_hit), (-1, ask_hit)):
+                    if not hit.any():
+                        continue
+                    opened = hit & (inventory * side >= 0) & (placeable > 0)
+                    closed = hit & (inventory * side < 0)
+                    held = np.abs(inventory)
+                    inventory_price = np.where(
+                        opened, (inventory_price * held + price) / (held + 1), inventory_price
+                    )
+                    points = (inventory_price - price) * side
+                    ac_loss = np.where(closed, ac_loss + (fee - points * multiplier), ac_loss)
+                    inventory = inventory + side * (opened | closed)
+                    attribution["spread"] = attribution["spread"] + (opened | closed) * (
+                        side * (reference - price) * multiplier
+                    )
+                    attribution["drift"] = attribution["drift"] + closed * points * multiplier
+                    attribution["fees"] = attribution["fees"] - closed * fee
+                    matched += opened.astype(np.int64) - closed
+
+                timed = timestamp > old_timestamp + refresh_ns
+                old_timestamp = np.where(timed, timestamp, old_timestamp)
+                requote = timed | (matched != 0)
+                if not requote.any():
+                    continue
+
+            new_bid, new_ask = policy.quote(
+                np.full(policy.size, tick), inventory, (timestamp - old_timestamp) / 1e9
+            )
+            bid = new_bid if bid is None else np.where(requote, new_bid, bid)
+            ask = new_ask if ask is None else np.where(requote, new_ask, ask)
+            fill_model.on_quote(index, bid, ask)
+
+        return inventory, inventory_price, ac_loss
+
+    def get_attribution(self) -> pd.DataFrame:
+        """
+        Daily pnl attribution of every instance, run numbering the instances
+
+        Returns:
+            pd.DataFrame: output of attribution_table
+        """
+        return attribution_table(np.stack(self.daily_attribution, axis=-1), self.tracking_dates)
+
+    def get_metrics(self) -> List[Metric]:
+        """
+        Metric of every instance, on Decimal returns like Backtesting
+        """
+        returns = np.array(self.daily_returns)
+        return [
+            Metric([Decimal(value) for value in returns[:, index]], None)
+            for index in range(returns.shape[1])
+        ]
@@ -0,0 +1,339 @@
+"""
+Resident tick data server module
+
+pmm-tick-server processes the in-sample and out-of-sample ticks once. It
+keeps every column in a named shared-memory segment and serves a catalog of
+the datasets (rows, date range, source modification times and column layout)
+over a Unix socket. When the server is not running, or its sources changed
+since it loaded them, attach_data returns None and process_data reads the
+CSV files as usual.
+
+Columns are stored as float64 (Decimal prices, NaN when missing), int64
+(timestamps, dates) or int32 category codes (ticker symbols). attach_arrays
+returns read-only NumPy views of the segments. attach_data(decimal=False)
+builds a frame for the array engines on those views, with float64 prices
+and timestamps not copied. Only the Decimal engine's frame,
+attach_data(decimal=True), converts prices back to Decimal, once per
+distinct price, through round_decimal's own conversion, so it equals
+process_data exactly.
+"""
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+from datetime import date
+from decimal import Decimal
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.cache import get_source_paths
+from proto_market_maker.config.config import BACKTESTING_CONFIG, TICK_SERVER_SOCKET
+
+_SEGMENTS = {}
+_OWNED = set()
+
+
+def get_dataset_name(evaluation=False, lazy_f2=False) -> str:
+    return f"{'os' if evaluation else 'is'}{'_lazy_f2' if lazy_f2 else ''}"
+
+
+def _column_layout(column: pd.Series) -> Dict:
+    if column.dtype.kind == "M":
+        return {"kind": "datetime", "dtype": str(column.dtype)}
+    sample = column.dropna()
+    sample = sample.iloc[0] if len(sample) else None
+    if isinstance(sample, Decimal):
+        return {"kind": "decimal", "dtype": "object"}
+    if isinstance(sample, date):
+        return {"kind": "date", "dtype": "object"}
+    return {"kind": "category", "dtype": str(column.dtype)}
+
+
+def encode_column(column: pd.Series, layout: Dict) -> np.ndarray:
+    """
+    Fixed-width array stored for a column
+
+    Args:
+        column (pd.Series)
+        layout (Dict): output of _column_layout, category layouts receive
+            their categories
+
+    Returns:
+        np.ndarray
+    """
+    if layout["kind"] == "datetime":
+        return column.to_numpy().view(np.int64)
+    if layout["kind"] == "decimal":
+        return column.to_numpy(dtype=float, na_value=np.nan)
+    if layout["kind"] == "date":
+        return column.to_numpy().astype("datetime64[D]").astype(np.int64)
+
+    codes, categories = pd.factorize(column)
+    layout["categories"] = categories.tolist()
+    return codes.astype(np.int32)
+
+
+def decode_column(values: np.ndarray, layout: Dict, decimal=True):
+    """
+    Column values rebuilt from a stored array
+
+    Args:
+        values (np.ndarray)
+        layout (Dict)
+        decimal (bool, optional): values of process_data, with Decimal
+            prices. Otherwise prices stay the stored float64 array and ticker
+            symbols are categorical on the stored codes. Defaults to True.
+
+    Returns:
+        column values
+    """
+    if layout["kind"] == "datetime":
+        return values.view(layout["dtype"])
+    if layout["kind"] == "date":
+        uniques, inverse = np.unique(values, return_inverse=True)
+        return uniques.astype("datetime64[D]").astype(object)[inverse]
+    if layout["kind"] == "decimal":
+        if not decimal:
+            return values
+        uniques, inverse = np.unique(values, return_inverse=True)
+        decimals = np.array(
+            [Decimal(str(round(float(value), 10))) if value == value else np.nan for value in uniques],
+            dtype=object,
+        )
+        return decimals[inverse]
+
+    if not decimal:
+        return pd.Categorical.from_codes(values, layout["categories"])
+    categories = np.array(layout["categories"] + [np.nan], dtype=object)
+    return pd.array(categories[values], dtype=layout["dtype"])
+
+
+def _attach_segment(name: str) -> shared_memory.SharedMemory:
+    # segments belong to the server: keep the tracker from unlinking them at exit
+    try:
+        segment = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        if name not in _OWNED:
+            # the tracker registers POSIX names with their leading slash
+            resource_tracker.unregister(f"/{segment.name}", "shared_memory")
+    return segment
+
+
+class TickServer:
+    """
+    Owner of the shared-memory segments and the catalog socket
+    """
+
+    def __init__(self, socket_path=TICK_SERVER_SOCKET):
+        """
+        Args:
+            socket_path (str, optional): Unix socket of the catalog. Defaults to config.
+        """
+        self.socket_path = socket_path
+        self.catalog = {"datasets": {}}
+        self.segments = []
+        self._server = None
+        self._thread = None
+
+    def add_dataset(self, name: str, data: pd.DataFrame, sources: Dict[str, float]):
+        """
+        Copy a processed frame into shared memory
+
+        Args:
+            name (str): output of get_dataset_name
+            data (pd.DataFrame): output of process_data
+            sources (Dict[str, float]): source path -> modification time it was read at
+        """
+        columns = {}
+        for column_name in ["__index__"] + data.columns.tolist():
+            column = pd.Series(data.index) if column_name == "__index__" else data[column_name]
+            layout = _column_layout(column)
+            values = np.ascontiguousarray(encode_column(column, layout))
+
+            segment = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, values.dtype, buffer=segment.buf)[:] = values
+            self.segments.append(segment)
+            _OWNED.add(segment.name)
+            columns[column_name] = {
+                **layout,
+                "segment": segment.name,
+                "stored": values.dtype.str,
+            }
+
+        self.catalog["datasets"][name] = {
+            "rows": len(data),
+            "start": str(data["datetime"].iloc[0]),
+            "end": str(data["datetime"].iloc[-1]),
+            "sources": sources,
+            "columns": columns,
+        }
+
+    def start(self) -> "TickServer":
+        """
+        Serve the catalog in a background thread
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request = json.loads(self.rfile.readline() or "{}")
+                response = server.catalog if request.get("op") == "catalog" else {"error": "unknown op"}
+                self.wfile.write((json.dumps(response) + "\n").encode())
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and release every segment
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        for segment in self.segments:
+            _OWNED.discard(segment.name)
+            _SEGMENTS.pop(segment.name, None)
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def get_catalog(socket_path=TICK_SERVER_SOCKET, timeout=1.0) -> Optional[Dict]:
+    """
+    Ask the tick server for its catalog
+
+    Args:
+        socket_path (str, optional): Defaults to config.
+        timeout (float, optional): seconds. Defaults to 1.0.
+
+    Returns:
+        Optional[Dict]: None when no server answers
+    """
+    if not os.path.exists(socket_path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            client.sendall(b'{"op": "catalog"}\n')
+            with client.makefile("rb") as reader:
+                return json.loads(reader.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def attach_arrays(entry: Dict) -> Dict[str, np.ndarray]:
+    """
+    Read-only views of a dataset's stored columns
+
+    Args:
+        entry (Dict): a dataset of the catalog
+
+    Returns:
+        Dict[str, np.ndarray]: column name -> stored array, in shared memory
+    """
+    arrays = {}
+    for column_name, layout in entry["columns"].items():
+        segment = _SEGMENTS.get(layout["segment"])
+        if segment is None:
+            segment = _SEGMENTS[layout["segment"]] = _attach_segment(layout["segment"])
+        values = np.ndarray(entry["rows"], np.dtype(layout["stored"]), buffer=segment.buf)
+        values.flags.writeable = False
+        arrays[column_name] = values
+    return arrays
+
+
+def is_current(entry: Dict) -> bool:
+    return all(
+        os.path.exists(path) and os.path.getmtime(path) == modified
+        for path, modified in entry["sources"].items()
+    )
+
+
+def attach_data(
+    evaluation=False, lazy_f2=False, socket_path=TICK_SERVER_SOCKET, decimal=True
+) -> Optional[pd.DataFrame]:
+    """
+    process_data's frame built on the tick server's segments
+
+    Args:
+        evaluation (bool, optional): out-of-sample data. Defaults to False.
+        lazy_f2 (bool, optional): F2 loaded for roll days only. Defaults to False.
+        socket_path (str, optional): Defaults to config.
+        decimal (bool, optional): Decimal prices for the Decimal engine.
+            Otherwise prices are read-only float64 views of the segments.
+            Defaults to True.
+
+    Returns:
+        Optional[pd.DataFrame]: None when the server is not running, does not
+            hold the dataset, or loaded it from older sources
+    """
+    catalog = get_catalog(socket_path)
+    if catalog is None:
+        return None
+    entry = catalog["datasets"].get(get_dataset_name(evaluation, lazy_f2))
+    if entry is None or not is_current(entry):
+        return None
+
+    arrays = attach_arrays(entry)
+    layouts = entry["columns"]
+    index = arrays.pop("__index__")
+    if np.array_equal(index, np.arange(len(index))):
+        index = pd.RangeIndex(len(index))
+    return pd.DataFrame(
+        {name: decode_column(values, layouts[name], decimal) for name, values in arrays.items()},
+        index=index,
+        copy=False,
+    )
+
+
+def main():
+    # backtest attaches through this module
+    from proto_market_maker.backtest import Backtesting  # pylint: disable=import-outside-toplevel
+
+    lazy_f2 = BACKTESTING_CONFIG["lazy_f2"]
+    server = TickServer()
+    for evaluation in (False, True):
+        sources = get_source_paths(evaluation)
+        if not all(os.path.exists(path) for path in sources):
+            continue
+        modified = {path: os.path.getmtime(path) for path in sources}
+        data = Backtesting.process_data(evaluation, lazy_f2, coalesce=False, attach=False)
+        name = get_dataset_name(evaluation, lazy_f2)
+        server.add_dataset(name, data, modified)
+        print(f"Serving {name}: {len(data)} rows")
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    with server:
+        print(f"Catalog on {server.socket_path}, Ctrl+C to stop")
+        try:
+            stopped.wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,9 @@ This module provides helper functions
 from datetime import datetime
 from decimal import Decimal
 from queue import Queue
+import numpy as np
 from dateutil.rrule import rrule, MONTHLY, TH
-from pandas import DataFrame
+from pandas import DataFrame, Series
 
 
 def round_decimal(df: DataFrame, column: str, digits=10):
@@ -60,3 +61,85 @@ def get_expired_dates(start_date: datetime, end_date: datetime) -> Queue:
         queue.put(d.date())
 
     return queue
+
+
+def get_requote_window_starts(datetimes: Series, dates, refresh: int) -> np.ndarray:
+    """
+    Mark ticks that start a requote window
+
+    Mirrors the timed requote in Backtesting.update_bid_ask: a window starts at
+    the first tick of a day and then at the first tick strictly later than
+    window start + refresh seconds. Fill-driven requotes never move the window.
+
+    Args:
+        datetimes (Series): tick timestamps, sorted
+        dates: trading date of each tick
+        refresh (int): requote interval in seconds
+
+    Returns:
+        np.ndarray: boolean mask of window starts
+    """
+    timestamps = datetimes.to_numpy().astype("datetime64[ns]").astype(np.int64)
+    dates = np.asarray(dates)
+    refresh_ns = int(refresh) * 10**9
+
+    starts = np.zeros(len(timestamps), dtype=bool)
+    day_starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+    for begin, end in zip(day_starts, np.r_[day_starts[1:], len(timestamps)]):
+        day = timestamps[begin:end]
+        i = 0
+        while i < len(day):
+            starts[begin + i] = True
+            i = np.searchsorted(day, day[i] + refresh_ns, side="right")
+
+    return starts
+
+
+def get_roll_dates(trading_dates: list, expiration_dates: Queue) -> list:
+    """
+    Get trading dates on which Backtesting.run moves from F1 to F2
+
+    A date rolls when the next trading date reaches the next expiration,
+    the same test run applies while iterating ticks.
+
+    Args:
+        trading_dates (list): sorted trading dates
+        expiration_dates (Queue): output of get_expired_dates, consumed
+
+    Returns:
+        list
+    """
+    roll_dates = []
+    for cur_index, date in enumerate(trading_dates[:-1]):
+        while (
+            not expiration_dates.empty()
+            and trading_dates[cur_index + 1] >= expiration_dates.queue[0]
+        ):
+            expiration_dates.get()
+            if not roll_dates or roll_dates[-1] != date:
+                roll_dates.append(date)
+
+    return roll_dates
+
+
+def get_pending_expirations(
+    trading_dates: list, day_index: int, expiration_dates: Queue
+) -> Queue:
+    """
+    Consume the expirations Backtesting.run_day has rolled before a given day
+
+    Lets a run start mid-calendar with the same roll dates as a full run.
+
+    Args:
+        trading_dates (list): sorted trading dates of the full run
+        day_index (int): index of the first day to run
+        expiration_dates (Queue): output of get_expired_dates for the full run, consumed
+
+    Returns:
+        Queue
+    """
+    for next_date in trading_dates[1:day_index + 1]:
+        if not expiration_dates.empty() and next_date >= expiration_dates.queue[0]:
+            expiration_dates.get()
+
+    return expiration_dates
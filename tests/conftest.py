@@ -0,0 +1,47 @@
+"""Shared fixtures: a small synthetic VN30F1M / VN30F2M dataset."""
+import numpy as np
+import pandas as pd
+import pytest
+
+COLUMNS = ["datetime", "tickersymbol", "price", "best-bid", "best-ask", "spread", "date", "close"]
+
+
+def write_tick_csvs(prefix_path, n_days=12, seed=0):
+    """
+    Write F1/F2 CSV files in the data_loader layout, covering the March 2022 roll
+
+    Args:
+        prefix_path: directory receiving VN30F1M_data.csv and VN30F2M_data.csv
+        n_days (int, optional). Defaults to 12.
+        seed (int, optional). Defaults to 0.
+    """
+    rng = np.random.default_rng(seed)
+    f1_rows, f2_rows = [], []
+    price = 1000.0
+    for day in pd.bdate_range("2022-03-08", periods=n_days):
+        open_time = day + pd.Timedelta(hours=9)
+        seconds = np.sort(rng.choice(np.arange(1, 5 * 3600), 200, replace=False))
+        seconds[0] = 0
+        prices = np.round(price + np.cumsum(rng.choice([-0.5, -0.1, 0, 0, 0.1, 0.5], 200)) * 3, 1)
+        price = prices[-1]
+        for second, tick in zip(seconds, prices):
+            stamp = (open_time + pd.Timedelta(seconds=int(second))).strftime("%Y-%m-%d %H:%M:%S.%f")
+            f1_rows.append((stamp, "VN30F1M", tick, tick - 0.1, tick + 0.1, 0.2, day.date(), prices[-1]))
+        # F2 trades partly on F1 timestamps and partly on its own
+        f2_seconds = np.sort(np.r_[seconds[5::9], rng.choice(np.arange(1, 5 * 3600), 15, replace=False)])
+        for second in np.unique(f2_seconds):
+            stamp = (open_time + pd.Timedelta(seconds=int(second))).strftime("%Y-%m-%d %H:%M:%S.%f")
+            tick = round(float(np.interp(second, seconds, prices)) + 1.5, 1)
+            f2_rows.append((stamp, "VN30F2M", tick, tick - 0.1, tick + 0.1, 0.2, day.date(), prices[-1] + 1.5))
+
+    prefix_path.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(f1_rows, columns=COLUMNS).to_csv(prefix_path / "VN30F1M_data.csv", index=False)
+    pd.DataFrame(f2_rows, columns=COLUMNS).to_csv(prefix_path / "VN30F2M_data.csv", index=False)
+
+
+@pytest.fixture
+def tick_data(tmp_path, monkeypatch):
+    """In-sample synthetic data under data/is/, with the working directory moved there."""
+    write_tick_csvs(tmp_path / "data" / "is")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,68 @@
+"""Tests for daily pnl attribution."""
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.metrics.attribution import (
+    COMPONENTS,
+    attribute_backtest,
+    attribute_fills,
+    attribution_totals,
+    get_reference_prices,
+    stack_fills,
+)
+from proto_market_maker.policy import InventorySkewPolicy
+from proto_market_maker.sweep import SweepBacktesting
+
+STEPS, SKEWS, REFRESHES = ["0.5", "1.0"], [0.02, 0.0], [15, 30]
+
+
+def test_reference_is_the_last_earlier_price_of_the_day():
+    times = np.array([0, 1, 1, 2, 10, 13])
+    day_of = np.array([0, 0, 0, 0, 1, 1])
+    prices = np.array([np.nan, 11.0, 12.0, 13.0, 20.0, 21.0])
+
+    np.testing.assert_array_equal(
+        get_reference_prices(times, day_of, prices), [np.nan, 11.0, 12.0, 12.0, 20.0, 20.0]
+    )
+
+
+@pytest.mark.parametrize("capital", ["5e5", "4e4"])
+def test_components_add_up_to_daily_pnl(tick_data, capital):
+    data = Backtesting.process_data()
+    bt = Backtesting(capital=Decimal(capital), printable=False)
+    bt.run(data, Decimal("0.5"))
+
+    table = attribute_backtest(bt, data)
+    assert table["date"].tolist() == bt.tracking_dates
+    np.testing.assert_allclose(
+        table["pnl"], np.diff(np.array(bt.daily_assets, dtype=float)), atol=1e-8
+    )
+    np.testing.assert_allclose(table[COMPONENTS].sum(axis=1), table["pnl"])
+
+    kinds = set(bt.get_fills()["kind"])
+    totals = attribution_totals(table).iloc[0]
+    assert (totals["roll"] != 0) == ("roll" in kinds)
+    assert (totals["force"] != 0) == ("force" in kinds)
+    assert totals["fees"] < 0
+
+
+def test_stacked_runs_match_sweep_attribution(tick_data):
+    data = Backtesting.process_data()
+    journals = []
+    for step, skew, refresh in zip(STEPS, SKEWS, REFRESHES):
+        bt = Backtesting(capital=Decimal("5e5"), printable=False)
+        bt.run(data, Decimal(step), skew=skew, refresh=refresh)
+        journals.append(bt.get_fills())
+    stacked = attribute_fills(stack_fills(journals), data, bt.fee_per_contract, bt.multiplier)
+
+    sweep = SweepBacktesting(capital=Decimal("5e5"))
+    sweep.run(data, InventorySkewPolicy(STEPS, SKEWS), refresh=REFRESHES)
+    table = sweep.get_attribution()
+
+    assert table[["run", "date"]].equals(stacked[["run", "date"]])
+    np.testing.assert_allclose(
+        table[COMPONENTS + ["pnl"]], stacked[COMPONENTS + ["pnl"]], atol=1e-6
+    )
@@ -0,0 +1,65 @@
+"""Tests for requote-window bars."""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.bars import bars_to_ticks, build_bars, load_bars
+from proto_market_maker.utils import get_requote_window_starts
+
+
+def test_requote_windows_follow_engine_cadence():
+    datetimes = pd.Series(pd.to_datetime(
+        ["2022-03-01 09:00:00", "2022-03-01 09:00:10", "2022-03-01 09:00:15",
+         "2022-03-01 09:00:16", "2022-03-01 09:00:31", "2022-03-02 09:00:05"]
+    ))
+    starts = get_requote_window_starts(datetimes, datetimes.dt.date.to_numpy(), 15)
+    # 09:00:15 is not strictly later than 09:00:00 + 15s; a new day always starts a window
+    assert starts.tolist() == [True, False, False, True, False, True]
+
+
+def test_bar_paths_visit_extremes_in_documented_order():
+    datetimes = pd.to_datetime(["2022-03-01 09:00:00", "2022-03-01 09:00:05", "2022-03-01 09:00:10"])
+    prices = [Decimal("1000.0"), Decimal("999.0"), Decimal("1001.0")]
+    data = pd.DataFrame({
+        "datetime": datetimes,
+        "date": datetimes.date,
+        "tickersymbol": "VN30F1M",
+        "f2-tickersymbol": "VN30F2M",
+        "price": prices,
+        "close": Decimal("1001.0"),
+        "f2_price": prices,
+        "f2_close": Decimal("1001.0"),
+    })
+    ticks = bars_to_ticks(build_bars(data, 15))
+
+    assert ticks["price"].tolist() == [Decimal("1000.0"), Decimal("999.0"), Decimal("1001.0")]
+    assert (ticks["datetime"] == datetimes[0]).all()
+
+
+def test_missing_f2_prices_do_not_keep_repeated_points():
+    datetimes = pd.to_datetime(["2022-03-01 09:00:00", "2022-03-01 09:00:05"])
+    data = pd.DataFrame({
+        "datetime": datetimes,
+        "date": datetimes.date,
+        "tickersymbol": "VN30F1M",
+        "f2-tickersymbol": np.nan,
+        "price": [Decimal("1000.0"), Decimal("1000.0")],
+        "close": Decimal("1000.0"),
+        "f2_price": np.nan,
+        "f2_close": np.nan,
+    })
+    ticks = bars_to_ticks(build_bars(data, 15))
+
+    assert ticks["price"].tolist() == [Decimal("1000.0")]
+    assert ticks["f2_price"].isna().all()
+
+
+def test_coalesced_bars_are_cached_apart(tick_data):
+    full = load_bars(15, coalesce=False)
+    coalesced = load_bars(15, coalesce=True)
+
+    assert (tick_data / "data" / "is" / "cache" / "bars_15s_coalesced.pkl").exists()
+    assert (tick_data / "data" / "is" / "cache" / "bars_15s.pkl").exists()
+    pd.testing.assert_frame_equal(load_bars(15, coalesce=False), full)
+    assert coalesced["ticks"].sum() < full["ticks"].sum()
@@ -0,0 +1,38 @@
+"""Tests for bootstrap metric distributions."""
+from decimal import Decimal
+
+import numpy as np
+
+from proto_market_maker.metrics.bootstrap import (
+    bootstrap_metrics,
+    confidence_intervals,
+    resample_returns,
+)
+from proto_market_maker.metrics.metric import Metric
+
+RETURNS = [Decimal(str(r)) for r in np.random.default_rng(0).normal(0.001, 0.01, 250).round(6)]
+
+
+def test_resamples_are_seeded_rows_of_the_series():
+    samples = resample_returns(RETURNS, n_resamples=50, seed=1)
+    assert samples.shape == (50, 250)
+    assert np.isin(samples, np.asarray(RETURNS, dtype=float)).all()
+    assert np.array_equal(samples, resample_returns(RETURNS, n_resamples=50, seed=1))
+    assert resample_returns(RETURNS, n_resamples=5, method="block", block_length=10).shape == (5, 250)
+
+
+def test_bootstrap_metrics_match_metric_on_original_path():
+    metric = Metric(RETURNS, None)
+    values = bootstrap_metrics(np.asarray(RETURNS, dtype=float)[None, :])
+    rf = Decimal("0.00023")
+
+    assert np.isclose(values["sharpe_ratio"][0], float(metric.sharpe_ratio(rf)) * np.sqrt(250))
+    assert np.isclose(values["sortino_ratio"][0], float(metric.sortino_ratio(rf)) * np.sqrt(250))
+    assert np.isclose(values["maximum_drawdown"][0], float(metric.maximum_drawdown()[0]))
+    assert np.isclose(values["hpr"][0], float(metric.hpr()))
+
+
+def test_confidence_intervals_are_ordered():
+    intervals = confidence_intervals(RETURNS, n_resamples=1000)
+    for lower, upper in intervals.values():
+        assert lower <= upper
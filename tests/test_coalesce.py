@@ -0,0 +1,55 @@
+"""Tests for lossless tick coalescing."""
+import os
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.coalesce import get_keep_mask
+from proto_market_maker.policy import InventorySkewPolicy
+from proto_market_maker.streaming import run_streaming
+from proto_market_maker.sweep import SweepBacktesting
+
+
+def test_keep_mask_keeps_run_heads_and_window_starts():
+    datetimes = pd.Series(pd.to_datetime("2022-03-08 09:00") + pd.to_timedelta(
+        [0, 1, 2, 3, 4, 20, 21, 22, 23], unit="s"
+    ))
+    dates = np.zeros(9)
+    prices = [1.0, 1.0, 1.0, 1.0, 2.0, 2.0, 2.0, 2.0, 2.0]
+    keep = get_keep_mask(datetimes, dates, prices, [15])
+    assert np.flatnonzero(keep).tolist() == [0, 1, 4, 5, 6, 8]
+
+
+@pytest.mark.parametrize("capital, step", [("5e5", "0.5"), ("4e4", "0.5"), ("4e4", "1.0")])
+def test_coalesced_runs_are_identical(tick_data, capital, step):
+    full = Backtesting.process_data(coalesce=False)
+    coalesced = Backtesting.process_data(coalesce=True, refreshes=[5, 15])
+    assert len(coalesced) < len(full)
+    assert coalesced.attrs["compression_ratio"] == len(full) / len(coalesced)
+    assert os.path.exists("data/is/cache/coalesced_5_15.pkl")
+
+    for refresh in (5, 15):
+        expected = Backtesting(capital=Decimal(capital), printable=False)
+        expected.run(full, Decimal(step), refresh=refresh)
+        bt = Backtesting(capital=Decimal(capital), printable=False)
+        bt.run(coalesced, Decimal(step), refresh=refresh)
+        assert bt.daily_assets == expected.daily_assets
+        assert bt.monthly_tracking == expected.monthly_tracking
+        # tick positions shift by the dropped ticks
+        assert [fill[:-1] for fill in bt.fills] == [fill[:-1] for fill in expected.fills]
+
+    policy = InventorySkewPolicy([step, "2.0"], [0.02, 0.1])
+    expected = SweepBacktesting(capital=Decimal(capital))
+    expected.run(full, policy, refresh=[5, 15])
+    sweep = SweepBacktesting(capital=Decimal(capital))
+    sweep.run(coalesced, policy, refresh=[5, 15])
+    np.testing.assert_array_equal(sweep.daily_assets, expected.daily_assets)
+
+    expected = Backtesting(capital=Decimal(capital), printable=False)
+    run_streaming(expected, Decimal(step), coalesce=False)
+    bt = Backtesting(capital=Decimal(capital), printable=False)
+    run_streaming(bt, Decimal(step), coalesce=True)
+    assert bt.daily_assets == expected.daily_assets
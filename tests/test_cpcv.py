@@ -0,0 +1,43 @@
+"""Tests for combinatorial purged cross-validation."""
+from decimal import Decimal
+
+import numpy as np
+
+from proto_market_maker import cpcv
+from proto_market_maker.backtest import Backtesting
+
+
+def test_train_mask_purges_and_embargoes():
+    groups = cpcv.split_groups(12, 4)
+    train = cpcv.get_train_mask(groups, (1,), purge_days=1, embargo_days=2)
+    # test group 1 is days 3-5: day 2 is purged, days 6-7 are embargoed
+    assert np.flatnonzero(~train).tolist() == [2, 3, 4, 5, 6, 7]
+
+
+def test_pbo_of_dominant_and_overfit_steps():
+    rng = np.random.default_rng(0)
+    groups = cpcv.split_groups(60, 6)
+    noise = rng.normal(0, 0.01, (3, 60))
+
+    dominant = noise + np.array([[0.0], [0.0], [0.02]])
+    combinations = cpcv.evaluate_combinations(dominant, ["1", "2", "3"], groups, 2)
+    assert len(combinations) == 15
+    assert set(combinations["step"]) == {"3"}
+    assert cpcv.get_pbo(combinations) == 0.0
+
+    # a step that only wins in the first half loses whenever it is selected on it
+    overfit = noise.copy()
+    overfit[2, :30] += 0.02
+    overfit[2, 30:] -= 0.02
+    combinations = cpcv.evaluate_combinations(overfit, ["1", "2", "3"], groups, 3)
+    assert cpcv.get_pbo(combinations) > 0.0
+
+
+def test_group_runs_follow_the_full_calendar(tick_data):
+    data = Backtesting.process_data()
+    bt = Backtesting(capital=Decimal("5e5"), printable=False)
+    bt.run(data, Decimal("1.0"))
+
+    cpcv._init_worker(False, "5e5", 3)
+    _, _, returns = cpcv.run_group(("1.0", 0))
+    assert returns == [float(value) for value in bt.daily_returns[:len(returns)]]
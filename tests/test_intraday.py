@@ -0,0 +1,90 @@
+"""Tests for intraday mark-to-market equity."""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.metrics.intraday import (
+    intraday_maximum_drawdown,
+    load_equity,
+    save_equity,
+    time_under_water,
+)
+
+
+class MarkingBacktesting(Backtesting):
+    """Marks equity inside the tick loop, as the reference."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.marks = []
+
+    def update_bid_ask(self, price, step, timestamp):
+        super().update_bid_ask(price, step, timestamp)
+        self.marks.append((
+            timestamp,
+            float(
+                self.daily_assets[-1] - self.ac_loss
+                + self.inventory * (price - self.inventory_price) * self.multiplier
+            ),
+        ))
+
+
+@pytest.mark.parametrize("capital", ["5e5", "4e4"])
+def test_tick_equity_matches_loop_marks(tick_data, capital):
+    data = Backtesting.process_data()
+    bt = MarkingBacktesting(capital=Decimal(capital), printable=False)
+    bt.run(data, Decimal("0.5"))
+
+    equity = bt.get_intraday_equity(data, resolution="tick")
+    times = np.array([mark[0] for mark in bt.marks], dtype="datetime64[ns]")
+    marks = np.array([mark[1] for mark in bt.marks])
+    last = np.r_[times[1:] != times[:-1], True]
+    day_end = np.r_[times[1:].astype("datetime64[D]") != times[:-1].astype("datetime64[D]"), True]
+
+    assert (equity["datetime"].to_numpy() == times[last]).all()
+    np.testing.assert_allclose(equity["equity"].to_numpy()[~day_end[last]], marks[last & ~day_end])
+    np.testing.assert_allclose(
+        equity["equity"].to_numpy()[day_end[last]], np.array(bt.daily_assets[1:], dtype=float)
+    )
+
+
+def test_ticks_sharing_a_timestamp_see_only_earlier_fills(tick_data):
+    data = Backtesting.process_data()
+    # every third tick repeats the timestamp of the tick before it, within its day
+    shared = (np.arange(len(data)) % 3 == 2) & (data["date"] == data["date"].shift()).to_numpy()
+    data["datetime"] = data["datetime"].where(~shared, data["datetime"].shift())
+    bt = MarkingBacktesting(capital=Decimal("4e4"), printable=False)
+    bt.run(data, Decimal("0.5"))
+
+    equity = bt.get_intraday_equity(data, resolution="tick")
+    marks = pd.DataFrame(bt.marks, columns=["datetime", "equity"])
+    day_end = (marks["datetime"].dt.date != marks["datetime"].dt.date.shift(-1)).to_numpy()
+    marks.loc[day_end, "equity"] = np.array(bt.daily_assets[1:], dtype=float)
+    lows = marks.groupby("datetime", sort=False)["equity"].min()
+
+    assert len(equity) < len(data)
+    assert (bt.get_fills()["tick"].to_numpy() % 3 == 2).any()
+    np.testing.assert_allclose(equity["low"].to_numpy(), lows.to_numpy())
+
+
+def test_coarser_resolutions_keep_the_drawdown(tick_data, tmp_path):
+    data = Backtesting.process_data()
+    bt = Backtesting(capital=Decimal("5e5"), printable=False)
+    bt.run(data, Decimal("0.5"))
+
+    ticks = bt.get_intraday_equity(data, resolution="tick")
+    minutes = bt.get_intraday_equity(data, resolution="minute")
+    assert len(minutes) < len(ticks)
+
+    mdd = intraday_maximum_drawdown(ticks, 5e5)
+    assert mdd <= float(bt.metric.maximum_drawdown()[0])
+    assert intraday_maximum_drawdown(minutes, 5e5) == pytest.approx(mdd, abs=1e-3)
+
+    save_equity(minutes, str(tmp_path / "equity.npz"))
+    assert load_equity(str(tmp_path / "equity.npz")).equals(minutes)
+    underwater = time_under_water(minutes, 5e5)
+    assert 0 <= underwater["fraction"] <= 1
+    assert underwater["longest_seconds"] <= 12 * 24 * 3600
@@ -0,0 +1,23 @@
+"""Tests for batch and streaming metrics."""
+from decimal import Decimal
+
+import numpy as np
+
+from proto_market_maker.metrics.metric import Metric, OnlineMetric
+
+
+def test_online_metric_matches_batch_metric_at_every_day():
+    returns = [Decimal(str(r)) for r in np.random.default_rng(1).normal(0, 0.01, 120).round(6)]
+    online = OnlineMetric(risk_free_return=Decimal("0.00023"))
+
+    for day, period_return in enumerate(returns, start=1):
+        online.update(period_return)
+        if day < 2:
+            continue
+        batch = Metric(returns[:day], None)
+        assert np.isclose(online.sharpe_ratio(), float(batch.sharpe_ratio(Decimal("0.00023"))))
+        if not np.isnan(online.sortino_ratio()):
+            assert np.isclose(online.sortino_ratio(), float(batch.sortino_ratio(Decimal("0.00023"))))
+        assert np.isclose(online.maximum_drawdown(), float(batch.maximum_drawdown()[0]))
+        assert online.longest_drawdown() == batch.longest_drawdown()
+        assert np.isclose(online.hpr(), float(batch.hpr()))
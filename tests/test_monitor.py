@@ -0,0 +1,41 @@
+"""Tests for the run progress monitor."""
+import json
+import urllib.request
+from decimal import Decimal
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.monitor import ProgressMonitor
+
+
+def test_monitor_counts_backtest_days(tick_data, tmp_path):
+    data = Backtesting.process_data()
+    status_path = tmp_path / "status.json"
+    monitor = ProgressMonitor(
+        total_days=data["date"].nunique(), port=0, status_path=str(status_path)
+    )
+
+    bt = Backtesting(capital=Decimal("5e5"), printable=False)
+    with monitor:
+        bt.run(data, Decimal("1.0"), day_callback=monitor.day_callback)
+        with urllib.request.urlopen(f"http://127.0.0.1:{monitor.port}/metrics") as response:
+            text = response.read().decode()
+
+    assert f"pmm_ticks_total {len(data)}" in text
+    assert "pmm_eta_seconds 0.0" in text
+    assert "pmm_best_value" not in text
+
+    status = json.loads(status_path.read_text())
+    assert status["days"] == len(bt.daily_assets) - 1
+    assert status["rss_bytes"] > 0 and status["peak_rss_bytes"] > 0
+    assert "pmm_peak_rss_bytes " in text
+
+
+def test_monitor_counts_trials():
+    monitor = ProgressMonitor(total_trials=4)
+    monitor.record_trial(pruned=False, best_value=1.5)
+    monitor.record_trial(pruned=True, best_value=1.5)
+
+    snapshot = monitor.snapshot()
+    assert (snapshot["trials_completed"], snapshot["trials_pruned"]) == (1, 1)
+    assert snapshot["best_value"] == 1.5
+    assert snapshot["eta_seconds"] is not None
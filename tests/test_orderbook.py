@@ -0,0 +1,143 @@
+"""Tests for order book ladders and queue-position-aware fills."""
+import json
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.orderbook import (
+    FillModel,
+    OrderBook,
+    QueueFillModel,
+    build_ladder,
+    get_depth_path,
+    get_fill_model,
+    load_ladder,
+    save_ladder,
+)
+from proto_market_maker.policy import InventorySkewPolicy
+from proto_market_maker.scheduler import run_grid
+from proto_market_maker.sweep import SweepBacktesting
+
+
+def make_depth(prefix_path, levels=3, size=5, offset=0.0):
+    """Depth records from the best bid and ask of the synthetic F1 file, moved by offset."""
+    f1 = pd.read_csv(prefix_path / "VN30F1M_data.csv")
+    return pd.concat([
+        pd.DataFrame({
+            "datetime": f1["datetime"],
+            "tickersymbol": f1["tickersymbol"],
+            "depth": level,
+            "bid_price": f1["best-bid"] + offset - 0.1 * (level - 1),
+            "bid_size": size * level,
+            "ask_price": f1["best-ask"] - offset + 0.1 * (level - 1),
+            "ask_size": size * level,
+        })
+        for level in range(1, levels + 1)
+    ]).sort_values(["datetime", "depth"], kind="stable")
+
+
+def test_ladder_round_trips_through_memory_mapped_files(tick_data):
+    depth = make_depth(tick_data / "data" / "is")
+    book = build_ladder(depth, levels=2)
+    assert book.bid_price.shape == (depth["datetime"].nunique(), 2)
+    assert book.bid_price.dtype == np.int32
+
+    first = depth[depth["datetime"] == depth["datetime"].iloc[0]]
+    assert book.bid_price[0].tolist() == np.round(first["bid_price"][:2] * 10).astype(int).tolist()
+    assert book.ask_size[0].tolist() == [5, 10]
+
+    path = get_depth_path("VN30F1M")
+    save_ladder(book, path)
+    loaded = load_ladder(path)
+    assert isinstance(loaded.ask_price, np.memmap)
+    for name in ["times", "bid_price", "bid_size", "ask_price", "ask_size"]:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(book, name))
+
+
+def test_touching_quote_fills_once_the_queue_ahead_is_gone():
+    levels = np.array([[1000, 999], [1000, 999], [1000, 999]], dtype=np.int32)
+    book = OrderBook(
+        np.array([0, 10, 20]),
+        bid_price=levels,
+        bid_size=np.array([[4, 7], [1, 7], [0, 7]], dtype=np.int32),
+        ask_price=np.array([[1002, 1003]] * 3, dtype=np.int32),
+        ask_size=np.full((3, 2), 3, dtype=np.int32),
+    )
+    model = QueueFillModel(book)
+    model.prepare(
+        np.array([0, 10, 20, 20]), np.zeros(4, dtype=bool), np.array([1001, 1000, 1000, 999])
+    )
+    model.reset()
+
+    bid, ask = np.array([1000, 999, 1001]), np.array([1002, 1005, 1003])
+    model.on_quote(0, bid, ask)
+    assert model.ahead[1].tolist() == [4, 7, 0]
+    assert model.ahead[-1].tolist() == [3, np.inf, 3]
+
+    bid_hit, _ = model.match(1, bid, ask)
+    assert bid_hit.tolist() == [False, False, True]
+    assert model.ahead[1].tolist() == [1, 7, 0]
+
+    bid_hit, _ = model.match(2, bid, ask)
+    assert bid_hit.tolist() == [True, False, True]
+    assert model.ahead[1].tolist() == [0, 7, 0]
+
+    bid_hit, ask_hit = model.match(3, bid, ask)
+    assert bid_hit.tolist() == [True, False, True]
+    assert not ask_hit.any()
+
+
+def test_queue_ahead_holds_back_touching_fills(tick_data):
+    data = Backtesting.process_data()
+    steps, skews = ["0.3", "0.5"], [0.02, 0.0]
+
+    def run(fill_model=None):
+        sweep = SweepBacktesting(capital=Decimal("5e5"))
+        sweep.run(data, InventorySkewPolicy(steps, skews), refresh=15, fill_model=fill_model)
+        return sweep
+
+    default = run()
+    empty = build_ladder(make_depth(tick_data / "data" / "is", size=0), levels=3)
+    unchanged = run(QueueFillModel(empty))
+    np.testing.assert_array_equal(np.array(unchanged.daily_assets), np.array(default.daily_assets))
+
+    # every price the quotes can touch shows contracts ahead of them
+    depth = make_depth(tick_data / "data" / "is", levels=40, size=50, offset=2.0)
+    queued = run(QueueFillModel(build_ladder(depth, levels=40)))
+
+    def fees(sweep):
+        return sweep.get_attribution().groupby("run")["fees"].sum().to_numpy()
+
+    assert (fees(queued) >= fees(default)).all()
+    assert (fees(queued) > fees(default)).any()
+
+
+def test_grid_selects_the_fill_model(tick_data):
+    assert type(get_fill_model()) is FillModel
+    with pytest.raises(ValueError):
+        get_fill_model("depth")
+    with pytest.raises(FileNotFoundError):
+        get_fill_model("queue")
+
+    depth = make_depth(tick_data / "data" / "is", levels=40, size=50, offset=2.0)
+    save_ladder(build_ladder(depth, levels=40), get_depth_path("VN30F1M"))
+    model = get_fill_model("queue")
+    assert isinstance(model, QueueFillModel)
+    assert isinstance(model.books[0].bid_size, np.memmap)
+
+    grid = {"step": ["0.3", "0.5"], "skew": [0.0], "time": [15], "fee": ["0.4"], "engine": "sweep"}
+    path = tick_data / "grid.jsonl"
+    run_grid(grid, path=str(path), processes=1)
+    run_grid({**grid, "fill_model": "queue"}, path=str(path), processes=1)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    price = {record["step"]: record for record in records if record["fill_model"] == "price"}
+    queue = {record["step"]: record for record in records if record.get("fill_model") == "queue"}
+
+    assert len(records) == 4 and set(price) == set(queue)
+    assert all(queue[step]["fees_pnl"] >= price[step]["fees_pnl"] for step in price)
+    assert any(queue[step]["fees_pnl"] > price[step]["fees_pnl"] for step in price)
+    with pytest.raises(ValueError):
+        run_grid({**grid, "engine": "backtest", "fill_model": "queue"}, path=str(path))
@@ -0,0 +1,32 @@
+"""Tests for the parallel-in-time backtest."""
+from decimal import Decimal
+
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.parallel import run_parallel
+
+
+@pytest.mark.parametrize(
+    "capital, step, capital_buckets",
+    [
+        ("5e5", "0.5", None),
+        ("4e4", "0.5", None),
+        ("4e4", "1.0", ["3.5e4", "4e4", "4.5e4"]),
+    ],
+)
+def test_parallel_matches_serial_run(tick_data, capital, step, capital_buckets):
+    serial = Backtesting(capital=Decimal(capital), printable=False)
+    serial.run(Backtesting.process_data(), Decimal(step))
+
+    chained = Backtesting(capital=Decimal(capital), printable=False)
+    resimulated = run_parallel(
+        chained, Decimal(step), processes=2, max_inventory=3, capital_buckets=capital_buckets
+    )
+
+    assert resimulated < len(serial.tracking_dates)
+    assert chained.daily_assets == serial.daily_assets
+    assert chained.daily_returns == serial.daily_returns
+    assert chained.daily_inventory == serial.daily_inventory
+    assert chained.monthly_tracking == serial.monthly_tracking
+    assert chained.tracking_dates == serial.tracking_dates
@@ -0,0 +1,135 @@
+"""Tests for the cached stage pipeline."""
+import contextlib
+import re
+from pathlib import Path
+
+import plutus_verify as pv
+import pytest
+
+from proto_market_maker import pipeline
+from proto_market_maker.pipeline import Stage, get_dependencies, run_pipeline
+
+
+def _stage_run(name, source, target):
+    with open("runs.log", "a", encoding="utf-8") as f:
+        f.write(f"{name}\n")
+    with open(source, encoding="utf-8") as f:
+        content = f.read()
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(content.upper())
+    with pv.step(name) as r:
+        r.metric("length", len(content), unit="chars")
+        r.artifact("output", target, kind="text")
+
+
+def make_stage():
+    _stage_run("make", "in.txt", "mid.txt")
+
+
+def left_stage():
+    _stage_run("left", "mid.txt", "left.txt")
+
+
+def right_stage():
+    _stage_run("right", "other.txt", "right.txt")
+
+
+STAGES = [
+    Stage("make", "tests.test_pipeline:make_stage", ["in.txt"], ["mid.txt"]),
+    Stage("left", "tests.test_pipeline:left_stage", ["mid.txt"], ["left.txt"]),
+    Stage("right", "tests.test_pipeline:right_stage", ["other.txt"], ["right.txt"]),
+]
+
+
+def test_dependencies_follow_files():
+    assert get_dependencies(STAGES) == {"make": [], "left": ["make"], "right": []}
+    assert get_dependencies(pipeline.STAGES) == {
+        "load_data": [],
+        "backtest": ["load_data"],
+        "optimize": ["load_data"],
+        "evaluate": ["load_data"],
+    }
+
+
+def failing_stage():
+    with pv.step("failing"):
+        raise ValueError("bad input")
+
+
+def test_stages_hash_every_parameter_file_config_reads():
+    config = Path(pipeline.__file__).parent / "config" / "config.py"
+    read = set(re.findall(r'"(parameter/\w+\.json)"', config.read_text()))
+    assert read == set(pipeline.CONFIG_PARAMETERS)
+    for stage in pipeline.STAGES:
+        assert read <= set(stage.inputs)
+
+
+def test_run_stage_restores_pv_step(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.txt").write_text("abc")
+    step = pv.step
+
+    records = pipeline.run_stage("tests.test_pipeline:make_stage")
+    assert [record["name"] for record in records] == ["make"]
+    assert pv.step is step
+
+    with pytest.raises(ValueError):
+        pipeline.run_stage("tests.test_pipeline:failing_stage")
+    assert pv.step is step
+
+
+def test_pipeline_skips_up_to_date_stages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.txt").write_text("abc")
+    (tmp_path / "other.txt").write_text("xy")
+
+    emitted = []
+
+    class Result:
+        def __init__(self, name):
+            self.name = name
+
+        def metric(self, name, value, **kwargs):
+            emitted.append((self.name, name, value))
+
+        def artifact(self, name, path, **kwargs):
+            emitted.append((self.name, name, path))
+
+    @contextlib.contextmanager
+    def step(name):
+        yield Result(name)
+
+    monkeypatch.setattr(pipeline.pv, "step", step)
+
+    def runs():
+        lines = (tmp_path / "runs.log").read_text().splitlines()
+        (tmp_path / "runs.log").write_text("")
+        return sorted(lines)
+
+    state = str(tmp_path / "state.json")
+    assert run_pipeline(STAGES, jobs=2, state_path=state) == {
+        "make": "ran", "right": "ran", "left": "ran"
+    }
+    assert runs() == ["left", "make", "right"]
+    assert (tmp_path / "left.txt").read_text() == "ABC"
+
+    emitted.clear()
+    assert set(run_pipeline(STAGES, jobs=2, state_path=state).values()) == {"skipped"}
+    assert runs() == []
+    assert emitted == [
+        ("make", "length", 3.0), ("make", "output", "mid.txt"),
+        ("left", "length", 3.0), ("left", "output", "left.txt"),
+        ("right", "length", 2.0), ("right", "output", "right.txt"),
+    ]
+
+    (tmp_path / "other.txt").write_text("xyz")
+    run_pipeline(STAGES, jobs=2, state_path=state)
+    assert runs() == ["right"]
+
+    (tmp_path / "in.txt").write_text("abcd")
+    (tmp_path / "right.txt").unlink()
+    run_pipeline(STAGES, jobs=2, state_path=state)
+    assert runs() == ["left", "make", "right"]
+
+    run_pipeline(STAGES, selected=["left"], force=True, state_path=state)
+    assert runs() == ["left"]
@@ -0,0 +1,88 @@
+"""Tests for the vectorized quote policies."""
+import itertools
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.policy import InventorySkewPolicy, QuotePolicy, from_ticks
+
+
+def _legacy_quote(price, step, inventory, skew):
+    bid = (price - step * Decimal(max(inventory, 0) * skew + 1)).quantize(
+        Decimal("0.0"), rounding=ROUND_HALF_UP
+    )
+    ask = (price - step * Decimal(min(inventory, 0) * skew - 1)).quantize(
+        Decimal("0.0"), rounding=ROUND_HALF_UP
+    )
+    return bid, ask
+
+
+def test_inventory_skew_matches_decimal_rule():
+    steps = ["0.25", "0.5", "1.8", "3.1", "0.35"]
+    skews = [0.0, 0.02, 0.05, 0.25, 0.1]
+    instances = list(itertools.product(steps, skews))
+    policy = InventorySkewPolicy(*zip(*instances), inventory_range=2)
+
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        price = rng.integers(9000, 15000)
+        inventory = rng.integers(-30, 31, len(instances))
+        bid, ask = policy.quote(np.full(len(instances), price), inventory, np.zeros(len(instances)))
+        for index, (step, skew) in enumerate(instances):
+            expected = _legacy_quote(from_ticks(price), Decimal(step), int(inventory[index]), skew)
+            assert (from_ticks(bid[index]), from_ticks(ask[index])) == expected
+
+
+class _FixedSpread(QuotePolicy):
+    def __init__(self, ticks):
+        self.ticks = ticks
+
+    def quote(self, price, inventory, elapsed):
+        return price - self.ticks, price + self.ticks
+
+
+@pytest.mark.parametrize("policy", [
+    InventorySkewPolicy(["0.25", "1.8", "0.5"], [0.0, 0.25, 0.1], inventory_range=2),
+    _FixedSpread(2),
+])
+def test_quote_rows_matches_the_full_quote(policy):
+    price, inventory = np.array([9000, 11000, 13000]), np.array([5, -3, 1])
+    bid, ask = policy.quote(price, inventory, np.zeros(3))
+    for rows in [0, 2, [1, 2]]:
+        row_bid, row_ask = policy.quote_rows(rows, price, inventory, np.zeros(3))
+        np.testing.assert_array_equal(row_bid, bid[rows])
+        np.testing.assert_array_equal(row_ask, ask[rows])
+
+
+def test_policy_without_quote_cannot_be_created():
+    class _Incomplete(QuotePolicy):
+        pass
+
+    with pytest.raises(TypeError):
+        _Incomplete()
+
+
+@pytest.mark.parametrize("capital", ["5e5", "4e4"])
+def test_reference_policy_matches_builtin_rule(tick_data, capital):
+    data = Backtesting.process_data()
+    builtin = Backtesting(capital=Decimal(capital), printable=False)
+    builtin.run(data, Decimal("0.5"), skew=0.1)
+
+    policy = Backtesting(capital=Decimal(capital), printable=False)
+    policy.set_parameters(policy=InventorySkewPolicy("0.5", 0.1))
+    policy.run(data, Decimal("0.5"), skew=0.1)
+    assert policy.daily_assets == builtin.daily_assets
+    assert policy.fills == builtin.fills
+
+
+def test_backtest_quotes_through_policy(tick_data):
+    data = Backtesting.process_data()
+    reference = Backtesting(capital=Decimal("5e5"), printable=False)
+    reference.run(data, Decimal("1.0"), skew=0.0)
+
+    custom = Backtesting(capital=Decimal("5e5"), printable=False)
+    custom.set_parameters(policy=_FixedSpread(10))
+    custom.run(data, Decimal("3.0"))
+    assert custom.daily_assets == reference.daily_assets
@@ -0,0 +1,138 @@
+"""Tests for the multi-instrument portfolio engine."""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker import portfolio as portfolio_module
+from proto_market_maker.policy import InventorySkewPolicy, QuotePolicy
+from proto_market_maker.portfolio import (
+    InstrumentStream,
+    PortfolioBacktesting,
+    heap_merge_events,
+    load_streams,
+    merge_events,
+)
+from proto_market_maker.sweep import SweepBacktesting
+from proto_market_maker.utils import get_expired_dates, get_roll_dates
+
+
+class FixedSpreadPolicy(QuotePolicy):
+    """Quotes a fixed number of ticks either side, like a skew-free step."""
+
+    def __init__(self, ticks, size):
+        self.ticks = np.asarray(ticks)
+        self.size = size
+
+    def quote(self, price, inventory, elapsed):
+        return price - self.ticks, price + self.ticks
+
+
+def get_pre_roll_data():
+    data = Backtesting.process_data(lazy_f2=True)
+    dates = data["date"].unique().tolist()
+    roll_dates = get_roll_dates(
+        dates, get_expired_dates(data["datetime"].iloc[0], data["datetime"].iloc[-1])
+    )
+    return data[data["date"] < roll_dates[0]].reset_index(drop=True)
+
+
+def test_heap_merge_matches_sorted_merge(tick_data):
+    streams = load_streams()
+    assert [len(stream) for stream in streams] == [
+        len(pd.read_csv(tick_data / "data" / "is" / f"{name}_data.csv"))
+        for name in ["VN30F1M", "VN30F2M"]
+    ]
+
+    instruments, positions = merge_events(streams)
+    assert list(heap_merge_events(streams)) == list(zip(instruments.tolist(), positions.tolist()))
+    times = np.array([streams[i].times[k] for i, k in zip(instruments, positions)])
+    assert (np.diff(times) >= 0).all()
+
+
+@pytest.mark.parametrize("capital", ["5e5", "4e4"])
+def test_single_instrument_matches_sweep(tick_data, capital):
+    data = get_pre_roll_data()
+    portfolio = PortfolioBacktesting(capital=Decimal(capital))
+    portfolio.run(
+        [InstrumentStream.from_frame("VN30F1M", data)], InventorySkewPolicy("0.5", 0.02), refresh=15
+    )
+    sweep = SweepBacktesting(capital=Decimal(capital))
+    sweep.run(data, InventorySkewPolicy("0.5", 0.02), refresh=15)
+
+    assert portfolio.tracking_dates == sweep.tracking_dates
+    assert [int(inventory[0]) for inventory in portfolio.daily_inventory] == [
+        int(inventory[0]) for inventory in sweep.daily_inventory
+    ]
+    np.testing.assert_allclose(
+        portfolio.daily_assets, [assets[0] for assets in sweep.daily_assets], rtol=1e-12
+    )
+
+
+def test_any_quote_policy_runs_the_portfolio(tick_data):
+    streams = load_streams()
+    fixed = PortfolioBacktesting(capital=Decimal("5e5"))
+    fixed.run(streams, FixedSpreadPolicy([3, 5], 2), refresh=15)
+    skew = PortfolioBacktesting(capital=Decimal("5e5"))
+    skew.run(streams, InventorySkewPolicy(["0.3", "0.5"], 0.0), refresh=15)
+
+    assert fixed.daily_returns == skew.daily_returns
+    assert all((a == b).all() for a, b in zip(fixed.daily_inventory, skew.daily_inventory))
+
+
+def test_single_instrument_closes_its_inventory_at_the_roll(tick_data, monkeypatch):
+    data = Backtesting.process_data(lazy_f2=True)
+    stream = InstrumentStream.from_frame("VN30F1M", data)
+    policy = InventorySkewPolicy("0.5", 0.0)
+    rolled = PortfolioBacktesting(capital=Decimal("5e5"))
+    rolled.run([stream], policy, refresh=15)
+
+    def no_roll_dates(dates, expirations):
+        return []
+
+    monkeypatch.setattr(portfolio_module, "get_roll_dates", no_roll_dates)
+    carried = PortfolioBacktesting(capital=Decimal("5e5"))
+    carried.run([stream], policy, refresh=15)
+
+    dates = rolled.tracking_dates
+    roll = dates.index(get_roll_dates(dates, get_expired_dates(dates[0], dates[-1]))[0])
+    held = int(carried.daily_inventory[roll][0])
+    assert held != 0 and not rolled.daily_inventory[roll].any()
+    assert rolled.daily_assets[:roll + 1] == carried.daily_assets[:roll + 1]
+    assert rolled.daily_assets[roll + 1] == pytest.approx(
+        carried.daily_assets[roll + 1] - abs(held) * 0.4 * 100, rel=1e-12
+    )
+    assert len(rolled.tracking_dates) == data["date"].nunique()
+
+
+def test_instruments_share_capital(tick_data):
+    data = get_pre_roll_data()
+    stream = InstrumentStream.from_frame("VN30F1M", data)
+    capital = Decimal("6e4")
+    portfolio = PortfolioBacktesting(capital=capital)
+    portfolio.run([stream, stream], InventorySkewPolicy(["0.3", "0.3"], 0.0), refresh=15)
+
+    held = np.abs(np.array(portfolio.daily_inventory)).sum(axis=1)
+    contract_margin = stream.prices.min() / 10 * 100 * 0.17
+    assert held.max() > 0
+    assert held.max() <= max(portfolio.daily_assets) // contract_margin
+
+
+def test_no_inventory_is_carried_past_a_roll(tick_data):
+    streams = load_streams()
+    portfolio = PortfolioBacktesting(capital=Decimal("5e5"))
+    portfolio.run(streams, InventorySkewPolicy(["0.3", "0.5"], 0.0))
+
+    dates = portfolio.tracking_dates
+    roll_dates = get_roll_dates(dates, get_expired_dates(dates[0], dates[-1]))
+    assert roll_dates
+    for roll_date in roll_dates:
+        assert not portfolio.daily_inventory[dates.index(roll_date)].any()
+    assert len(portfolio.daily_returns) == len(dates)
+
+
+def test_policy_must_quote_every_instrument(tick_data):
+    with pytest.raises(ValueError):
+        PortfolioBacktesting(capital=Decimal("5e5")).run(load_streams(), InventorySkewPolicy("0.5", 0.0))
@@ -0,0 +1,55 @@
+"""Tests for processed data loading."""
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.utils import get_expired_dates, get_roll_dates
+
+
+def test_roll_dates_are_the_day_before_expiration():
+    trading_dates = [date(2022, 3, 15), date(2022, 3, 16), date(2022, 3, 17), date(2022, 3, 18)]
+    expirations = get_expired_dates(pd.Timestamp("2022-03-15 09:00"), pd.Timestamp("2022-03-18 14:30"))
+    assert get_roll_dates(trading_dates, expirations) == [date(2022, 3, 16)]
+
+
+def test_lazy_f2_is_aligned_on_roll_days_only(tmp_path):
+    pd.DataFrame({
+        "date": ["2022-03-15", "2022-03-16", "2022-03-16", "2022-03-17"],
+        "datetime": ["2022-03-15 14:00:00.000", "2022-03-16 09:00:05.000",
+                     "2022-03-16 10:00:00.000", "2022-03-17 09:00:00.000"],
+        "tickersymbol": "VN30F2204",
+        "price": [1002.0, 1003.0, 1004.0, 1005.0],
+        "close": [1002.0, 1004.0, 1004.0, 1005.0],
+    }).to_csv(tmp_path / "VN30F2M_data.csv", index=False)
+    datetimes = pd.to_datetime(["2022-03-15 09:00", "2022-03-16 09:00", "2022-03-16 09:30", "2022-03-17 09:00"])
+    f1_data = pd.DataFrame({
+        "datetime": datetimes,
+        "date": datetimes.date,
+        "price": [Decimal("1000.0")] * 4,
+    })
+
+    data = Backtesting.align_roll_f2(f1_data, f"{tmp_path}/")
+
+    assert len(data) == 4
+    # the roll day's first tick carries the previous day's last F2 price
+    assert data["f2_price"].tolist()[1:3] == [Decimal("1002.0"), Decimal("1003.0")]
+    assert data.loc[[0, 3], "f2_price"].isna().all()
+
+
+@pytest.mark.parametrize("rows", ["", "2022-04-01,2022-04-01 09:00:00.000,VN30F2205,1002.0,1002.0\n"])
+def test_lazy_f2_without_roll_day_rows_leaves_f2_empty(tmp_path, rows):
+    (tmp_path / "VN30F2M_data.csv").write_text(f"date,datetime,tickersymbol,price,close\n{rows}")
+    datetimes = pd.to_datetime(["2022-03-15 09:00", "2022-03-16 09:00", "2022-03-17 09:00"])
+    f1_data = pd.DataFrame({
+        "datetime": datetimes,
+        "date": datetimes.date,
+        "price": [Decimal("1000.0")] * 3,
+    })
+
+    assert Backtesting.read_f2_data(f"{tmp_path}/", dates=[date(2022, 3, 16)]).empty
+    data = Backtesting.align_roll_f2(f1_data, f"{tmp_path}/")
+    assert len(data) == 3
+    assert data["f2_price"].isna().all()
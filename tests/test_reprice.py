@@ -0,0 +1,66 @@
+"""Tests for fee and margin scenario re-pricing."""
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.reprice import FillRepricer
+
+SCENARIOS = [
+    {"fee": "0.4", "multiplier": "100", "margin_rate": "0.17"},
+    {"fee": "0.1", "multiplier": "100", "margin_rate": "0.17"},
+    {"fee": "1.5", "multiplier": "100", "margin_rate": "0.17"},
+    {"fee": "0.4", "multiplier": "100", "margin_rate": "0.3"},
+    {"fee": "0.4", "multiplier": "120", "margin_rate": "0.1"},
+]
+
+
+@pytest.mark.parametrize("capital", ["5e5", "4e4"])
+def test_reprice_matches_full_runs(tick_data, capital):
+    data = Backtesting.process_data()
+    bt = Backtesting(capital=Decimal(capital), printable=False)
+    bt.run(data, Decimal("0.5"))
+    repricer = FillRepricer(bt, data, Decimal("0.5"))
+
+    resimulated = {}
+    for scenario in SCENARIOS:
+        assets, resimulated[scenario["fee"], scenario["margin_rate"]] = repricer.get_assets(scenario)
+        full = Backtesting(
+            capital=Decimal(capital),
+            printable=False,
+            **{name: Decimal(value) for name, value in scenario.items()},
+        )
+        full.run(data, Decimal("0.5"))
+        np.testing.assert_allclose(assets, np.array(full.daily_assets, dtype=float), rtol=1e-12)
+
+    if capital == "5e5":
+        # capital never binds, so a fee change is pure arithmetic
+        assert resimulated["0.1", "0.17"] == []
+
+
+def test_fill_journal_reconciles_assets(tick_data):
+    data = Backtesting.process_data()
+    bt = Backtesting(capital=Decimal("5e5"), printable=False)
+    bt.run(data, Decimal("0.5"))
+
+    fills = bt.get_fills()
+    assert set(fills["kind"]) <= {"open", "close", "roll", "force", "blocked", "mark"}
+    changes = (
+        fills["points"].sum() * 100
+        - fills["fee_contracts"].sum() * float(bt.fee_per_contract)
+    )
+    assert changes == pytest.approx(float(bt.daily_assets[-1] - bt.daily_assets[0]))
+
+
+def test_repeated_blocks_share_one_record(tick_data):
+    data = Backtesting.process_data()
+    bt = Backtesting(capital=Decimal("4e4"), printable=False)
+    bt.run(data, Decimal("0.5"))
+
+    fills = bt.get_fills()
+    blocked = fills["kind"] == "blocked"
+    assert blocked.any()
+    # a block follows a block of its side only after another kind of record
+    fills["segment"] = (~blocked).cumsum()
+    assert not fills[blocked].duplicated(["segment", "side"]).any()
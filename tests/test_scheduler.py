@@ -0,0 +1,73 @@
+"""Tests for the parameter grid scheduler."""
+import json
+
+from proto_market_maker.scheduler import (
+    expand_grid,
+    group_jobs,
+    job_key,
+    load_completed,
+    run_grid,
+)
+
+
+def test_expand_grid_covers_every_combination():
+    grid = {"step": [1.8, 3.1], "skew": [0.02], "time": [5, 15], "fee": ["0.4"]}
+    jobs = expand_grid(grid)
+    assert len(jobs) == 4
+    assert jobs[0] == {"step": "1.8", "skew": "0.02", "time": "5", "fee": "0.4"}
+
+
+def test_load_completed_drops_truncated_record(tmp_path):
+    path = tmp_path / "results.jsonl"
+    done = {"step": "1.8", "skew": "0.02", "time": "15", "fee": "0.4", "sharpe_ratio": 0.5}
+    path.write_text(json.dumps(done) + "\n" + '{"step": "3.1", "sk')
+
+    assert load_completed(str(path)) == {job_key(done)}
+    assert path.read_text() == json.dumps(done) + "\n"
+
+
+def test_error_records_count_as_done_unless_retried(tmp_path):
+    path = tmp_path / "results.jsonl"
+    failed = {"step": "1.8", "skew": "0.02", "time": "15", "fee": "0.4", "error": "ValueError: x"}
+    path.write_text(json.dumps(failed) + "\n")
+
+    assert load_completed(str(path)) == {job_key(failed)}
+    assert load_completed(str(path), retry_errors=True) == set()
+
+
+def test_failing_job_does_not_stop_the_grid(tick_data):
+    grid = {"step": [0.5], "skew": [0.02], "time": [15], "fee": ["0.4", "bad"]}
+    path = tick_data / "results.jsonl"
+    run_grid(grid, path=str(path), processes=1)
+
+    records = {record["fee"]: record for record in map(json.loads, path.read_text().splitlines())}
+    assert "sharpe_ratio" in records["0.4"]
+    assert records["bad"]["error"].startswith("InvalidOperation")
+
+    run_grid(grid, path=str(path), processes=1)
+    assert len(path.read_text().splitlines()) == 2
+
+
+def test_changed_settings_run_jobs_again(tick_data):
+    grid = {"step": [0.5], "skew": [0.02], "time": [15], "fee": ["0.4"], "capital": "5e5"}
+    path = tick_data / "results.jsonl"
+    run_grid(grid, path=str(path), processes=1)
+    run_grid({**grid, "capital": "4e4"}, path=str(path), processes=1)
+    run_grid({**grid, "engine": "sweep"}, path=str(path), processes=1)
+    run_grid(grid, path=str(path), processes=1)
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(record["engine"], record["capital"]) for record in records] == [
+        ("backtest", "5e5"), ("backtest", "4e4"), ("sweep", "5e5")
+    ]
+    assert records[0]["window"] == "2022-01-01 00:00:00 - 2023-01-01 00:00:00"
+    assert len({job_key(record) for record in records}) == 3
+
+
+def test_group_jobs_splits_each_fee():
+    grid = {"step": [1, 2, 3], "skew": [0.02], "time": [15], "fee": ["0.3", "0.4"]}
+    groups = group_jobs(expand_grid(grid), parts=2)
+    assert [[job["step"] for job in group] for group in groups] == [
+        ["1", "3"], ["2"], ["1", "3"], ["2"]
+    ]
+    assert [len({job["fee"] for job in group}) for group in groups] == [1, 1, 1, 1]
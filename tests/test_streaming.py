@@ -0,0 +1,19 @@
+"""Tests for the day-streaming backtest."""
+from decimal import Decimal
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.streaming import run_streaming
+
+
+def test_streaming_matches_batch_run(tick_data):
+    batch = Backtesting(capital=Decimal("5e5"), printable=False)
+    batch.run(Backtesting.process_data(lazy_f2=False), Decimal("1.0"))
+
+    # a chunk smaller than a day forces days to be stitched across chunks
+    streamed = Backtesting(capital=Decimal("5e5"), printable=False)
+    run_streaming(streamed, Decimal("1.0"), chunksize=57)
+
+    assert streamed.daily_assets == batch.daily_assets
+    assert streamed.daily_inventory == batch.daily_inventory
+    assert streamed.monthly_tracking == batch.monthly_tracking
+    assert len(batch.monthly_tracking) == 1
@@ -0,0 +1,77 @@
+"""Tests for perturbed stress-test paths."""
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.metrics.metric import summarize
+from proto_market_maker.stress import TickPaths, run_stress
+
+
+def make_data():
+    datetimes = pd.to_datetime(
+        ["2022-03-01 09:00", "2022-03-01 09:01", "2022-03-01 09:02", "2022-03-01 13:00",
+         "2022-03-01 13:01", "2022-03-02 09:00", "2022-03-02 09:01", "2022-03-02 09:02"]
+    )
+    prices = ["1000.0", "1000.5", "1000.2", "1001.0", "1000.8", "1002.0", "1001.5", "1001.9"]
+    closes = ["1000.8"] * 5 + ["1001.9"] * 3
+    return pd.DataFrame({
+        "datetime": datetimes,
+        "date": datetimes.date,
+        "price": [Decimal(p) for p in prices],
+        "close": [Decimal(c) for c in closes],
+        "f2_price": [Decimal(p) + 2 for p in prices],
+        "f2_close": [Decimal(c) + 2 for c in closes],
+    })
+
+
+def test_unperturbed_path_is_original_data():
+    data = make_data()
+    path = TickPaths(data).path(2025, 0, {})
+    pd.testing.assert_frame_equal(path, data)
+
+
+def test_shuffle_keeps_session_opens_and_changes():
+    data = make_data()
+    paths = TickPaths(data)
+    shuffled = paths.shuffle(paths.f1, np.random.default_rng(0))
+
+    assert np.array_equal(shuffled[paths.session_starts], paths.f1[paths.session_starts])
+    for session in np.unique(paths.session):
+        rows = paths.session == session
+        assert sorted(np.diff(shuffled[rows])) == sorted(np.diff(paths.f1[rows]))
+
+
+def test_shuffle_keeps_missing_ticks_to_their_rows():
+    paths = TickPaths(make_data())
+    ticks = paths.f1.copy()
+    ticks[[0, 6]] = np.nan
+    shuffled = paths.shuffle(ticks, np.random.default_rng(0))
+    expected = paths.shuffle(paths.f1, np.random.default_rng(0))
+
+    assert np.isnan(shuffled[[0, 6]]).all()
+    assert shuffled[1] == ticks[1]
+    assert np.array_equal(shuffled[3:5], expected[3:5])
+    assert shuffled[5] == ticks[5]
+    assert sorted(np.diff(shuffled[[5, 7]])) == sorted(np.diff(ticks[[5, 7]]))
+
+
+def test_paths_are_reproducible_and_keep_roll_basis():
+    config = {"shuffle": True, "volatility_scale": [0.5, 2.0], "gap_probability": 1.0, "gap_size": 5}
+    paths = TickPaths(make_data())
+    path = paths.path(2025, 3, config)
+
+    pd.testing.assert_frame_equal(path, paths.path(2025, 3, config))
+    assert (path["f2_price"] - path["price"] == Decimal(2)).all()
+    assert (path.groupby("date")["price"].last() == path.groupby("date")["close"].last()).all()
+
+
+def test_run_stress_uses_the_given_config(tick_data):
+    config = {"random_seed": 7}
+    metrics = run_stress("0.5", 2, 1, config=config)
+
+    bt = Backtesting(capital=Decimal("5e5"), printable=False)
+    bt.run(Backtesting.process_data(coalesce=False), Decimal("0.5"))
+    assert metrics["path"].tolist() == [0, 1]
+    assert (metrics["hpr"] == summarize(bt.metric)["hpr"]).all()
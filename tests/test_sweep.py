@@ -0,0 +1,30 @@
+"""Tests for the vectorized sweep engine."""
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.policy import InventorySkewPolicy
+from proto_market_maker.sweep import SweepBacktesting
+
+
+@pytest.mark.parametrize("capital", ["5e5", "4e4"])
+def test_sweep_matches_single_runs(tick_data, capital):
+    data = Backtesting.process_data()
+    steps, skews, refreshes = ["0.5", "1.0", "0.7"], [0.02, 0.1, 0.0], [15, 5, 30]
+
+    sweep = SweepBacktesting(capital=Decimal(capital))
+    sweep.run(data, InventorySkewPolicy(steps, skews), refresh=refreshes)
+
+    for index, (step, skew, refresh) in enumerate(zip(steps, skews, refreshes)):
+        bt = Backtesting(capital=Decimal(capital), printable=False)
+        bt.run(data, Decimal(step), skew=skew, refresh=refresh)
+
+        assert sweep.tracking_dates == bt.tracking_dates
+        assert [inventory[index] for inventory in sweep.daily_inventory] == bt.daily_inventory
+        np.testing.assert_allclose(
+            [assets[index] for assets in sweep.daily_assets],
+            np.array(bt.daily_assets, dtype=float),
+            rtol=1e-12,
+        )
@@ -0,0 +1,66 @@
+"""Tests for the shared-memory tick data server."""
+import os
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from proto_market_maker.backtest import Backtesting
+from proto_market_maker.cache import get_source_paths
+from proto_market_maker.policy import InventorySkewPolicy
+from proto_market_maker.sweep import SweepBacktesting
+from proto_market_maker.tickserver import TickServer, attach_arrays, attach_data, get_catalog
+
+
+def _serve(server, evaluation=False):
+    sources = {path: os.path.getmtime(path) for path in get_source_paths(evaluation)}
+    data = Backtesting.process_data(evaluation, lazy_f2=False, coalesce=False, attach=False)
+    server.add_dataset("os" if evaluation else "is", data, sources)
+    return data
+
+
+def test_process_data_attaches_to_running_server(tick_data):
+    assert attach_data() is None
+
+    with TickServer() as server:
+        expected = _serve(server)
+        catalog = get_catalog()
+        entry = catalog["datasets"]["is"]
+        assert entry["rows"] == len(expected)
+        assert set(entry["columns"]) == {"__index__", *expected.columns}
+
+        arrays = attach_arrays(entry)
+        assert not arrays["price"].flags.writeable
+        np.testing.assert_array_equal(arrays["price"], expected["price"].astype(float))
+
+        pd.testing.assert_frame_equal(Backtesting.process_data(lazy_f2=False), expected)
+        assert attach_data(evaluation=True) is None
+
+        bt = Backtesting(capital=Decimal("5e5"), printable=False)
+        bt.run(Backtesting.process_data(lazy_f2=False), Decimal("1.0"))
+        reference = Backtesting(capital=Decimal("5e5"), printable=False)
+        reference.run(expected, Decimal("1.0"))
+        assert bt.daily_assets == reference.daily_assets
+
+        # the array engines read prices straight from the segments
+        floats = Backtesting.process_data(lazy_f2=False, decimal=False)
+        assert np.shares_memory(floats["price"].to_numpy(), arrays["price"])
+        assert floats["datetime"].equals(expected["datetime"])
+        assert floats["date"].equals(expected["date"])
+        for column in ["price", "close", "f2_price", "f2_close"]:
+            assert floats[column].equals(expected[column].astype(float))
+        sweeps = []
+        for frame in (floats, expected):
+            sweeps.append(SweepBacktesting(capital=Decimal("5e5")))
+            sweeps[-1].run(frame, InventorySkewPolicy(["0.5", "1.0"], 0.02), refresh=15)
+        np.testing.assert_array_equal(sweeps[0].daily_assets, sweeps[1].daily_assets)
+
+        # sources rewritten after the server loaded them are read again
+        path = get_source_paths()[0]
+        os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 10))
+        assert attach_data() is None
+
+    assert get_catalog() is None
+    assert Backtesting.process_data(lazy_f2=False, decimal=False).equals(
+        Backtesting.to_float_prices(expected)
+    )